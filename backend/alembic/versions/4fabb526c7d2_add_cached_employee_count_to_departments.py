@@ -0,0 +1,30 @@
+"""add_cached_employee_count_to_departments
+
+Revision ID: 4fabb526c7d2
+Revises: f2b893485acd
+Create Date: 2026-10-18 14:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '4fabb526c7d2'
+down_revision: Union[str, None] = 'f2b893485acd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('departments', sa.Column('cached_employee_count', sa.Integer(), server_default='0', nullable=False))
+    # Backfill from the current assignments; writes keep it up to date from here on
+    op.execute(
+        "UPDATE departments SET cached_employee_count = "
+        "(SELECT count(*) FROM employees WHERE employees.department_id = departments.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('departments', 'cached_employee_count')
@@ -0,0 +1,30 @@
+"""add_reference_versions
+
+Revision ID: 5af665e79158
+Revises: 4fabb526c7d2
+Create Date: 2026-10-18 14:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '5af665e79158'
+down_revision: Union[str, None] = '4fabb526c7d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('reference_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO reference_versions (name, version) VALUES ('departments', 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('reference_versions')
@@ -0,0 +1,25 @@
+"""add_employees_reference_version
+
+Revision ID: b7d41c2e9a63
+Revises: 5af665e79158
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b7d41c2e9a63'
+down_revision: Union[str, None] = '5af665e79158'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("INSERT INTO reference_versions (name, version) VALUES ('employees', 0)")
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM reference_versions WHERE name = 'employees'")
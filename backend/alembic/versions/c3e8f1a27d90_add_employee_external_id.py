@@ -0,0 +1,29 @@
+"""add_employee_external_id
+
+Revision ID: c3e8f1a27d90
+Revises: b7d41c2e9a63
+Create Date: 2026-10-18 18:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c3e8f1a27d90'
+down_revision: Union[str, None] = 'b7d41c2e9a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('employees', sa.Column('external_id', sa.String(length=64), nullable=True))
+    op.add_column('employees', sa.Column('content_hash', sa.String(length=32), nullable=True))
+    op.create_index('ix_employees_external_id', 'employees', ['external_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_employees_external_id', table_name='employees')
+    op.drop_column('employees', 'content_hash')
+    op.drop_column('employees', 'external_id')
@@ -0,0 +1,53 @@
+"""add_change_feed_revisions
+
+Revision ID: e8a2c5d91f47
+Revises: c3e8f1a27d90
+Create Date: 2026-10-18 21:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e8a2c5d91f47'
+down_revision: Union[str, None] = 'c3e8f1a27d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ('employees', 'departments'):
+        op.add_column(table, sa.Column('revision', sa.Integer(), nullable=True))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+        op.create_index(f'ix_{table}_revision_id', table, ['revision', 'id'])
+        # Existing rows all appear in the first page of the feed, under a new version
+        op.execute(f"UPDATE reference_versions SET version = version + 1 WHERE name = '{table}'")
+        op.execute(
+            f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP, "
+            f"revision = (SELECT version FROM reference_versions WHERE name = '{table}')"
+        )
+    op.create_table(
+        'employee_tombstones',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=False),
+        sa.Column('revision', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_employee_tombstones_revision_id', 'employee_tombstones', ['revision', 'id'])
+    op.create_index('ix_employee_tombstones_deleted_at', 'employee_tombstones', ['deleted_at'])
+    # Revision the tombstones were pruned through
+    op.execute("INSERT INTO reference_versions (name, version) VALUES ('employee_tombstones_pruned', 0)")
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM reference_versions WHERE name = 'employee_tombstones_pruned'")
+    op.drop_index('ix_employee_tombstones_deleted_at', table_name='employee_tombstones')
+    op.drop_index('ix_employee_tombstones_revision_id', table_name='employee_tombstones')
+    op.drop_table('employee_tombstones')
+    for table in ('departments', 'employees'):
+        op.drop_index(f'ix_{table}_revision_id', table_name=table)
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'revision')
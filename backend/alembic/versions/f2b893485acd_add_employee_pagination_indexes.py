@@ -0,0 +1,31 @@
+"""add_employee_pagination_indexes
+
+Revision ID: f2b893485acd
+Revises: ea9529594bad
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'f2b893485acd'
+down_revision: Union[str, None] = 'ea9529594bad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_employees_name_id', 'employees', ['name', 'id'], unique=False)
+    op.create_index('ix_employees_age_id', 'employees', ['age', 'id'], unique=False)
+    op.create_index('ix_employees_city_id', 'employees', ['city', 'id'], unique=False)
+    op.create_index('ix_employees_department_id_id', 'employees', ['department_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_employees_department_id_id', table_name='employees')
+    op.drop_index('ix_employees_city_id', table_name='employees')
+    op.drop_index('ix_employees_age_id', table_name='employees')
+    op.drop_index('ix_employees_name_id', table_name='employees')
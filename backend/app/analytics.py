@@ -0,0 +1,189 @@
+"""Workforce analytics served from per-process snapshots.
+
+Each report is a single aggregate query (see the analytics statements in
+crud). Its result is kept as a snapshot tagged with the employees and
+departments versions it was computed from. A commit in this process drops
+every snapshot, other workers' writes are noticed at the next TTL check,
+and a snapshot older than ANALYTICS_MAX_AGE is recomputed regardless, which
+also covers writes made outside the application. A report computed on a
+session behind this process's commits (a lagging replica) is returned to
+that reader only, never cached.
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from . import crud, schemas
+from .table_versions import DEPARTMENTS, EMPLOYEES, behind_local_commits, on_commit
+
+# Seconds a worker serves a snapshot before checking the shared versions
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "10"))
+# Seconds after which a snapshot is recomputed even if nothing was written
+ANALYTICS_MAX_AGE = float(os.getenv("ANALYTICS_MAX_AGE", "300"))
+
+ANALYTICS_TABLES = (EMPLOYEES, DEPARTMENTS)
+
+SUMMARY = "summary"
+HEADCOUNT = "headcount"
+AGE_DISTRIBUTION = "age-distribution"
+CITIES = "cities"
+
+
+def _average(value) -> Optional[float]:
+    return None if value is None else round(float(value), 2)
+
+
+def _share(value) -> float:
+    return round(float(value or 0), 4)
+
+
+def summary_report(db: Session) -> Dict[str, Any]:
+    row = crud.get_workforce_summary(db)
+    return {
+        "employees": row.employees,
+        "average_age": _average(row.average_age),
+        "min_age": row.min_age,
+        "max_age": row.max_age,
+        "departments": row.departments,
+        "cities": row.cities,
+        "unassigned": row.unassigned,
+    }
+
+
+def headcount_report(db: Session) -> Dict[str, Any]:
+    return {"departments": [
+        schemas.DepartmentHeadcount(
+            department_id=row.department_id,
+            department_name=row.department_name,
+            headcount=row.headcount,
+            average_age=_average(row.average_age),
+            share=_share(row.share),
+        )
+        for row in crud.get_headcount_by_department(db)
+    ]}
+
+
+def age_distribution_report(db: Session) -> Dict[str, Any]:
+    counts = {row.bucket: row for row in crud.get_age_distribution(db)}
+    starts = crud.AGE_BUCKET_STARTS
+    buckets = []
+    # Every bucket is listed, empty ones included, so charts keep their axis
+    for lower, upper in zip(starts, starts[1:] + (None,)):
+        row = counts.get(lower)
+        buckets.append(schemas.AgeBucket(
+            label=f"{lower}-{upper - 1}" if upper is not None else f"{lower}+",
+            min_age=lower,
+            max_age=upper - 1 if upper is not None else None,
+            count=row.count if row else 0,
+            share=_share(row.share) if row else 0.0,
+        ))
+    return {"buckets": buckets}
+
+
+def city_report(db: Session) -> Dict[str, Any]:
+    return {"cities": [
+        schemas.CityCount(
+            city=row.city,
+            count=row.count,
+            average_age=_average(row.average_age),
+            share=_share(row.share),
+        )
+        for row in crud.get_city_counts(db)
+    ]}
+
+
+REPORTS: Dict[str, Callable[[Session], Dict[str, Any]]] = {
+    SUMMARY: summary_report,
+    HEADCOUNT: headcount_report,
+    AGE_DISTRIBUTION: age_distribution_report,
+    CITIES: city_report,
+}
+
+
+class AnalyticsSnapshot:
+    def __init__(
+        self,
+        versions: Dict[str, int],
+        data: Dict[str, Any],
+        generation: int,
+        previous: Optional["AnalyticsSnapshot"] = None,
+    ):
+        self.versions = versions
+        self.data = data
+        self.generation = generation
+        self.checked_at = time.monotonic()
+        # A snapshot confirmed unchanged keeps its original computation time
+        self.computed_at = previous.computed_at if previous else self.checked_at
+        self.generated_at = previous.generated_at if previous else datetime.now(timezone.utc)
+
+    def age(self) -> float:
+        return time.monotonic() - self.computed_at
+
+    def report(self) -> Dict[str, Any]:
+        """The report fields plus when they were computed."""
+        return {**self.data, "generated_at": self.generated_at, "age_seconds": round(self.age(), 3)}
+
+
+class AnalyticsCache:
+    def __init__(self, ttl: float = ANALYTICS_CACHE_TTL, max_age: float = ANALYTICS_MAX_AGE):
+        self.ttl = ttl
+        self.max_age = max_age
+        self._snapshots: Dict[str, AnalyticsSnapshot] = {}
+        self._generation = 0
+
+    def peek(self, name: str) -> Optional[AnalyticsSnapshot]:
+        """The report's snapshot if it can be served without touching the database."""
+        snapshot = self._snapshots.get(name)
+        if (
+            snapshot is None
+            or snapshot.generation != self._generation
+            or time.monotonic() - snapshot.checked_at > self.ttl
+            or snapshot.age() > self.max_age
+        ):
+            return None
+        return snapshot
+
+    def get(self, db: Session, name: str) -> AnalyticsSnapshot:
+        snapshot = self.peek(name)
+        if snapshot is not None:
+            return snapshot
+
+        # A commit while computing leaves the new snapshot on an old generation
+        generation = self._generation
+        versions = crud.get_table_versions(db, ANALYTICS_TABLES)
+        if behind_local_commits(versions):
+            # A replica missing this process's writes: answer from it, but
+            # keep it out of the cache the writer reads too
+            return AnalyticsSnapshot(versions, REPORTS[name](db), generation)
+        previous = self._snapshots.get(name)
+        if (
+            previous is not None
+            and previous.generation == generation
+            and previous.versions == versions
+            and previous.age() <= self.max_age
+        ):
+            # TTL expired but nobody wrote: keep the figures, restart the clock
+            snapshot = AnalyticsSnapshot(versions, previous.data, generation, previous)
+        else:
+            snapshot = AnalyticsSnapshot(versions, REPORTS[name](db), generation)
+        self._snapshots[name] = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._generation += 1
+
+    def clear(self):
+        self._snapshots.clear()
+        self.invalidate()
+
+
+analytics_cache = AnalyticsCache()
+
+
+@on_commit
+def _receive_commit(session, versions):
+    if any(name in versions for name in ANALYTICS_TABLES):
+        analytics_cache.invalidate()
@@ -0,0 +1,342 @@
+"""AsyncSession counterparts of every function in crud.py.
+
+Statements are built by the same helpers as the sync path so both modes
+run identical SQL; only the session calls are awaited.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models, schemas
+from .crud import (
+    attach_department_name,
+    attach_department_names,
+    attach_employee_count,
+    bulk_changes_values,
+    bulk_delete_employees_stmt,
+    bulk_insert_employees_stmt,
+    bulk_update_employees_stmt,
+    count_employees_stmt,
+    count_selected_stmt,
+    database_error_message,
+    department_count_deltas,
+    department_count_updates,
+    delete_department_stmt,
+    delete_employee_stmt,
+    department_names_stmt,
+    departments_stmt,
+    employee_changes_stmt,
+    employee_params,
+    employee_rows_stmt,
+    employee_stmt,
+    employee_update_values,
+    employees_stmt,
+    export_employees_stmt,
+    inserted_ids,
+    missing_department_ids,
+    move_employee_count_stmt,
+    moved_employee_deltas,
+    note_employee_writes,
+    previous_departments_stmt,
+    recount_departments_stmt,
+    rename_department_employees_stmt,
+    table_versions_stmt,
+    unassign_department_stmt,
+    update_department_stmt,
+    update_employee_stmt,
+    UPDATE_FROM_RETURNING,
+)
+
+
+async def get_employees(
+    db: AsyncSession,
+    filters: Optional[schemas.EmployeeFilter] = None,
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+    department_names: Optional[Dict[int, str]] = None,
+):
+    result = await db.execute(
+        employees_stmt(filters, sort, descending, after, limit, with_department=department_names is None)
+    )
+    employees = result.scalars().all()
+    if department_names is None:
+        for employee in employees:
+            attach_department_name(employee)
+        return employees
+
+    missing = missing_department_ids(employees, department_names)
+    if missing:
+        found = (await db.execute(department_names_stmt(missing))).all()
+        department_names = {**department_names, **dict(found)}
+    return attach_department_names(employees, department_names)
+
+
+async def get_employee_rows(
+    db: AsyncSession,
+    filters: Optional[schemas.EmployeeFilter] = None,
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+):
+    result = await db.execute(employee_rows_stmt(filters, sort, descending, after, limit))
+    return result.all()
+
+
+async def count_employees(db: AsyncSession, filters: Optional[schemas.EmployeeFilter] = None):
+    return (await db.execute(count_employees_stmt(filters))).scalar()
+
+
+async def stream_employees(
+    db: AsyncSession,
+    filters: Optional[schemas.EmployeeFilter] = None,
+    batch_size: int = 1000,
+):
+    """Yield batches of plain rows from a server-side cursor, in id order."""
+    result = await db.stream(
+        export_employees_stmt(filters),
+        execution_options={"yield_per": batch_size},
+    )
+    try:
+        async for batch in result.partitions():
+            yield batch
+    finally:
+        await result.close()
+
+
+async def get_employee(db: AsyncSession, employee_id: int):
+    # populate_existing refreshes an instance already in the identity map,
+    # since expire_on_commit is off for async sessions
+    result = await db.execute(
+        employee_stmt(employee_id).execution_options(populate_existing=True)
+    )
+    employee = result.scalars().first()
+    if employee:
+        attach_department_name(employee)
+    return employee
+
+
+async def get_employee_row(db: AsyncSession, employee_id: int):
+    result = await db.execute(employee_rows_stmt().where(models.Employee.id == employee_id))
+    return result.first()
+
+
+async def create_employee(db: AsyncSession, employee: schemas.EmployeeCreate):
+    db_employee = models.Employee(
+        name=employee.name,
+        age=employee.age,
+        city=employee.city,
+        department_id=employee.department_id,
+    )
+    db.add(db_employee)
+    for stmt in department_count_updates({employee.department_id: 1}):
+        await db.execute(stmt)
+    await db.commit()
+    await db.refresh(db_employee)
+    return db_employee
+
+
+async def bulk_create_employees(
+    db: AsyncSession,
+    employees: List[schemas.EmployeeCreate],
+    batch_size: int = 1000,
+    atomic: bool = True,
+):
+    """See crud.bulk_create_employees."""
+    dialect_name = db.get_bind().dialect.name
+    stmt = bulk_insert_employees_stmt(dialect_name)
+    ids: List[Optional[int]] = [None] * len(employees)
+    failed: List[Tuple[int, str]] = []
+
+    pending = [(start, employees[start:start + batch_size]) for start in range(0, len(employees), batch_size)]
+    pending.reverse()
+    while pending:
+        start, batch = pending.pop()
+        try:
+            batch_ids = (await db.execute(stmt, employee_params(batch))).scalars().all()
+            batch_ids = inserted_ids(dialect_name, batch_ids)
+            note_employee_writes(db, batch_ids, batch)
+            for count_stmt in department_count_updates(department_count_deltas(batch)):
+                await db.execute(count_stmt)
+            if not atomic:
+                await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            message = database_error_message(e)
+            if atomic:
+                return [None] * len(employees), [
+                    (index, message) for index in range(start, start + len(batch))
+                ]
+            if len(batch) > 1:
+                # Retry both halves until the failing rows are on their own
+                middle = len(batch) // 2
+                pending += [(start + middle, batch[middle:]), (start, batch[:middle])]
+            else:
+                failed.append((start, message))
+            continue
+        ids[start:start + len(batch)] = batch_ids
+
+    if atomic:
+        await db.commit()
+    return ids, failed
+
+
+async def update_employee(db: AsyncSession, employee_id: int, employee: schemas.EmployeeUpdate):
+    """See crud.update_employee."""
+    values = employee_update_values(employee)
+    if not values:
+        return await get_employee_row(db, employee_id)
+    if "department_id" in values:
+        await db.execute(move_employee_count_stmt(employee_id, values["department_id"]))
+    row = (await db.execute(update_employee_stmt(employee_id, values))).first()
+    if row is None:
+        await db.rollback()
+        return None
+    note_employee_writes(db, [row.id], [row])
+    await db.commit()
+    return row
+
+
+async def delete_employee(db: AsyncSession, employee_id: int):
+    department_id = (await db.execute(delete_employee_stmt(employee_id))).first()
+    if department_id is None:
+        await db.rollback()
+        return False
+    note_employee_writes(db, [employee_id], [None])
+    for stmt in department_count_updates({department_id[0]: -1}):
+        await db.execute(stmt)
+    await db.commit()
+    return True
+
+
+async def bulk_delete_employees(db: AsyncSession, selection: schemas.EmployeeSelection, dry_run: bool = False) -> int:
+    """See crud.bulk_delete_employees."""
+    if dry_run:
+        return (await db.execute(count_selected_stmt(selection))).scalar()
+    rows = (await db.execute(bulk_delete_employees_stmt(selection))).all()
+    if rows:
+        note_employee_writes(db, [row.id for row in rows], [None] * len(rows))
+        await db.execute(recount_departments_stmt({row.department_id for row in rows}))
+    await db.commit()
+    return len(rows)
+
+
+async def bulk_update_employees(
+    db: AsyncSession, selection: schemas.EmployeeSelection, changes: schemas.EmployeeBulkChanges, dry_run: bool = False
+) -> int:
+    """See crud.bulk_update_employees."""
+    if dry_run:
+        return (await db.execute(count_selected_stmt(selection))).scalar()
+    values = bulk_changes_values(changes)
+    dialect_name = db.get_bind().dialect.name
+    previous = None
+    if "department_id" in values and dialect_name not in UPDATE_FROM_RETURNING:
+        previous = dict((await db.execute(previous_departments_stmt(selection))).all())
+    rows = (await db.execute(bulk_update_employees_stmt(selection, values, dialect_name))).all()
+    if rows:
+        note_employee_writes(db, [row.id for row in rows], rows)
+        if "department_id" in values:
+            for stmt in department_count_updates(moved_employee_deltas(rows, previous)):
+                await db.execute(stmt)
+    await db.commit()
+    return len(rows)
+
+
+async def reassign_department(
+    db: AsyncSession, department_id: int, target_department_id: int, dry_run: bool = False
+) -> int:
+    selection = schemas.EmployeeSelection(department_id=department_id)
+    if dry_run:
+        return (await db.execute(count_selected_stmt(selection))).scalar()
+    rows = (await db.execute(
+        bulk_update_employees_stmt(selection, {"department_id": target_department_id}, db.get_bind().dialect.name)
+    )).all()
+    if rows:
+        note_employee_writes(db, [row.id for row in rows], rows)
+        moved = moved_employee_deltas(rows, dict.fromkeys((row.id for row in rows), department_id))
+        for stmt in department_count_updates(moved):
+            await db.execute(stmt)
+    await db.commit()
+    return len(rows)
+
+
+# Department CRUD operations
+async def get_departments(db: AsyncSession):
+    return [attach_employee_count(row) for row in await db.execute(departments_stmt())]
+
+
+async def get_department(db: AsyncSession, department_id: int):
+    result = await db.execute(
+        departments_stmt().filter(models.Department.id == department_id)
+    )
+    row = result.first()
+    return attach_employee_count(row) if row else None
+
+
+async def create_department(db: AsyncSession, department: schemas.DepartmentCreate):
+    db_department = models.Department(
+        name=department.name,
+        description=department.description,
+    )
+    db.add(db_department)
+    await db.commit()
+    await db.refresh(db_department)
+    return db_department
+
+
+async def update_department(db: AsyncSession, department_id: int, department: schemas.DepartmentUpdate):
+    await db.execute(rename_department_employees_stmt(department_id, department.name))
+    row = (await db.execute(update_department_stmt(department_id, department))).first()
+    if row is None:
+        await db.rollback()
+        return None
+    await db.commit()
+    return row
+
+
+async def delete_department(db: AsyncSession, department_id: int):
+    unassigned = (await db.execute(unassign_department_stmt(department_id))).all()
+    if (await db.execute(delete_department_stmt(department_id))).first() is None:
+        await db.rollback()
+        return False
+    note_employee_writes(db, [row.id for row in unassigned], unassigned)
+    await db.commit()
+    return True
+
+
+async def get_table_versions(db: AsyncSession, names: Tuple[str, ...]) -> Dict[str, int]:
+    return dict((await db.execute(table_versions_stmt(names))).all())
+
+
+async def get_employee_changes(
+    db: AsyncSession, after: Tuple[int, bool, int] = (0, False, 0), limit: int = 100, deleted_after: int = 0
+):
+    return (await db.execute(employee_changes_stmt(after, limit, deleted_after))).all()
+
+
+# The counterpart of each crud function, for main.run_db
+ASYNC_COUNTERPARTS = {
+    crud.get_employees: get_employees,
+    crud.get_employee_rows: get_employee_rows,
+    crud.count_employees: count_employees,
+    crud.stream_employees: stream_employees,
+    crud.get_employee: get_employee,
+    crud.get_employee_row: get_employee_row,
+    crud.create_employee: create_employee,
+    crud.bulk_create_employees: bulk_create_employees,
+    crud.update_employee: update_employee,
+    crud.delete_employee: delete_employee,
+    crud.bulk_delete_employees: bulk_delete_employees,
+    crud.bulk_update_employees: bulk_update_employees,
+    crud.reassign_department: reassign_department,
+    crud.get_departments: get_departments,
+    crud.get_department: get_department,
+    crud.create_department: create_department,
+    crud.update_department: update_department,
+    crud.delete_department: delete_department,
+    crud.get_table_versions: get_table_versions,
+    crud.get_employee_changes: get_employee_changes,
+}
@@ -0,0 +1,185 @@
+"""Commit-ordered revisions behind GET /employees/changes.
+
+Every write to an employee or department leaves the row's revision null,
+meaning written but not yet stamped. Just before the transaction commits,
+the rows it wrote are stamped with the table's new version from
+reference_versions, and the employees it deleted are recorded as
+tombstones under the same number. The stamp runs while the transaction
+still holds the lock on that version row (see table_versions.on_bump), so
+revisions become visible in the order they were issued: a reader that has
+seen revision n will never later find a change numbered n or below.
+
+A feed position is (revision, deleted, key), where key is the employee id
+for a live employee and the tombstone id for a deletion, plus a floor:
+tombstones at or below it are skipped. A client starting without a cursor
+gets the employees version of that moment as its floor, since it never
+held the employees deleted before then.
+
+Tombstones older than CHANGE_FEED_RETENTION_SECONDS are pruned, at most
+every CHANGE_FEED_PRUNE_INTERVAL seconds per worker, by a transaction
+that deletes employees. The revision pruned through is kept in
+reference_versions; a cursor behind it may have missed deletions and is
+refused.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import Session, object_session
+
+from . import crud, models
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .table_versions import DEPARTMENTS, EMPLOYEE_COUNTS_ONLY, EMPLOYEES, on_bump, on_commit
+
+# Seconds tombstones are kept; clients must read the feed more often than this
+CHANGE_FEED_RETENTION_SECONDS = float(os.getenv("CHANGE_FEED_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Seconds between a worker's pruning passes
+CHANGE_FEED_PRUNE_INTERVAL = float(os.getenv("CHANGE_FEED_PRUNE_INTERVAL", "600"))
+
+# reference_versions row holding the revision tombstones were pruned through
+TOMBSTONES_PRUNED = "employee_tombstones_pruned"
+
+# Version name of each table whose rows carry a revision
+STAMPED_MODELS = {
+    EMPLOYEES: models.Employee,
+    DEPARTMENTS: models.Department,
+}
+
+CURSOR_SORT = "changes"
+
+# Session.info key holding employees deleted through the ORM
+_DELETED = "deleted_employees"
+
+_last_pruned = 0.0
+
+
+class CursorExpired(Exception):
+    pass
+
+
+class FeedPosition(NamedTuple):
+    revision: int
+    deleted: bool
+    key: int
+    floor: int
+
+
+def start_position(version: Optional[int]) -> FeedPosition:
+    """Position before every employee, skipping deletions up to version."""
+    return FeedPosition(0, False, 0, version or 0)
+
+
+def encode_change_cursor(position: FeedPosition) -> str:
+    return encode_cursor(CURSOR_SORT, [position.revision, position.deleted, position.floor], position.key)
+
+
+def decode_change_cursor(token: str) -> FeedPosition:
+    value, key = decode_cursor(token, CURSOR_SORT)
+    if (
+        not isinstance(value, list)
+        or len(value) != 3
+        or not isinstance(value[0], int)
+        or not isinstance(value[1], bool)
+        or not isinstance(value[2], int)
+    ):
+        raise InvalidCursor("Invalid cursor")
+    return FeedPosition(value[0], value[1], key, value[2])
+
+
+def check_retention(position: FeedPosition, pruned: Optional[int]):
+    """Refuse a position that tombstones were pruned past.
+
+    Read the pruned revision after the changes, so a pruning pass
+    committing in between is noticed.
+    """
+    if pruned and max(position.revision, position.floor) < pruned:
+        raise CursorExpired("Cursor is older than the change feed retention; start again without one")
+
+
+def prune_tombstones(connection, now: datetime) -> int:
+    """Delete tombstones past the retention, recording the revision pruned through."""
+    tombstone = models.EmployeeTombstone
+    through = connection.execute(
+        select(func.max(tombstone.revision)).where(
+            tombstone.deleted_at < now - timedelta(seconds=CHANGE_FEED_RETENTION_SECONDS)
+        )
+    ).scalar()
+    if through is None:
+        return 0
+    version = models.ReferenceVersion
+    connection.execute(
+        update(version).where(version.name == TOMBSTONES_PRUNED, version.version < through).values(version=through)
+    )
+    return connection.execute(delete(tombstone).where(tombstone.revision <= through)).rowcount
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _receive_do_orm_execute(orm_execute_state):
+    # UPDATE statements leave their rows to be stamped at commit; employee
+    # counter adjustments are not department edits
+    mapper = orm_execute_state.bind_mapper
+    if (
+        orm_execute_state.is_update
+        and mapper is not None
+        and mapper.class_ in STAMPED_MODELS.values()
+        and not orm_execute_state.execution_options.get(EMPLOYEE_COUNTS_ONLY)
+    ):
+        orm_execute_state.statement = orm_execute_state.statement.values(revision=None)
+
+
+@event.listens_for(models.Employee, "before_update")
+@event.listens_for(models.Department, "before_update")
+def _receive_before_update(mapper, connection, target):
+    # Objects modified through the ORM
+    if object_session(target).is_modified(target, include_collections=False):
+        target.revision = None
+
+
+@event.listens_for(Session, "after_flush")
+def _receive_after_flush(session, flush_context):
+    deleted = [instance.id for instance in session.deleted if isinstance(instance, models.Employee)]
+    if deleted:
+        session.info.setdefault(_DELETED, []).extend(deleted)
+
+
+def deleted_employee_ids(session: Session):
+    written = session.info.get(crud.WRITTEN_EMPLOYEES, [])
+    deleted = session.info.pop(_DELETED, []) + [i for i, employee in written if employee is None]
+    return list(dict.fromkeys(deleted))
+
+
+@on_bump
+def _stamp(session, versions):
+    global _last_pruned
+    # Core statements on the session's connection, unseen by the ORM hooks above
+    connection = session.connection()
+    now = datetime.now(timezone.utc)
+    for name, model in STAMPED_MODELS.items():
+        if name in versions:
+            connection.execute(
+                update(model).where(model.revision.is_(None)).values(revision=versions[name], updated_at=now)
+            )
+    deleted = deleted_employee_ids(session)
+    if deleted and EMPLOYEES in versions:
+        connection.execute(
+            insert(models.EmployeeTombstone),
+            [{"employee_id": i, "revision": versions[EMPLOYEES], "deleted_at": now} for i in deleted],
+        )
+        # Under the employees version lock, so no tombstone is added meanwhile
+        if time.monotonic() - _last_pruned >= CHANGE_FEED_PRUNE_INTERVAL:
+            _last_pruned = time.monotonic()
+            prune_tombstones(connection, now)
+
+
+@on_commit
+def _receive_commit(session, versions):
+    # Stamped; the next transaction on this session starts without them
+    session.info.pop(crud.WRITTEN_EMPLOYEES, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _receive_after_rollback(session):
+    session.info.pop(_DELETED, None)
+    session.info.pop(crud.WRITTEN_EMPLOYEES, None)
@@ -1,30 +1,275 @@
+import os
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, false, func, insert, null, or_, select, true, union_all, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, selectinload
 from . import models, schemas
+from .table_versions import EMPLOYEE_COUNTS_ONLY
+
+# Serve Department.employee_count from the denormalised counter column
+# instead of counting employees on every read
+USE_DEPARTMENT_COUNTER = os.getenv("DB_DEPARTMENT_COUNTER", "false").lower() in ("1", "true", "yes")
+
+
+# Columns the employee list can be ordered by; id is always the tie-breaker
+EMPLOYEE_SORT_COLUMNS = {
+    "id": models.Employee.id,
+    "name": models.Employee.name,
+    "age": models.Employee.age,
+    "city": models.Employee.city,
+}
+
+
+def _filter_employees(query, filters: Optional[schemas.EmployeeFilter]):
+    if filters is None:
+        return query
+    if filters.department_id is not None:
+        query = query.filter(models.Employee.department_id == filters.department_id)
+    if filters.city is not None:
+        query = query.filter(models.Employee.city == filters.city)
+    if filters.min_age is not None:
+        query = query.filter(models.Employee.age >= filters.min_age)
+    if filters.max_age is not None:
+        query = query.filter(models.Employee.age <= filters.max_age)
+    return query
+
+
+def _page_employees(
+    stmt,
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+):
+    sort_column = EMPLOYEE_SORT_COLUMNS[sort]
+    id_column = models.Employee.id
+
+    # Keyset pagination: continue strictly after the (sort value, id) of the
+    # last row already returned, so deep pages cost the same as the first one
+    if after is not None:
+        last_value, last_id = after
+        if sort == "id":
+            stmt = stmt.filter(id_column < last_id if descending else id_column > last_id)
+        elif descending:
+            stmt = stmt.filter(or_(
+                sort_column < last_value,
+                and_(sort_column == last_value, id_column < last_id),
+            ))
+        else:
+            stmt = stmt.filter(or_(
+                sort_column > last_value,
+                and_(sort_column == last_value, id_column > last_id),
+            ))
+
+    if sort == "id":
+        order = [id_column.desc() if descending else id_column.asc()]
+    elif descending:
+        order = [sort_column.desc(), id_column.desc()]
+    else:
+        order = [sort_column.asc(), id_column.asc()]
+    stmt = stmt.order_by(*order)
+
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
 
+def employees_stmt(
+    filters: Optional[schemas.EmployeeFilter] = None,
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+    with_department: bool = True,
+):
+    stmt = select(models.Employee)
+    if with_department:
+        stmt = stmt.options(selectinload(models.Employee.department))
+    return _page_employees(_filter_employees(stmt, filters), sort, descending, after, limit)
 
-def get_employees(db: Session):
-    employees = db.query(models.Employee).options(
+
+# Columns of the employee response, in schemas.Employee field order
+EMPLOYEE_ROW_COLUMNS = {
+    "name": models.Employee.name,
+    "age": models.Employee.age,
+    "city": models.Employee.city,
+    "department_id": models.Employee.department_id,
+    "id": models.Employee.id,
+    "department_name": models.Department.name.label("department_name"),
+}
+
+
+def _employee_rows_select(columns):
+    return select(*columns).outerjoin(
+        models.Department, models.Employee.department_id == models.Department.id
+    )
+
+
+def employee_rows_stmt(
+    filters: Optional[schemas.EmployeeFilter] = None,
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+):
+    """The employee list as plain rows, department name joined in SQL."""
+    stmt = _employee_rows_select(EMPLOYEE_ROW_COLUMNS.values())
+    return _page_employees(_filter_employees(stmt, filters), sort, descending, after, limit)
+
+
+def count_employees_stmt(filters: Optional[schemas.EmployeeFilter] = None):
+    return _filter_employees(select(func.count(models.Employee.id)), filters)
+
+
+def employee_stmt(employee_id: int):
+    return select(models.Employee).options(
         selectinload(models.Employee.department)
-    ).all()
-    
-    # Manually add department_name to each employee
+    ).filter(models.Employee.id == employee_id)
+
+
+def attach_department_name(employee):
+    # Manually add department_name to the employee for the response model
+    employee.department_name = employee.department.name if employee.department else None
+    return employee
+
+
+def missing_department_ids(employees, department_names: Dict[int, str]):
+    return {
+        employee.department_id
+        for employee in employees
+        if employee.department_id is not None and employee.department_id not in department_names
+    }
+
+
+def department_names_stmt(department_ids):
+    return select(models.Department.id, models.Department.name).where(
+        models.Department.id.in_(department_ids)
+    )
+
+
+def attach_department_names(employees, department_names: Dict[int, str]):
     for employee in employees:
-        employee.department_name = employee.department.name if employee.department else None
-    
+        employee.department_name = department_names.get(employee.department_id)
     return employees
 
 
+def department_count_updates(deltas: Dict[Optional[int], int]):
+    """UPDATE statements applying per-department employee count changes."""
+    return [
+        update(models.Department)
+        .where(models.Department.id == department_id)
+        .values(cached_employee_count=models.Department.cached_employee_count + delta)
+        .execution_options(**{EMPLOYEE_COUNTS_ONLY: True})
+        for department_id, delta in deltas.items()
+        if department_id is not None and delta
+    ]
+
+
+# Session.info keys announcing employee writes the ORM does not track
+# (INSERT/UPDATE/DELETE statements, CSV merges) to in-process indexes and
+# the change feed's tombstones
+WRITTEN_EMPLOYEES = "written_employees"
+UNTRACKED_EMPLOYEE_WRITES = "untracked_employee_writes"
+
+
+def note_employee_writes(db: Session, ids: List[int], employees: List[Optional[Any]]):
+    """Record the new state of employees written by statement; None marks a
+    deleted employee. Anything with name, city and department_id will do."""
+    db.info.setdefault(WRITTEN_EMPLOYEES, []).extend(zip(ids, employees))
+
+
+def note_untracked_employee_writes(db: Session):
+    db.info[UNTRACKED_EMPLOYEE_WRITES] = True
+
+
+def department_count_deltas(employees: List[schemas.EmployeeCreate]) -> Dict[Optional[int], int]:
+    return Counter(employee.department_id for employee in employees)
+
+
+def get_employees(
+    db: Session,
+    filters: Optional[schemas.EmployeeFilter] = None,
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+    department_names: Optional[Dict[int, str]] = None,
+):
+    """List employees; department_names (e.g. from the reference cache)
+    replaces the per-request department load when given."""
+    employees = db.execute(
+        employees_stmt(filters, sort, descending, after, limit, with_department=department_names is None)
+    ).scalars().all()
+    if department_names is None:
+        for employee in employees:
+            attach_department_name(employee)
+        return employees
+
+    # Departments created since the names were captured are looked up once
+    missing = missing_department_ids(employees, department_names)
+    if missing:
+        department_names = {**department_names, **dict(db.execute(department_names_stmt(missing)).all())}
+    return attach_department_names(employees, department_names)
+
+
+def get_employee_rows(
+    db: Session,
+    filters: Optional[schemas.EmployeeFilter] = None,
+    sort: str = "id",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+):
+    """Like get_employees, but returns Row tuples (EMPLOYEE_ROW_COLUMNS)
+    without building ORM objects."""
+    return db.execute(employee_rows_stmt(filters, sort, descending, after, limit)).all()
+
+
+def count_employees(db: Session, filters: Optional[schemas.EmployeeFilter] = None):
+    return db.execute(count_employees_stmt(filters)).scalar()
+
+
+# Columns emitted by the export stream, department name resolved in SQL
+EXPORT_COLUMNS = ("id", "name", "age", "city", "department_id", "department_name")
+
+
+def export_employees_stmt(filters: Optional[schemas.EmployeeFilter] = None):
+    stmt = _employee_rows_select(
+        EMPLOYEE_ROW_COLUMNS[column] for column in EXPORT_COLUMNS
+    ).order_by(models.Employee.id)
+    return _filter_employees(stmt, filters)
+
+
+def stream_employees(
+    db: Session,
+    filters: Optional[schemas.EmployeeFilter] = None,
+    batch_size: int = 1000,
+):
+    """Yield batches of plain rows from a server-side cursor, in id order."""
+    result = db.execute(
+        export_employees_stmt(filters),
+        execution_options={"stream_results": True, "yield_per": batch_size},
+    )
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
 def get_employee(db: Session, employee_id: int):
-    employee = db.query(models.Employee).options(
-        selectinload(models.Employee.department)
-    ).filter(models.Employee.id == employee_id).first()
-    
+    employee = db.execute(employee_stmt(employee_id)).scalars().first()
     if employee:
-        employee.department_name = employee.department.name if employee.department else None
-    
+        attach_department_name(employee)
     return employee
 
 
+def get_employee_row(db: Session, employee_id: int):
+    return db.execute(employee_rows_stmt().where(models.Employee.id == employee_id)).first()
+
+
 def create_employee(db: Session, employee: schemas.EmployeeCreate):
     db_employee = models.Employee(
         name=employee.name,
@@ -33,55 +278,365 @@ def create_employee(db: Session, employee: schemas.EmployeeCreate):
         department_id=employee.department_id,
     )
     db.add(db_employee)
+    for stmt in department_count_updates({employee.department_id: 1}):
+        db.execute(stmt)
     db.commit()
     db.refresh(db_employee)
     return db_employee
 
 
+def bulk_insert_employees_stmt(dialect_name: str):
+    """Multi-row INSERT ... RETURNING id, the ids in parameter order once
+    passed through inserted_ids."""
+    stmt = insert(models.Employee)
+    if dialect_name == "sqlite":
+        # SQLAlchemy can only order SQLite's RETURNING rows by inserting one
+        # row per statement; inserted_ids sorts them instead
+        return stmt.returning(models.Employee.id)
+    return stmt.returning(models.Employee.id, sort_by_parameter_order=True)
+
+
+def inserted_ids(dialect_name: str, ids: List[int]) -> List[int]:
+    # SQLite numbers new rows in VALUES order (one past the largest rowid),
+    # so ascending ids follow the parameters
+    return sorted(ids) if dialect_name == "sqlite" else list(ids)
+
+
+def employee_params(employees: List[schemas.EmployeeCreate]):
+    return [
+        {
+            "name": employee.name,
+            "age": employee.age,
+            "city": employee.city,
+            "department_id": employee.department_id,
+        }
+        for employee in employees
+    ]
+
+
+def bulk_create_employees(
+    db: Session,
+    employees: List[schemas.EmployeeCreate],
+    batch_size: int = 1000,
+    atomic: bool = True,
+):
+    """Insert employees in batches of multi-row INSERT ... RETURNING.
+
+    Returns (ids, failed) where ids is aligned with the input (None for rows
+    that were not inserted) and failed lists (index, message) per failed row.
+    In atomic mode one failing batch rolls back everything; otherwise each
+    batch is committed on its own and a failing batch is split in halves and
+    retried, so only the rows the database rejects fail, each with its own
+    error.
+    """
+    dialect_name = db.get_bind().dialect.name
+    stmt = bulk_insert_employees_stmt(dialect_name)
+    ids: List[Optional[int]] = [None] * len(employees)
+    failed: List[Tuple[int, str]] = []
+
+    pending = [(start, employees[start:start + batch_size]) for start in range(0, len(employees), batch_size)]
+    pending.reverse()
+    while pending:
+        start, batch = pending.pop()
+        try:
+            batch_ids = db.execute(stmt, employee_params(batch)).scalars().all()
+            batch_ids = inserted_ids(dialect_name, batch_ids)
+            note_employee_writes(db, batch_ids, batch)
+            for count_stmt in department_count_updates(department_count_deltas(batch)):
+                db.execute(count_stmt)
+            if not atomic:
+                db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            message = database_error_message(e)
+            if atomic:
+                return [None] * len(employees), [
+                    (index, message) for index in range(start, start + len(batch))
+                ]
+            if len(batch) > 1:
+                # Retry both halves until the failing rows are on their own
+                middle = len(batch) // 2
+                pending += [(start + middle, batch[middle:]), (start, batch[:middle])]
+            else:
+                failed.append((start, message))
+            continue
+        ids[start:start + len(batch)] = batch_ids
+
+    if atomic:
+        db.commit()
+    return ids, failed
+
+
+def database_error_message(error: SQLAlchemyError) -> str:
+    """The driver's message for error, first line only."""
+    detail = str(getattr(error, "orig", None) or error.__class__.__name__).splitlines()
+    return f"Database error: {detail[0] if detail else error.__class__.__name__}"
+
+
+def employee_returning():
+    """EMPLOYEE_ROW_COLUMNS for a RETURNING clause: the department name
+    comes from a correlated subquery, as RETURNING cannot join."""
+    department_name = (
+        select(models.Department.name)
+        .where(models.Department.id == models.Employee.department_id)
+        .correlate(models.Employee)
+        .scalar_subquery()
+        .label("department_name")
+    )
+    return [department_name if name == "department_name" else column for name, column in EMPLOYEE_ROW_COLUMNS.items()]
+
+
+def employee_update_values(employee: schemas.EmployeeUpdate) -> Dict[str, Any]:
+    return {
+        field: value
+        for field, value in employee.model_dump(include={"name", "age", "city", "department_id"}).items()
+        if value is not None
+    }
+
+
+def update_employee_stmt(employee_id: int, values: Dict[str, Any]):
+    return (
+        update(models.Employee)
+        .where(models.Employee.id == employee_id)
+        # A local edit makes a synced employee differ from upstream
+        .values(**values, content_hash=None)
+        .returning(*employee_returning())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def move_employee_count_stmt(employee_id: int, department_id: int):
+    """Move the employee from its current department's count to department_id's.
+
+    The current department is read in SQL, so this runs before the employee
+    UPDATE and changes nothing when the department stays the same.
+    """
+    department = models.Department
+    current = select(models.Employee.department_id).where(models.Employee.id == employee_id).scalar_subquery()
+    return (
+        update(department)
+        .where(or_(department.id == department_id, department.id == current))
+        .where(current.is_distinct_from(department_id))
+        .values(cached_employee_count=department.cached_employee_count + case((department.id == department_id, 1), else_=-1))
+        .execution_options(synchronize_session=False, **{EMPLOYEE_COUNTS_ONLY: True})
+    )
+
+
+def delete_employee_stmt(employee_id: int):
+    return (
+        delete(models.Employee)
+        .where(models.Employee.id == employee_id)
+        .returning(models.Employee.department_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
 def update_employee(db: Session, employee_id: int, employee: schemas.EmployeeUpdate):
-    db_employee = get_employee(db, employee_id)
-    if not db_employee:
+    """Apply the given fields with one UPDATE ... RETURNING; None if not found.
+
+    Returns the employee as a Row of EMPLOYEE_ROW_COLUMNS. A department
+    change adds one statement moving the employee between the counters.
+    """
+    values = employee_update_values(employee)
+    if not values:
+        return get_employee_row(db, employee_id)
+    if "department_id" in values:
+        db.execute(move_employee_count_stmt(employee_id, values["department_id"]))
+    row = db.execute(update_employee_stmt(employee_id, values)).first()
+    if row is None:
+        db.rollback()
         return None
-    if employee.name is not None:
-        db_employee.name = employee.name
-    if employee.age is not None:
-        db_employee.age = employee.age
-    if employee.city is not None:
-        db_employee.city = employee.city
-    '''
-    VJ - There is no use of checking department in the update case. 
-    if employee.department_id is not None:
-        # Check if department exists
-        department = db.query(models.Department).filter(models.Department.id == employee.department_id).first()
-        if not department:
-            raise ValueError(f"Department with id {employee.department_id} does not exist")
-        db_employee.department_id = employee.department_id
-    '''    
+    note_employee_writes(db, [row.id], [row])
     db.commit()
-    
-    # Refresh with department data
-    db.refresh(db_employee)
-    db_employee.department_name = db_employee.department.name if db_employee.department else None
-    
-    return db_employee
+    return row
 
 
 def delete_employee(db: Session, employee_id: int):
-    db_employee = get_employee(db, employee_id)
-    if not db_employee:
+    department_id = db.execute(delete_employee_stmt(employee_id)).first()
+    if department_id is None:
+        db.rollback()
         return False
-    db.delete(db_employee)
+    note_employee_writes(db, [employee_id], [None])
+    for stmt in department_count_updates({department_id[0]: -1}):
+        db.execute(stmt)
     db.commit()
     return True
 
 
+# Set-based mutations of many employees
+def _select_employees(stmt, selection: schemas.EmployeeSelection):
+    stmt = _filter_employees(stmt, selection)
+    if selection.ids is not None:
+        stmt = stmt.filter(models.Employee.id.in_(selection.ids))
+    return stmt
+
+
+def count_selected_stmt(selection: schemas.EmployeeSelection):
+    return _select_employees(select(func.count(models.Employee.id)), selection)
+
+
+def bulk_delete_employees_stmt(selection: schemas.EmployeeSelection):
+    return _select_employees(
+        delete(models.Employee), selection
+    ).returning(models.Employee.id, models.Employee.department_id).execution_options(synchronize_session=False)
+
+
+# Dialects whose UPDATE ... FROM can return the joined rows' columns
+# (SQLite's RETURNING only sees the updated table)
+UPDATE_FROM_RETURNING = {"postgresql"}
+
+
+def bulk_update_employees_stmt(selection: schemas.EmployeeSelection, values: Dict[str, Any], dialect_name: str):
+    """UPDATE ... RETURNING id, name, city, department_id of the selected
+    employees, plus previous_department_id where the dialect allows: the
+    rows are locked and read in a subquery, so its value is the one the
+    UPDATE replaced."""
+    employee = models.Employee
+    columns = [employee.id, employee.name, employee.city, employee.department_id]
+    stmt = update(employee).values(**values, content_hash=None)
+    if dialect_name in UPDATE_FROM_RETURNING:
+        before = _select_employees(select(employee.id, employee.department_id), selection).with_for_update().subquery("previous")
+        stmt = stmt.where(employee.id == before.c.id)
+        columns.append(before.c.department_id.label("previous_department_id"))
+    else:
+        stmt = _select_employees(stmt, selection)
+    return stmt.returning(*columns).execution_options(synchronize_session=False)
+
+
+def previous_departments_stmt(selection: schemas.EmployeeSelection):
+    """Department of each selected employee, read before the UPDATE where it
+    cannot return them."""
+    return _select_employees(select(models.Employee.id, models.Employee.department_id), selection)
+
+
+def moved_employee_deltas(rows, previous: Optional[Dict[int, Optional[int]]] = None) -> Dict[Optional[int], int]:
+    """Counter changes for employees moved between departments; previous
+    maps ids to departments when the rows lack previous_department_id."""
+    deltas: Counter = Counter()
+    for row in rows:
+        before = row.previous_department_id if previous is None else previous[row.id]
+        if before != row.department_id:
+            deltas[before] -= 1
+            deltas[row.department_id] += 1
+    return deltas
+
+
+def bulk_changes_values(changes: schemas.EmployeeBulkChanges) -> Dict[str, Any]:
+    return {field: value for field, value in changes.model_dump().items() if value is not None}
+
+
+def bulk_delete_employees(db: Session, selection: schemas.EmployeeSelection, dry_run: bool = False) -> int:
+    """Delete the selected employees with one DELETE ... RETURNING.
+
+    The counters of the departments they left are recounted in one more
+    statement. A dry run only counts the selection.
+    """
+    if dry_run:
+        return db.execute(count_selected_stmt(selection)).scalar()
+    rows = db.execute(bulk_delete_employees_stmt(selection)).all()
+    if rows:
+        note_employee_writes(db, [row.id for row in rows], [None] * len(rows))
+        db.execute(recount_departments_stmt({row.department_id for row in rows}))
+    db.commit()
+    return len(rows)
+
+
+def bulk_update_employees(
+    db: Session, selection: schemas.EmployeeSelection, changes: schemas.EmployeeBulkChanges, dry_run: bool = False
+) -> int:
+    """Apply the same changes to every selected employee in one UPDATE.
+
+    A department change moves the counters of the departments the employees
+    came from and went to by deltas, one statement per department.
+    """
+    if dry_run:
+        return db.execute(count_selected_stmt(selection)).scalar()
+    values = bulk_changes_values(changes)
+    dialect_name = db.get_bind().dialect.name
+    previous = None
+    if "department_id" in values and dialect_name not in UPDATE_FROM_RETURNING:
+        previous = dict(db.execute(previous_departments_stmt(selection)).all())
+    rows = db.execute(bulk_update_employees_stmt(selection, values, dialect_name)).all()
+    if rows:
+        note_employee_writes(db, [row.id for row in rows], rows)
+        if "department_id" in values:
+            for stmt in department_count_updates(moved_employee_deltas(rows, previous)):
+                db.execute(stmt)
+    db.commit()
+    return len(rows)
+
+
+def reassign_department(db: Session, department_id: int, target_department_id: int, dry_run: bool = False) -> int:
+    """Move every employee of department_id to target_department_id."""
+    selection = schemas.EmployeeSelection(department_id=department_id)
+    if dry_run:
+        return db.execute(count_selected_stmt(selection)).scalar()
+    rows = db.execute(
+        bulk_update_employees_stmt(selection, {"department_id": target_department_id}, db.get_bind().dialect.name)
+    ).all()
+    if rows:
+        note_employee_writes(db, [row.id for row in rows], rows)
+        moved = moved_employee_deltas(rows, dict.fromkeys((row.id for row in rows), department_id))
+        for stmt in department_count_updates(moved):
+            db.execute(stmt)
+    db.commit()
+    return len(rows)
+
+
 # Department CRUD operations
+def counted_employees():
+    # Correlated count, served by the (department_id, id) index
+    return (
+        select(func.count(models.Employee.id))
+        .where(models.Employee.department_id == models.Department.id)
+        .correlate(models.Department)
+        .scalar_subquery()
+    )
+
+
+def department_employee_count():
+    """Per-department employee count, selectable alongside Department."""
+    if USE_DEPARTMENT_COUNTER:
+        return models.Department.cached_employee_count
+    return counted_employees()
+
+
+def recount_departments_stmt(department_ids: Optional[Iterable[Optional[int]]] = None):
+    """Reset the employee counters of the given departments (all if None)
+    from the employees table, in one statement."""
+    stmt = update(models.Department).values(cached_employee_count=counted_employees())
+    if department_ids is not None:
+        stmt = stmt.where(models.Department.id.in_([i for i in department_ids if i is not None]))
+    return stmt.execution_options(synchronize_session=False, **{EMPLOYEE_COUNTS_ONLY: True})
+
+
+def department_counts_stmt():
+    return select(models.Department.id, department_employee_count())
+
+
+def get_department_counts(db: Session) -> Dict[int, int]:
+    return dict(db.execute(department_counts_stmt()).all())
+
+
+def departments_stmt():
+    return select(models.Department, department_employee_count()).order_by(models.Department.id)
+
+
+def attach_employee_count(row):
+    department, employee_count = row
+    department.employee_count = employee_count
+    return department
+
+
 def get_departments(db: Session):
-    return db.query(models.Department).all()
+    return [attach_employee_count(row) for row in db.execute(departments_stmt())]
 
 
 def get_department(db: Session, department_id: int):
-    return db.query(models.Department).filter(models.Department.id == department_id).first()
+    row = db.execute(
+        departments_stmt().filter(models.Department.id == department_id)
+    ).first()
+    return attach_employee_count(row) if row else None
 
 
 def create_department(db: Session, department: schemas.DepartmentCreate):
@@ -95,21 +650,240 @@ def create_department(db: Session, department: schemas.DepartmentCreate):
     return db_department
 
 
+def update_department_stmt(department_id: int, department: schemas.DepartmentUpdate):
+    return (
+        update(models.Department)
+        .where(models.Department.id == department_id)
+        .values(name=department.name, description=department.description)
+        .returning(
+            models.Department.id,
+            models.Department.name,
+            models.Department.description,
+            department_employee_count().label("employee_count"),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def unassign_department_stmt(department_id: int):
+    """Detach a department's employees, returning their new state."""
+    employee = models.Employee
+    return (
+        update(employee)
+        .where(employee.department_id == department_id)
+        .values(department_id=None)
+        .returning(employee.id, employee.name, employee.city, employee.department_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def delete_department_stmt(department_id: int):
+    return (
+        delete(models.Department)
+        .where(models.Department.id == department_id)
+        .returning(models.Department.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rename_department_employees_stmt(department_id: int, name: str):
+    """Mark a department's employees as changed if its name is about to
+    change, since change feed rows carry the department name."""
+    department = models.Department
+    current = select(department.name).where(department.id == department_id).scalar_subquery()
+    return (
+        update(models.Employee)
+        .where(models.Employee.department_id == department_id)
+        .where(current.is_distinct_from(name))
+        .values(revision=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
 def update_department(db: Session, department_id: int, department: schemas.DepartmentUpdate):
-    db_department = get_department(db, department_id)
-    if not db_department:
+    """One UPDATE ... RETURNING, plus one marking the employees on a rename;
+    the Row carries employee_count, or None if not found."""
+    db.execute(rename_department_employees_stmt(department_id, department.name))
+    row = db.execute(update_department_stmt(department_id, department)).first()
+    if row is None:
+        db.rollback()
         return None
-    db_department.name = department.name
-    db_department.description = department.description
     db.commit()
-    db.refresh(db_department)
-    return db_department
+    return row
 
 
 def delete_department(db: Session, department_id: int):
-    db_department = get_department(db, department_id)
-    if not db_department:
+    # Employees are detached first so the foreign key never dangles
+    unassigned = db.execute(unassign_department_stmt(department_id)).all()
+    if db.execute(delete_department_stmt(department_id)).first() is None:
+        db.rollback()
         return False
-    db.delete(db_department)
+    note_employee_writes(db, [row.id for row in unassigned], unassigned)
     db.commit()
     return True
+
+
+def table_versions_stmt(names):
+    return select(models.ReferenceVersion.name, models.ReferenceVersion.version).where(
+        models.ReferenceVersion.name.in_(names)
+    )
+
+
+def get_table_versions(db: Session, names: Tuple[str, ...]) -> Dict[str, int]:
+    return dict(db.execute(table_versions_stmt(names)).all())
+
+
+# Change feed: employees by the revision that last wrote them, then the
+# tombstones of deleted ones, in (revision, deleted, key) order; rows have
+# revision, deleted, key, EXPORT_COLUMNS and changed_at
+def _changes_after(revision, key, deleted: bool, after: Tuple[int, bool, int]):
+    after_revision, after_deleted, after_key = after
+    if deleted == after_deleted:
+        return or_(revision > after_revision, and_(revision == after_revision, key > after_key))
+    # Within a revision employees sort before tombstones
+    return revision >= after_revision if deleted else revision > after_revision
+
+
+def _first_changes(stmt, revision, key, limit: int):
+    # Each side is limited on its own, so both walk their (revision, id) index
+    return select(stmt.order_by(revision, key).limit(limit).subquery())
+
+
+def employee_changes_stmt(after: Tuple[int, bool, int] = (0, False, 0), limit: int = 100, deleted_after: int = 0):
+    """Changes past after, skipping tombstones up to revision deleted_after."""
+    employee, tombstone = models.Employee, models.EmployeeTombstone
+    employees = _employee_rows_select([
+        employee.revision.label("revision"),
+        false().label("deleted"),
+        employee.id.label("key"),
+        employee.id,
+        employee.name,
+        employee.age,
+        employee.city,
+        employee.department_id,
+        models.Department.name.label("department_name"),
+        employee.updated_at.label("changed_at"),
+    ]).where(_changes_after(employee.revision, employee.id, False, after))
+    tombstones = select(
+        tombstone.revision,
+        true().label("deleted"),
+        tombstone.id.label("key"),
+        tombstone.employee_id.label("id"),
+        *(null().label(column) for column in EXPORT_COLUMNS[1:]),
+        tombstone.deleted_at.label("changed_at"),
+    ).where(_changes_after(tombstone.revision, tombstone.id, True, after), tombstone.revision > deleted_after)
+    changes = union_all(
+        _first_changes(employees, employee.revision, employee.id, limit),
+        _first_changes(tombstones, tombstone.revision, tombstone.id, limit),
+    ).subquery()
+    return select(changes).order_by(changes.c.revision, changes.c.deleted, changes.c.key).limit(limit)
+
+
+def get_employee_changes(db: Session, after: Tuple[int, bool, int] = (0, False, 0), limit: int = 100, deleted_after: int = 0):
+    return db.execute(employee_changes_stmt(after, limit, deleted_after)).all()
+
+
+# Analytics: one aggregate statement per report
+# Lower bounds of the age distribution buckets; the last one is open-ended
+AGE_BUCKET_STARTS = (18, 25, 35, 45, 55, 65)
+
+
+def _share(count):
+    # Fraction of all grouped employees, via a window over the groups
+    return count * 1.0 / func.sum(count).over()
+
+
+def workforce_summary_stmt():
+    employee = models.Employee
+    return select(
+        func.count(employee.id).label("employees"),
+        func.avg(employee.age).label("average_age"),
+        func.min(employee.age).label("min_age"),
+        func.max(employee.age).label("max_age"),
+        func.count(func.distinct(employee.city)).label("cities"),
+        select(func.count(models.Department.id)).scalar_subquery().label("departments"),
+        func.count(employee.id).filter(employee.department_id.is_(None)).label("unassigned"),
+    )
+
+
+def headcount_by_department_stmt():
+    employee = models.Employee
+    count = func.count(employee.id)
+    groups = (
+        select(
+            employee.department_id.label("department_id"),
+            count.label("headcount"),
+            func.avg(employee.age).label("average_age"),
+            _share(count).label("share"),
+        )
+        .group_by(employee.department_id)
+        .subquery()
+    )
+    # Departments without employees are listed with a zero headcount, and
+    # unassigned employees as a group with no department
+    departments = select(
+        models.Department.id.label("department_id"),
+        models.Department.name.label("department_name"),
+        func.coalesce(groups.c.headcount, 0).label("headcount"),
+        groups.c.average_age,
+        func.coalesce(groups.c.share, 0).label("share"),
+    ).outerjoin(groups, groups.c.department_id == models.Department.id)
+    unassigned = select(
+        groups.c.department_id,
+        null().label("department_name"),
+        groups.c.headcount,
+        groups.c.average_age,
+        groups.c.share,
+    ).where(groups.c.department_id.is_(None))
+    union = departments.union_all(unassigned).subquery()
+    return select(union).order_by(union.c.headcount.desc(), union.c.department_id.asc().nullslast())
+
+
+def age_bucket():
+    """The lower bound of the employee's AGE_BUCKET_STARTS bucket."""
+    age = models.Employee.age
+    return case(
+        *((age < upper, lower) for lower, upper in zip(AGE_BUCKET_STARTS, AGE_BUCKET_STARTS[1:])),
+        else_=AGE_BUCKET_STARTS[-1],
+    )
+
+
+def age_distribution_stmt():
+    bucket = age_bucket().label("bucket")
+    count = func.count(models.Employee.id)
+    return (
+        select(bucket, count.label("count"), _share(count).label("share"))
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+
+def city_counts_stmt():
+    employee = models.Employee
+    count = func.count(employee.id)
+    return (
+        select(
+            employee.city,
+            count.label("count"),
+            func.avg(employee.age).label("average_age"),
+            _share(count).label("share"),
+        )
+        .group_by(employee.city)
+        .order_by(count.desc(), employee.city)
+    )
+
+
+def get_workforce_summary(db: Session):
+    return db.execute(workforce_summary_stmt()).one()
+
+
+def get_headcount_by_department(db: Session):
+    return db.execute(headcount_by_department_stmt()).all()
+
+
+def get_age_distribution(db: Session):
+    return db.execute(age_distribution_stmt()).all()
+
+
+def get_city_counts(db: Session):
+    return db.execute(city_counts_stmt()).all()
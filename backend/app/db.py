@@ -1,18 +1,154 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 import os
 
+from .metrics import POOL_CHECKOUT_SECONDS, observe_statements
+from .pool_metrics import PoolStats, instrument_engine, instrumented_pool_class
+from .profiling import profile_engine
+from .slow_queries import record_slow_queries
+from .replicas import Replica, ReplicaSet
+
 DB_USER = os.getenv("POSTGRES_USER", "postgres")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 DB_HOST = os.getenv("POSTGRES_HOST", "db")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "employees_db")
 
-DATABASE_URL = (
+# DATABASE_URL overrides the POSTGRES_* settings (e.g. a local SQLite file)
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
-engine = create_engine(DATABASE_URL, future=True)
+# Async drivers used for each sync URL scheme in async mode
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+# Comma-separated read replica URLs; GET routes are spread across them
+REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+# Seconds a replica is skipped after a connection failure
+REPLICA_EJECT_SECONDS = float(os.getenv("DB_REPLICA_EJECT_SECONDS", "30"))
+# Seconds a client's reads stay on the primary after it writes
+STICKY_PRIMARY_SECONDS = int(os.getenv("DB_STICKY_PRIMARY_SECONDS", "5"))
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# DB_ASYNC=true serves every route through AsyncSession instead of the
+# blocking Session, so both modes can be compared under the same load
+DB_ASYNC = env_flag("DB_ASYNC")
+
+# Connection pool sizing; pre-ping and recycle guard against connections
+# left stale by a Postgres failover or an idle timeout
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "true"),
+    "pool_use_lifo": env_flag("DB_POOL_USE_LIFO"),
+}
+
+# Connections each worker opens at startup, so early requests do not pay
+# for connecting; app.serve defaults it to the pool size
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "0"))
+
+
+
+def create_instrumented_engine(url: str, name: str = "primary"):
+    engine = create_engine(
+        url,
+        future=True,
+        poolclass=instrumented_pool_class(QueuePool, PoolStats(POOL_CHECKOUT_SECONDS.labels(name))),
+        **POOL_OPTIONS,
+    )
+    instrument_engine(engine, engine.pool.stats)
+    observe_statements(engine, name)
+    profile_engine(engine)
+    record_slow_queries(engine)
+    return engine
+
+
+def create_instrumented_async_engine(url: str, name: str = "primary_async"):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    async_engine = create_async_engine(
+        url,
+        poolclass=instrumented_pool_class(AsyncAdaptedQueuePool, PoolStats(POOL_CHECKOUT_SECONDS.labels(name))),
+        **POOL_OPTIONS,
+    )
+    instrument_engine(async_engine.sync_engine, async_engine.pool.stats)
+    observe_statements(async_engine.sync_engine, name)
+    profile_engine(async_engine.sync_engine)
+    record_slow_queries(async_engine.sync_engine)
+    return async_engine
+
+
+def warm_up_pool(engine, connections: int):
+    """Open connections at once so the pool keeps them for the first requests."""
+    held = []
+    try:
+        for _ in range(connections):
+            held.append(engine.connect())
+    finally:
+        for connection in held:
+            connection.close()
+
+
+async def warm_up_async_pool(async_engine, connections: int):
+    held = []
+    try:
+        for _ in range(connections):
+            held.append(await async_engine.connect())
+    finally:
+        for connection in held:
+            await connection.close()
+
+
+def async_session_factory(async_engine):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+engine = create_instrumented_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_instrumented_async_engine(ASYNC_DATABASE_URL)
+    AsyncSessionLocal = async_session_factory(async_engine)
+
+
+def _create_replica(index: int, url: str) -> Replica:
+    name = f"replica_{index}"
+    replica_engine = create_instrumented_engine(url, name)
+    replica_async_engine = create_instrumented_async_engine(to_async_url(url), f"{name}_async") if DB_ASYNC else None
+    return Replica(
+        name=name,
+        engine=replica_engine,
+        session_factory=sessionmaker(autocommit=False, autoflush=False, bind=replica_engine),
+        async_engine=replica_async_engine,
+        async_session_factory=async_session_factory(replica_async_engine) if DB_ASYNC else None,
+    )
+
+
+replicas = ReplicaSet(
+    [_create_replica(index, url) for index, url in enumerate(REPLICA_URLS)],
+    eject_seconds=REPLICA_EJECT_SECONDS,
+)
+
 Base = declarative_base()
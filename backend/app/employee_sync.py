@@ -0,0 +1,149 @@
+"""Upsert of employees mirrored from the upstream HR system.
+
+Rows are keyed on external_id and carry a hash of their content. Each
+batch costs one SELECT of the stored hashes and, for the rows that are
+new or changed, one multi-row INSERT ... ON CONFLICT (external_id) DO
+UPDATE. Unchanged rows are not written at all, so re-sending a full
+snapshot only writes what moved upstream. The report counts the rows the
+upsert returned, so a concurrent sync of the same rows is not counted
+twice; on PostgreSQL the upsert also tells inserts from updates. Local edits clear the stored
+hash (see crud.update_employee_stmt), so the next sync restores the
+upstream values.
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+from sqlalchemy import Boolean, literal_column, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+from .importer import ImportReport
+from .validation import describe, validate_batch
+
+# Columns written by a sync, besides external_id
+SYNC_FIELDS = ("name", "age", "city", "department_id")
+
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class SyncReport(ImportReport):
+    def __init__(self):
+        super().__init__()
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+
+def content_hash(employee: schemas.EmployeeSync) -> str:
+    content = json.dumps([getattr(employee, field) for field in SYNC_FIELDS])
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def upsert_employees_stmt(dialect_name: str):
+    insert = _DIALECT_INSERTS[dialect_name]
+    employee = models.Employee
+    stmt = insert(employee)
+    excluded = stmt.excluded
+    columns = [employee.id, employee.external_id, employee.name, employee.city, employee.department_id]
+    if dialect_name == "postgresql":
+        # Rows created by the INSERT have no deleting transaction; the
+        # conflict UPDATE sets xmax to its own
+        columns.append(literal_column("xmax = 0", Boolean).label("inserted"))
+    # The hash check also keeps a concurrent sync of the same rows a no-op
+    return stmt.on_conflict_do_update(
+        index_elements=[employee.external_id],
+        # A null revision has the change feed stamp the row at commit
+        set_={**{field: excluded[field] for field in (*SYNC_FIELDS, "content_hash")}, "revision": None},
+        where=employee.content_hash.is_distinct_from(excluded.content_hash),
+    ).returning(*columns)
+
+
+def stored_hashes_stmt(external_ids: Sequence[str]):
+    employee = models.Employee
+    return select(employee.external_id, employee.content_hash, employee.department_id).where(
+        employee.external_id.in_(external_ids)
+    )
+
+
+def _validate(
+    rows: List[Any], start: int, department_ids: Set[int], seen: Set[str], report: SyncReport
+) -> List[Tuple[schemas.EmployeeSync, str]]:
+    valid_rows, errors = validate_batch(schemas.EmployeeSync, rows)
+    employees = dict(valid_rows)
+    valid = []
+    for position in range(len(rows)):
+        index = start + position
+        if position in errors:
+            report.reject(index, describe(errors[position]))
+            continue
+        employee = employees[position]
+        if employee.department_id is not None and employee.department_id not in department_ids:
+            report.reject(index, f"Department with id {employee.department_id} does not exist")
+            continue
+        # One statement cannot upsert the same key twice
+        if employee.external_id in seen:
+            report.reject(index, f"Duplicate external_id {employee.external_id!r}")
+            continue
+        seen.add(employee.external_id)
+        valid.append((employee, content_hash(employee)))
+    return valid
+
+
+def _inserted(row, stored: Dict[str, Any]) -> bool:
+    # Without PostgreSQL's answer, rows whose key was not stored are new
+    if "inserted" in row._fields:
+        return row.inserted
+    return row.external_id not in stored
+
+
+def sync_employees(db: Session, rows: List[Any], batch_size: int = 1000) -> SyncReport:
+    """Upsert rows (EmployeeSync objects as dicts) in one transaction."""
+    report = SyncReport()
+    department_ids = set(db.execute(select(models.Department.id)).scalars())
+    upsert = upsert_employees_stmt(db.get_bind().dialect.name)
+    seen: Set[str] = set()
+    touched_departments: Set[Any] = set()
+    try:
+        for start in range(0, len(rows), batch_size):
+            batch = _validate(rows[start:start + batch_size], start, department_ids, seen, report)
+            if not batch:
+                continue
+            stored: Dict[str, Tuple[str, Any]] = {
+                external_id: (stored_hash, department_id)
+                for external_id, stored_hash, department_id in db.execute(
+                    stored_hashes_stmt([employee.external_id for employee, _ in batch])
+                )
+            }
+            params = []
+            for employee, digest in batch:
+                previous = stored.get(employee.external_id)
+                if previous is not None and previous[0] == digest:
+                    report.unchanged += 1
+                    continue
+                if previous is not None:
+                    touched_departments.add(previous[1])
+                touched_departments.add(employee.department_id)
+                params.append({
+                    **employee.model_dump(include={"external_id", *SYNC_FIELDS}),
+                    "content_hash": digest,
+                })
+            if params:
+                written = db.execute(upsert, params).all()
+                crud.note_employee_writes(db, [row.id for row in written], written)
+                inserted = sum(1 for row in written if _inserted(row, stored))
+                report.inserted += inserted
+                report.updated += len(written) - inserted
+                # Rows a concurrent sync wrote first
+                report.unchanged += len(params) - len(written)
+        if report.inserted or report.updated:
+            db.execute(crud.recount_departments_stmt(touched_departments))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return report
@@ -0,0 +1,145 @@
+"""Row encodings for the employee list and export.
+
+Besides JSON, NDJSON and CSV, rows can be sent as MessagePack (when the
+msgpack package is installed), in one of two layouts:
+
+- application/msgpack: the column names, then one array of values per
+  row. The list sends {"columns": [...], "rows": [[...], ...]}; the export
+  streams the column array followed by one array per row.
+- application/vnd.employees.columnar+msgpack: one array per column,
+  Arrow-style. city and department_name are dictionary-encoded as
+  {"dictionary": [distinct values], "indices": [index or null per row]}.
+  The list sends one {"length": n, "columns": {...}} batch; the export
+  streams one such batch per chunk, each with its own dictionaries.
+
+Both are encoded straight from the database rows, without building a
+dict per row.
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from .responses import dumps
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+COLUMNAR_MEDIA_TYPE = "application/vnd.employees.columnar+msgpack"
+BINARY_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE)
+
+# Accepted spellings of the MessagePack media type
+MEDIA_TYPE_ALIASES = {"application/x-msgpack": MSGPACK_MEDIA_TYPE}
+
+# Low-cardinality columns sent dictionary-encoded in the columnar format
+DICTIONARY_COLUMNS = ("city", "department_name")
+
+
+def negotiate_format(accept: str, offered: Sequence[str], default: str) -> str:
+    """The first media type of the Accept header that is offered, else default.
+
+    MessagePack types are only offered when msgpack is installed.
+    """
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        if media_type in offered and (msgpack is not None or media_type not in BINARY_MEDIA_TYPES):
+            return media_type
+    return default
+
+
+def negotiate_export_format(accept: str) -> str:
+    """Pick the export media type from an Accept header, NDJSON by default."""
+    return negotiate_format(accept, (CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, *BINARY_MEDIA_TYPES), NDJSON_MEDIA_TYPE)
+
+
+def negotiate_list_format(accept: str) -> str:
+    """Pick the list media type from an Accept header, JSON by default."""
+    return negotiate_format(accept, (JSON_MEDIA_TYPE, *BINARY_MEDIA_TYPES), JSON_MEDIA_TYPE)
+
+
+def _dictionary_encode(values: Sequence[Any]) -> Dict[str, List[Any]]:
+    positions: Dict[Any, int] = {}
+    indices = [None if value is None else positions.setdefault(value, len(positions)) for value in values]
+    return {"dictionary": list(positions), "indices": indices}
+
+
+def columnar_batch(columns: Sequence[str], rows: Sequence) -> Dict[str, Any]:
+    """Rows transposed into one array per column."""
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {
+        "length": len(rows),
+        "columns": {
+            column: _dictionary_encode(column_values) if column in DICTIONARY_COLUMNS else list(column_values)
+            for column, column_values in zip(columns, values)
+        },
+    }
+
+
+def pack_rows(columns: Sequence[str], rows: Sequence) -> bytes:
+    """The list as MessagePack {"columns": [...], "rows": [[...], ...]}."""
+    return msgpack.packb({"columns": list(columns), "rows": rows}, default=tuple)
+
+
+def pack_columns(columns: Sequence[str], rows: Sequence) -> bytes:
+    return msgpack.packb(columnar_batch(columns, rows))
+
+
+def _pack_row_stream(rows: Sequence) -> bytes:
+    """Rows as consecutive MessagePack arrays: one array of rows minus its header."""
+    packed = msgpack.packb(rows, default=tuple)
+    count = len(rows)
+    return packed[1 if count < 16 else 3 if count < 65536 else 5:]
+
+
+def render_list(media_type: str, columns: Sequence[str], rows: Sequence) -> bytes:
+    """Encode one page of the employee list in a negotiated binary format."""
+    if media_type == COLUMNAR_MEDIA_TYPE:
+        return pack_columns(columns, rows)
+    return pack_rows(columns, rows)
+
+
+def render_header(media_type: str, columns: Sequence[str]):
+    """Sent before the first batch: the CSV header row or MessagePack column names."""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(list(columns))
+    if media_type == CSV_MEDIA_TYPE:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow(columns)
+        return buffer.getvalue()
+    return ""
+
+
+def render_batch(media_type: str, columns: Sequence[str], batch: Sequence):
+    """Render one batch of rows as a single chunk in the export format."""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return _pack_row_stream(batch)
+    if media_type == COLUMNAR_MEDIA_TYPE:
+        return pack_columns(columns, batch)
+    if media_type == CSV_MEDIA_TYPE:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(batch)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n"
+        for row in batch
+    )
+
+
+def render_chunks(media_type: str, columns: Sequence[str], batches: Iterable[Sequence]) -> Iterator:
+    header = render_header(media_type, columns)
+    if header:
+        yield header
+    for batch in batches:
+        yield render_batch(media_type, columns, batch)
+
+
+def render_json_array(columns: Sequence[str], rows: Iterable[Sequence]) -> bytes:
+    """Encode rows as the JSON array of objects a response_model would produce."""
+    return dumps([dict(zip(columns, row)) for row in rows])
@@ -0,0 +1,238 @@
+import csv
+import io
+from collections import Counter
+from itertools import islice
+from typing import IO, Iterator, List, Set, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, exists, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from . import crud, models, schemas
+from .validation import describe, validate_batch
+
+# Errors beyond this many are counted but not listed in the report
+MAX_REPORTED_ERRORS = 1000
+
+_stage_metadata = MetaData()
+
+employee_stage = Table(
+    "employees_import_stage",
+    _stage_metadata,
+    Column("name", String(100)),
+    Column("age", Integer),
+    Column("city", String(100)),
+    Column("department_id", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+department_stage = Table(
+    "departments_import_stage",
+    _stage_metadata,
+    Column("name", String(100)),
+    Column("description", String(255)),
+    prefixes=["TEMPORARY"],
+)
+
+
+class InvalidImportFile(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.rejected = 0
+        self.errors: List[schemas.BulkRowError] = []
+
+    def reject(self, index: int, detail: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.BulkRowError(index=index, detail=detail))
+
+
+def _read_chunks(
+    file: IO[str], required: Tuple[str, ...], chunk_size: int
+) -> Iterator[List[Tuple[int, dict]]]:
+    """Stream-parse CSV text, yielding chunks of (row index, row dict)."""
+    reader = csv.DictReader(file)
+    header = [column.strip() for column in reader.fieldnames or []]
+    missing = [column for column in required if column not in header]
+    if missing:
+        raise InvalidImportFile(f"CSV is missing required columns: {', '.join(missing)}")
+    reader.fieldnames = header
+
+    rows = enumerate(reader)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# CSV values arrive as text, so number parsing failures get their own wording
+EMPLOYEE_CSV_MESSAGES = {
+    ("age", "int_parsing"): "Age must be an integer",
+    ("department_id", "int_parsing"): "Department id must be an integer",
+}
+
+
+def _validate_employee_chunk(
+    chunk: List[Tuple[int, dict]], department_ids: Set[int], report: ImportReport
+) -> List[tuple]:
+    rows = [
+        {
+            "name": row.get("name") or "",
+            "age": row.get("age") or "",
+            "city": row.get("city") or "",
+            "department_id": (row.get("department_id") or "").strip() or None,
+        }
+        for _, row in chunk
+    ]
+    valid_rows, errors = validate_batch(schemas.EmployeeCreate, rows)
+    employees = dict(valid_rows)
+
+    valid = []
+    for position, (index, _) in enumerate(chunk):
+        if position in errors:
+            report.reject(index, describe(errors[position], EMPLOYEE_CSV_MESSAGES))
+            continue
+        employee = employees[position]
+        if employee.department_id is not None and employee.department_id not in department_ids:
+            report.reject(index, f"Department with id {employee.department_id} does not exist")
+            continue
+        valid.append((employee.name, employee.age, employee.city, employee.department_id))
+    return valid
+
+
+def _validate_department_chunk(
+    chunk: List[Tuple[int, dict]], seen: Set[str], report: ImportReport
+) -> List[tuple]:
+    rows = [
+        {"name": row.get("name") or "", "description": (row.get("description") or "").strip() or None}
+        for _, row in chunk
+    ]
+    valid_rows, errors = validate_batch(schemas.DepartmentCreate, rows)
+    departments = dict(valid_rows)
+
+    valid = []
+    for position, (index, _) in enumerate(chunk):
+        if position in errors:
+            report.reject(index, describe(errors[position]))
+            continue
+        department = departments[position]
+        if department.name in seen:
+            report.reject(index, f"Duplicate department name {department.name!r}")
+            continue
+        seen.add(department.name)
+        valid.append((department.name, department.description))
+    return valid
+
+
+def _stage_rows(db: Session, stage: Table, rows: List[tuple]):
+    """Append validated rows to the staging table.
+
+    PostgreSQL gets a single COPY FROM STDIN per chunk (through asyncpg's
+    copy_records_to_table when the session runs in async mode); other
+    backends (SQLite in the tests) fall back to an executemany INSERT.
+    """
+    if not rows:
+        return
+    connection = db.connection()
+    columns = [column.name for column in stage.columns]
+    dialect = connection.dialect
+    if dialect.name == "postgresql" and dialect.driver == "asyncpg":
+        # Runs inside AsyncSession.run_sync, so the coroutine can be awaited
+        await_only(connection.connection.driver_connection.copy_records_to_table(
+            stage.name, records=rows, columns=columns
+        ))
+    elif dialect.name == "postgresql":
+        buffer = io.StringIO()
+        # \N marks NULL in COPY's csv format, keeping it apart from ""
+        csv.writer(buffer, lineterminator="\n").writerows(
+            ["\\N" if value is None else value for value in row] for row in rows
+        )
+        buffer.seek(0)
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {stage.name} ({', '.join(columns)}) FROM STDIN "
+                "WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+        finally:
+            cursor.close()
+    else:
+        connection.execute(insert(stage), [dict(zip(columns, row)) for row in rows])
+
+
+def _run_import(db: Session, stage: Table, chunks, validate, merge, after_merge=None) -> Tuple[int, ImportReport]:
+    report = ImportReport()
+    connection = db.connection()
+    stage.drop(connection, checkfirst=True)
+    stage.create(connection)
+    try:
+        for chunk in chunks:
+            _stage_rows(db, stage, validate(chunk, report))
+        # Through the session, so ORM events (reference cache) see the merge
+        imported = db.execute(merge).rowcount
+        for stmt in after_merge() if after_merge else ():
+            db.execute(stmt)
+        stage.drop(connection)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return imported, report
+
+
+def import_employees(db: Session, file: IO[str], chunk_size: int = 10000) -> Tuple[int, ImportReport]:
+    """Load employees from CSV (name, age, city[, department_id]) in one transaction."""
+    chunks = _read_chunks(file, ("name", "age", "city"), chunk_size)
+    department_ids = set(db.execute(select(models.Department.id)).scalars())
+    department_counts: Counter = Counter()
+
+    def validate(chunk, report):
+        rows = _validate_employee_chunk(chunk, department_ids, report)
+        department_counts.update(row[3] for row in rows)
+        return rows
+
+    merge = insert(models.Employee).from_select(
+        ["name", "age", "city", "department_id"],
+        select(
+            employee_stage.c.name,
+            employee_stage.c.age,
+            employee_stage.c.city,
+            employee_stage.c.department_id,
+        ),
+    )
+    # The merged rows never become ORM objects; in-process indexes catch up
+    # from their revisions
+    crud.note_untracked_employee_writes(db)
+    # Every staged row is merged, so department counters move by the staged counts
+    return _run_import(
+        db,
+        employee_stage,
+        chunks,
+        validate,
+        merge,
+        after_merge=lambda: crud.department_count_updates(department_counts),
+    )
+
+
+def import_departments(db: Session, file: IO[str], chunk_size: int = 10000) -> Tuple[int, ImportReport]:
+    """Load departments from CSV (name[, description]), skipping names that already exist."""
+    chunks = _read_chunks(file, ("name",), chunk_size)
+    seen: Set[str] = set()
+    merge = insert(models.Department).from_select(
+        ["name", "description"],
+        select(department_stage.c.name, department_stage.c.description).where(
+            ~exists().where(models.Department.name == department_stage.c.name)
+        ),
+    )
+    return _run_import(
+        db,
+        department_stage,
+        chunks,
+        lambda chunk, report: _validate_department_chunk(chunk, seen, report),
+        merge,
+    )
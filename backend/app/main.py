@@ -1,11 +1,53 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import io
+import json
+import logging
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from .models import Employee, Department, Product, Category
-from . import schemas, crud, models
-from .db import Base, engine, SessionLocal
-from typing import List
+from . import schemas, crud, async_crud, models
+from .db import DB_ASYNC, DB_POOL_WARMUP, STICKY_PRIMARY_SECONDS, AsyncSessionLocal, Base, async_engine, engine, env_flag, replicas, SessionLocal, warm_up_async_pool, warm_up_pool
+from .export import (
+    COLUMNAR_MEDIA_TYPE,
+    CSV_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+    negotiate_export_format,
+    negotiate_list_format,
+    render_batch,
+    render_chunks,
+    render_header,
+    render_json_array,
+    render_list,
+)
+from .change_feed import TOMBSTONES_PRUNED, CursorExpired, FeedPosition, check_retention, decode_change_cursor, encode_change_cursor, start_position
+from .importer import InvalidImportFile, import_departments, import_employees
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .metrics import CONTENT_TYPE_LATEST, STARTUP_SECONDS, MetricsMiddleware, render_metrics
+from .pool_metrics import pool_snapshot
+from .profiling import SQLProfileMiddleware, profile_response_serialization
+from . import analytics, employee_sync
+from .analytics import ANALYTICS_MAX_AGE, analytics_cache
+from .reference_cache import REFERENCE_CACHE_WARMUP, department_cache
+from .replicas import STICKY_COOKIE, sticky_to_primary
+from .search_index import SEARCH_INDEX_WARMUP, search_index
+from .slow_queries import SLOW_QUERY_SECONDS, SlowQueryMiddleware, slow_query_log
+from . import responses
+from .responses import CompressionMiddleware, FastJSONResponse, dump_models, trusted_response
+from .table_versions import DEPARTMENTS, EMPLOYEES
+from .validation import constraint_message
+from typing import List, Optional
 
 # Tables are now created by Alembic migrations
 # Base.metadata.create_all(bind=engine)
@@ -13,8 +55,52 @@ from typing import List
 #my swagger document link to view in localhost - http://localhost:8000/docs#/default/read_employees_employees_get
 #At swagger hub i can see it at this url - https://app.swaggerhub.com/apis/prestanda/employee-crud-api/0.1.0#/default/read_employee_employees__employee_id__get
 
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(name: str, load):
+    """Run load(session) before the first request needs its result."""
+    try:
+        if DB_ASYNC:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(load)
+        else:
+            def run():
+                with SessionLocal() as db:
+                    load(db)
+            await run_in_threadpool(run)
+    except SQLAlchemyError as e:
+        # Not fatal: the first request loads it instead
+        logger.warning("%s warm-up failed: %s", name, e)
+
+
+async def warm_up_connections(connections: int):
+    start = time.perf_counter()
+    try:
+        if DB_ASYNC:
+            await warm_up_async_pool(async_engine, connections)
+        else:
+            await run_in_threadpool(warm_up_pool, engine, connections)
+    except SQLAlchemyError as e:
+        logger.warning("Connection pool warm-up failed: %s", e)
+        return
+    STARTUP_SECONDS.labels("pool_warmup").set(time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_POOL_WARMUP:
+        await warm_up_connections(DB_POOL_WARMUP)
+    if REFERENCE_CACHE_WARMUP:
+        await warm_up("Department cache", department_cache.get)
+    if SEARCH_INDEX_WARMUP:
+        await warm_up("Search index", search_index.refresh)
+    yield
+
 
 app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     title="Employee Management API",
     description="API for managing employee records",
     version="1.0.0",
@@ -33,6 +119,14 @@ app = FastAPI(
         {
             "name": "Departments",
             "description": "Operations with departments"
+        },
+        {
+            "name": "Analytics",
+            "description": "Workforce figures computed by the database"
+        },
+        {
+            "name": "Admin",
+            "description": "Operational diagnostics"
         }
     ]
 )
@@ -49,31 +143,493 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Server-Timing"],
 )
 
+app.add_middleware(CompressionMiddleware)
+# Profiles SQL_PROFILE_SAMPLE_RATE of the requests (none by default)
+app.add_middleware(SQLProfileMiddleware)
+profile_response_serialization()
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(SlowQueryMiddleware)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    # Field constraint failures keep their single-message {"detail": "..."} form
+    message = constraint_message(exc.errors())
+    if message is not None:
+        return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content={"detail": message})
+    return await request_validation_exception_handler(request, exc)
+
 
-def get_db():
-    db = SessionLocal()
+# Page size bounds for list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Serve the employee list from plain joined rows encoded straight to JSON,
+# skipping ORM objects and response-model validation; the body is the same
+LEAN_EMPLOYEE_READS = env_flag("LEAN_EMPLOYEE_READS", "true")
+
+# Rows fetched per server-side cursor round-trip while exporting
+EXPORT_BATCH_SIZE = 2000
+
+# Rows per multi-row INSERT for bulk creation
+DEFAULT_BULK_BATCH_SIZE = 1000
+MAX_BULK_BATCH_SIZE = 10000
+
+# CSV uploads are spooled to disk past this size
+IMPORT_SPOOL_SIZE = 8 * 1024 * 1024
+DEFAULT_IMPORT_CHUNK_SIZE = 10000
+
+
+# Requests that only read; everything else must run on the primary
+READ_ONLY_METHODS = ("GET", "HEAD")
+
+# Employee responses carry department names, so both tables feed their ETag
+EMPLOYEE_ETAG_TABLES = (EMPLOYEES, DEPARTMENTS)
+
+NOT_MODIFIED_RESPONSE = {304: {"description": "Not modified since the ETag given in If-None-Match"}}
+
+
+async def get_db(request: Request, response: Response):
+    # Reads go to a replica unless this client wrote moments ago; writes
+    # go to the primary and open the client's read-your-writes window
+    replica = None
+    if request.method in READ_ONLY_METHODS:
+        if not sticky_to_primary(request.cookies):
+            replica = replicas.choose()
+    elif replicas.replicas:
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(int(time.time()) + STICKY_PRIMARY_SECONDS),
+            max_age=STICKY_PRIMARY_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+
+    if DB_ASYNC:
+        session_factory = replica.async_session_factory if replica else AsyncSessionLocal
+        async with session_factory() as db:
+            yield db
+        return
+    session_factory = replica.session_factory if replica else SessionLocal
+    db = session_factory()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+
+async def run_db(func, db, *args, **kwargs):
+    """Call a crud function in the configured database mode.
+
+    Async mode awaits the function's counterpart from
+    async_crud.ASYNC_COUNTERPARTS; sync mode runs the blocking function in
+    the threadpool, as sync routes used to.
+    """
+    if DB_ASYNC:
+        return await async_crud.ASYNC_COUNTERPARTS[func](db, *args, **kwargs)
+    return await run_in_threadpool(func, db, *args, **kwargs)
+
+
+async def department_snapshot(db, counts: bool = False):
+    """Current department snapshot; only touches the database when stale.
+
+    Employee counts are only kept current when counts is set.
+    """
+    snapshot = department_cache.peek(counts)
+    if snapshot is not None:
+        return snapshot
+    if DB_ASYNC:
+        return await db.run_sync(department_cache.get, counts)
+    return await run_in_threadpool(department_cache.get, db, counts)
+
+
+async def department_exists(db, department_id: int) -> bool:
+    snapshot = await department_snapshot(db)
+    if department_id in snapshot.by_id:
+        return True
+    # Possibly created by another worker since the snapshot was taken
+    return await run_db(crud.get_department, db, department_id) is not None
+
+
+def make_etag(*versions: Optional[int]) -> Optional[str]:
+    if any(version is None for version in versions):
+        return None
+    return '"' + "-".join(str(version) for version in versions) + '"'
+
+
+async def employee_etag(db) -> Optional[str]:
+    versions = await run_db(crud.get_table_versions, db, EMPLOYEE_ETAG_TABLES)
+    return make_etag(*(versions.get(name) for name in EMPLOYEE_ETAG_TABLES))
+
+
+def not_modified(request: Request, response: Response, etag: Optional[str]) -> Optional[Response]:
+    """A 304 response if the client already holds etag; otherwise tag response.
+
+    Called before any rows are loaded, so an unchanged resource costs one
+    version lookup and no serialisation.
+    """
+    if etag is None:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # If-None-Match uses the weak comparison
+        if "*" in tags or etag in tags or f"W/{etag}" in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+async def analytics_report(db, name: str) -> dict:
+    """A report's fields from its snapshot; only touches the database when stale."""
+    snapshot = analytics_cache.peek(name)
+    if snapshot is None:
+        if DB_ASYNC:
+            snapshot = await db.run_sync(analytics_cache.get, name)
+        else:
+            snapshot = await run_in_threadpool(analytics_cache.get, db, name)
+    return snapshot.report()
+
+
+async def refreshed_search_index(db):
+    if not search_index.fresh():
+        if DB_ASYNC:
+            await db.run_sync(search_index.refresh)
+        else:
+            await run_in_threadpool(search_index.refresh, db)
+    return search_index
+
+
+async def read_bulk_rows(request: Request) -> list:
+    """Parse a bulk request body given as a JSON array or as NDJSON."""
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+            rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            rows = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return rows
+
+
+async def spool_csv_body(request: Request):
+    """Stream a text/csv request body into a spooled temp file for the importer."""
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        yield io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+    finally:
+        spool.close()
+
+
+IMPORT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"text/csv": {"schema": {"type": "string"}}},
+    }
+}
 
 
 @app.get(
     "/employees", 
     response_model=List[schemas.Employee],
     summary="Get all employees",
-    description="""Retrieves a list of all employees in the system.
+    description="""Retrieves one page of employees, using keyset (cursor) pagination.
+    
+    ### Query Parameters:
+    - **limit**: Page size (1-1000, default 100)
+    - **cursor**: Opaque token from the previous page's `X-Next-Cursor` header
+    - **sort**: One of `id`, `name`, `age`, `city`; prefix with `-` for descending
+    - **department_id**, **city**, **min_age**, **max_age**: Optional filters
+    - **include_total**: Set to false to skip counting matching rows
+    
+    ### Returns:
+    An array of employee objects. When more rows exist the `X-Next-Cursor`
+    header carries the token for the next page; `X-Total-Count` carries the
+    number of matching rows when `include_total` is on.
+    
+    ### Formats:
+    Chosen from the `Accept` header: JSON by default,
+    `application/msgpack` for `{"columns": [...], "rows": [[...], ...]}`
+    in MessagePack, or `application/vnd.employees.columnar+msgpack` for
+    one array per column with `city` and `department_name`
+    dictionary-encoded. Large JSON bodies are gzip-compressed for clients
+    sending `Accept-Encoding: gzip`.
+    
+    ### Caching:
+    Responses carry an `ETag` that changes with any employee or department
+    write; send it back in `If-None-Match` to get `304 Not Modified`.
+    
+    ### Errors:
+    - 400: Invalid cursor
+    """,
+    response_description="One page of employees",
+    responses={
+        **NOT_MODIFIED_RESPONSE,
+        200: {"content": {MSGPACK_MEDIA_TYPE: {}, COLUMNAR_MEDIA_TYPE: {}}},
+    },
+    tags=["Employees"]
+)
+async def read_employees(
+    request: Request,
+    response: Response,
+    filters: schemas.EmployeeFilter = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    sort: str = Query("id", pattern=r"^-?(id|name|age|city)$"),
+    include_total: bool = Query(True),
+    db: Session = Depends(get_db),
+):
+    descending = sort.startswith("-")
+    sort_field = sort.lstrip("-")
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sort, crud.EMPLOYEE_SORT_COLUMNS[sort_field].type.python_type)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    media_type = negotiate_list_format(request.headers.get("accept", ""))
+    response.headers["Vary"] = "Accept"
+    etag = await employee_etag(db)
+    if etag is not None and media_type != JSON_MEDIA_TYPE:
+        # Each representation needs its own tag
+        etag = f'{etag[:-1]}-{media_type.rsplit("/", 1)[-1]}"'
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
+    # Binary formats are always encoded from plain rows
+    lean = LEAN_EMPLOYEE_READS or media_type != JSON_MEDIA_TYPE
+    # Fetch one extra row to learn whether another page exists
+    if lean:
+        employees = await run_db(
+            crud.get_employee_rows,
+            db, filters, sort=sort_field, descending=descending, after=after, limit=limit + 1,
+        )
+    else:
+        snapshot = await department_snapshot(db)
+        employees = await run_db(
+            crud.get_employees,
+            db, filters, sort=sort_field, descending=descending, after=after, limit=limit + 1,
+            department_names=snapshot.names,
+        )
+    if len(employees) > limit:
+        employees = employees[:limit]
+        last = employees[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(sort, getattr(last, sort_field), last.id)
+    if include_total:
+        response.headers["X-Total-Count"] = str(await run_db(crud.count_employees, db, filters))
+    if media_type != JSON_MEDIA_TYPE:
+        return trusted_response(render_list(media_type, crud.EMPLOYEE_ROW_COLUMNS, employees), response, media_type)
+    if lean:
+        return trusted_response(render_json_array(crud.EMPLOYEE_ROW_COLUMNS, employees), response)
+    return employees
+
+
+@app.get(
+    "/employees/export",
+    summary="Export all employees",
+    description="""Streams every employee matching the filters, in id order.
+    
+    ### Formats:
+    Chosen from the `Accept` header: `text/csv` for CSV with a header row,
+    `application/msgpack` for a MessagePack stream of the column names
+    followed by one array per row, `application/vnd.employees.columnar+msgpack`
+    for a stream of column batches (see the list endpoint), otherwise
+    newline-delimited JSON (`application/x-ndjson`). Text formats are
+    gzip-compressed for clients sending `Accept-Encoding: gzip`.
+    
+    ### Query Parameters:
+    - **department_id**, **city**, **min_age**, **max_age**: Optional filters
     
     ### Returns:
-    An array of employee objects containing all employee details
+    A streamed body; rows are read from a server-side cursor and written in
+    chunks, so memory use does not grow with the number of employees.
     """,
-    response_description="List of all employees",
+    response_description="Streamed employee rows",
+    responses={
+        200: {
+            "content": {
+                "application/x-ndjson": {},
+                "text/csv": {},
+                MSGPACK_MEDIA_TYPE: {},
+                COLUMNAR_MEDIA_TYPE: {},
+            }
+        }
+    },
     tags=["Employees"]
 )
-def read_employees(db: Session = Depends(get_db)):
-    return crud.get_employees(db)
+async def export_employees(
+    filters: schemas.EmployeeFilter = Depends(),
+    accept: str = Header("application/x-ndjson"),
+    db: Session = Depends(get_db),
+):
+    media_type = negotiate_export_format(accept)
+    columns = crud.EXPORT_COLUMNS
+
+    # The response is streamed after the get_db dependency has exited,
+    # so the stream owns the session and releases it once it is done
+    if DB_ASYNC:
+        async def body():
+            try:
+                header = render_header(media_type, columns)
+                if header:
+                    yield header
+                async for batch in async_crud.stream_employees(db, filters, batch_size=EXPORT_BATCH_SIZE):
+                    yield render_batch(media_type, columns, batch)
+            finally:
+                await db.close()
+    else:
+        def body():
+            try:
+                batches = crud.stream_employees(db, filters, batch_size=EXPORT_BATCH_SIZE)
+                yield from render_chunks(media_type, columns, batches)
+            finally:
+                db.close()
+
+    headers = {}
+    if media_type == CSV_MEDIA_TYPE:
+        headers["Content-Disposition"] = 'attachment; filename="employees.csv"'
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+
+@app.get(
+    "/employees/search",
+    response_model=schemas.EmployeeSearchResult,
+    summary="Search employees",
+    description="""Type-ahead search over employee names and cities.
+    
+    ### Query Parameters:
+    - **q**: Search text; every word must match a name or city word,
+      exactly, as a prefix, or approximately (3+ letters)
+    - **limit**: Number of results (1-100, default 20)
+    - **department_id**, **city**: Narrow the results (not the facets)
+    
+    ### Returns:
+    The best matches, name matches ranked above city matches, with the
+    number of matches per department and per city.
+    """,
+    response_description="Ranked matches and facet counts",
+    tags=["Employees"]
+)
+async def search_employees(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    department_id: Optional[int] = Query(None, ge=1),
+    city: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    index = await refreshed_search_index(db)
+    result = index.search(q, limit=limit, department_id=department_id, city=city)
+    names = (await department_snapshot(db)).names
+    return schemas.EmployeeSearchResult(
+        total=result.total,
+        results=[
+            schemas.EmployeeSearchHit(
+                id=doc_id,
+                name=document.name,
+                city=document.city,
+                department_id=document.department_id,
+                department_name=names.get(document.department_id),
+                score=round(score, 4),
+            )
+            for doc_id, document, score in result.hits
+        ],
+        departments=[
+            schemas.DepartmentFacet(department_id=facet_id, department_name=names.get(facet_id), count=count)
+            for facet_id, count in result.departments
+        ],
+        cities=[schemas.CityFacet(city=facet_city, count=count) for facet_city, count in result.cities],
+    )
+
+
+@app.get(
+    "/employees/changes",
+    response_model=schemas.EmployeeChanges,
+    summary="Get employee changes",
+    description="""Lists the employees created, updated or deleted since a cursor,
+    so a copy of the list can be kept current without reloading it.
+    
+    ### Query Parameters:
+    - **since**: `next_cursor` of the previous page; leave out to start
+      from the beginning, which returns every employee
+    - **limit**: Page size (1-1000, default 100)
+    
+    ### Returns:
+    Changes in commit order. Each live employee appears once, with its
+    current state, under the revision of its latest write; a renamed
+    department counts as a write to its employees. Deleted employees
+    appear with `deleted` set and no `employee`. Pass `next_cursor` back
+    as `since` to continue; when `has_more` is false the feed is caught
+    up and the same cursor returns only later changes. Starting without
+    `since` lists no deletions from before the first page.
+    
+    ### Errors:
+    - 400: Invalid cursor
+    - 410: Cursor older than the retention of deletions
+      (`CHANGE_FEED_RETENTION_SECONDS`, a week by default); start again
+      without `since`
+    """,
+    response_description="One page of changes",
+    responses={410: {"description": "Cursor expired; start again without since"}},
+    tags=["Employees"]
+)
+async def read_employee_changes(
+    response: Response,
+    since: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    if since:
+        try:
+            position = decode_change_cursor(since)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        # A new client never held the employees deleted before now
+        versions = await run_db(crud.get_table_versions, db, (EMPLOYEES,))
+        position = start_position(versions.get(EMPLOYEES))
+    # Fetch one extra row to learn whether another page exists
+    rows = await run_db(
+        crud.get_employee_changes,
+        db, (position.revision, position.deleted, position.key), limit=limit + 1, deleted_after=position.floor,
+    )
+    pruned = await run_db(crud.get_table_versions, db, (TOMBSTONES_PRUNED,))
+    try:
+        check_retention(position, pruned.get(TOMBSTONES_PRUNED))
+    except CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        last = rows[-1]
+        position = FeedPosition(last.revision, last.deleted, last.key, position.floor)
+    page = schemas.EmployeeChanges(
+        changes=[
+            schemas.EmployeeChange(
+                id=row.id,
+                revision=row.revision,
+                deleted=row.deleted,
+                changed_at=row.changed_at,
+                employee=None if row.deleted else {column: getattr(row, column) for column in crud.EXPORT_COLUMNS},
+            )
+            for row in rows
+        ],
+        next_cursor=encode_change_cursor(position),
+        has_more=has_more,
+    )
+    # Already validated; encode without a second pass through the response model
+    return trusted_response(dump_models(page), response)
 
 
 @app.get(
@@ -93,6 +649,7 @@ def read_employees(db: Session = Depends(get_db)):
     """,
     response_description="Employee details",
     responses={
+        **NOT_MODIFIED_RESPONSE,
         404: {
             "description": "Employee not found",
             "content": {
@@ -104,8 +661,16 @@ def read_employees(db: Session = Depends(get_db)):
     },
     tags=["Employees"]
 )
-def read_employee(employee_id: int, db: Session = Depends(get_db)):
-    employee = crud.get_employee(db, employee_id)
+async def read_employee(employee_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    cached = not_modified(request, response, await employee_etag(db))
+    if cached:
+        return cached
+    if responses.FAST_JSON_RESPONSES:
+        row = await run_db(crud.get_employee_row, db, employee_id)
+        if not row:
+            raise HTTPException(status_code=404, detail="Employee not found")
+        return trusted_response(responses.dumps(dict(zip(crud.EMPLOYEE_ROW_COLUMNS, row))), response)
+    employee = await run_db(crud.get_employee, db, employee_id)
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     return employee
@@ -129,11 +694,231 @@ def read_employee(employee_id: int, db: Session = Depends(get_db)):
     response_description="The created employee record",
     tags=["Employees"]  # Make sure this matches the tag name above
 )
-def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db)):
+async def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db)):
     #print("DEBUG: create_employee called with:", employee.dict())
     #import sys
     #sys.exit(0)  # This will stop the server
-    return crud.create_employee(db, employee)
+    return await run_db(crud.create_employee, db, employee)
+
+
+@app.post(
+    "/employees/bulk",
+    response_model=schemas.BulkEmployeeResult,
+    status_code=status.HTTP_201_CREATED,
+    summary="Create many employees",
+    description="""Creates employees from a JSON array or an NDJSON body
+    (`Content-Type: application/x-ndjson`), one employee object per row.
+    
+    ### Query Parameters:
+    - **atomic**: When true (default) nothing is created if any row fails;
+      when false valid rows are created and failing rows are reported
+    - **batch_size**: Rows per multi-row INSERT (1-10000, default 1000)
+    
+    ### Returns:
+    The created ids aligned with the request rows (null where a row was not
+    created), the number created, and a per-row error report
+    
+    ### Errors:
+    - 400: Body is not a JSON array or NDJSON
+    - 422: Atomic request with at least one failing row
+    """,
+    response_description="Created ids and per-row errors",
+    responses={
+        422: {
+            "description": "Atomic request rejected",
+            "model": schemas.BulkEmployeeResult,
+        }
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/EmployeeCreate"}}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+    tags=["Employees"]
+)
+async def create_employees_bulk(
+    response: Response,
+    rows: list = Depends(read_bulk_rows),
+    atomic: bool = Query(True),
+    batch_size: int = Query(DEFAULT_BULK_BATCH_SIZE, ge=1, le=MAX_BULK_BATCH_SIZE),
+    db: Session = Depends(get_db),
+):
+    valid, errors = schemas.validate_employee_rows(rows)
+    ids = [None] * len(rows)
+    if errors and atomic:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+        return schemas.BulkEmployeeResult(ids=ids, created=0, errors=errors)
+
+    created_ids, failed = await run_db(
+        crud.bulk_create_employees,
+        db, [employee for _, employee in valid], batch_size=batch_size, atomic=atomic,
+    )
+    for (index, _), employee_id in zip(valid, created_ids):
+        ids[index] = employee_id
+    errors += [schemas.BulkRowError(index=valid[i][0], detail=detail) for i, detail in failed]
+    errors.sort(key=lambda error: error.index)
+
+    created = sum(1 for employee_id in ids if employee_id is not None)
+    if errors and atomic:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    return schemas.BulkEmployeeResult(ids=ids, created=created, errors=errors)
+
+
+@app.post(
+    "/employees/import",
+    response_model=schemas.ImportResult,
+    summary="Import employees from CSV",
+    description="""Loads employees from a `text/csv` body with a header row
+    containing `name`, `age`, `city` and optionally `department_id`.
+    
+    Rows are validated in chunks with the same rules as employee creation;
+    invalid rows are skipped and reported. Valid rows are staged (COPY on
+    PostgreSQL) and merged into employees in a single transaction.
+    
+    ### Errors:
+    - 400: Missing required columns
+    """,
+    response_description="Number of imported and rejected rows",
+    openapi_extra=IMPORT_REQUEST_BODY,
+    tags=["Employees"]
+)
+async def import_employees_csv(
+    file=Depends(spool_csv_body),
+    chunk_size: int = Query(DEFAULT_IMPORT_CHUNK_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db),
+):
+    try:
+        if DB_ASYNC:
+            imported, report = await db.run_sync(import_employees, file, chunk_size=chunk_size)
+        else:
+            imported, report = await run_in_threadpool(import_employees, db, file, chunk_size=chunk_size)
+    except (InvalidImportFile, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.ImportResult(imported=imported, rejected=report.rejected, errors=report.errors)
+
+
+@app.post(
+    "/employees/bulk-delete",
+    response_model=schemas.BulkMutationResult,
+    summary="Delete many employees",
+    description="""Deletes every employee matching the selection in one statement.
+    
+    ### Request Body:
+    - **ids**: Only these employees (up to 10000)
+    - **department_id**, **city**, **min_age**, **max_age**: The list filters
+    
+    At least one criterion is required; all given criteria must hold.
+    
+    ### Query Parameters:
+    - **dry_run**: Only count the employees that would be deleted
+    
+    ### Returns:
+    The number of employees deleted (or that would be)
+    """,
+    response_description="Affected employee count",
+    tags=["Employees"]
+)
+async def bulk_delete_employees(
+    selection: schemas.EmployeeSelection,
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    affected = await run_db(crud.bulk_delete_employees, db, selection, dry_run=dry_run)
+    return schemas.BulkMutationResult(affected=affected, dry_run=dry_run)
+
+
+@app.post(
+    "/employees/bulk-update",
+    response_model=schemas.BulkMutationResult,
+    summary="Update many employees",
+    description="""Applies the same changes to every employee matching the selection, in one statement.
+    
+    ### Request Body:
+    - **where**: The selection, as for bulk delete
+    - **set**: New **age**, **city** and/or **department_id**
+    
+    ### Query Parameters:
+    - **dry_run**: Only count the employees that would be updated
+    
+    ### Returns:
+    The number of employees updated (or that would be)
+    
+    ### Errors:
+    - 400: Department not found
+    """,
+    response_description="Affected employee count",
+    tags=["Employees"]
+)
+async def bulk_update_employees(
+    update: schemas.EmployeeBulkUpdate,
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    department_id = update.set.department_id
+    if department_id is not None and not await department_exists(db, department_id):
+        raise HTTPException(status_code=400, detail="Department not found")
+    affected = await run_db(crud.bulk_update_employees, db, update.where, update.set, dry_run=dry_run)
+    return schemas.BulkMutationResult(affected=affected, dry_run=dry_run)
+
+
+@app.put(
+    "/employees/sync",
+    response_model=schemas.SyncResult,
+    summary="Sync employees from the upstream HR system",
+    description="""Upserts employees keyed on `external_id`, from a JSON array or an
+    NDJSON body (`Content-Type: application/x-ndjson`).
+    
+    Each row is an employee object plus its `external_id`. New ids are
+    inserted, known ids are updated, and rows whose content is unchanged
+    since the last sync are skipped without writing. Invalid rows are
+    reported and skipped; everything else is applied in one transaction.
+    
+    ### Query Parameters:
+    - **batch_size**: Rows per INSERT ... ON CONFLICT statement (1-10000, default 1000)
+    
+    ### Returns:
+    Inserted, updated, unchanged and rejected counts, with per-row errors
+    
+    ### Errors:
+    - 400: Body is not a JSON array or NDJSON
+    """,
+    response_description="Sync counts and per-row errors",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    # EmployeeSync is not a declared body, so it is not in the components
+                    "schema": {"type": "array", "items": schemas.EmployeeSync.model_json_schema()}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+    tags=["Employees"]
+)
+async def sync_employees(
+    rows: list = Depends(read_bulk_rows),
+    batch_size: int = Query(DEFAULT_BULK_BATCH_SIZE, ge=1, le=MAX_BULK_BATCH_SIZE),
+    db: Session = Depends(get_db),
+):
+    if DB_ASYNC:
+        report = await db.run_sync(employee_sync.sync_employees, rows, batch_size=batch_size)
+    else:
+        report = await run_in_threadpool(employee_sync.sync_employees, db, rows, batch_size=batch_size)
+    return schemas.SyncResult(
+        inserted=report.inserted,
+        updated=report.updated,
+        unchanged=report.unchanged,
+        rejected=report.rejected,
+        errors=report.errors,
+    )
 
 
 @app.put(
@@ -165,12 +950,12 @@ def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_
     },
     tags=["Employees"]
 )
-def update_employee(
+async def update_employee(
     employee_id: int,
     employee: schemas.EmployeeUpdate,
     db: Session = Depends(get_db),
 ):
-    updated = crud.update_employee(db, employee_id, employee)
+    updated = await run_db(crud.update_employee, db, employee_id, employee)
     if not updated:
         raise HTTPException(status_code=404, detail="Employee not found")
     return updated
@@ -205,7 +990,7 @@ def update_employee(
     },
     tags=["Employees"]
 )
-def assign_department(
+async def assign_department(
     employee_id: int,
     department_data: schemas.DepartmentAssignment,
     db: Session = Depends(get_db),
@@ -213,7 +998,7 @@ def assign_department(
     try:
         # Create a partial update object with only department_id
         employee_update = schemas.EmployeeUpdate(department_id=department_data.department_id)
-        updated = crud.update_employee(db, employee_id, employee_update)
+        updated = await run_db(crud.update_employee, db, employee_id, employee_update)
         if not updated:
             raise HTTPException(status_code=404, detail="Employee not found")
         return updated
@@ -256,8 +1041,8 @@ def assign_department(
     },
     tags=["Employees"]
 )
-def delete_employee(employee_id: int, db: Session = Depends(get_db)):
-    deleted = crud.delete_employee(db, employee_id)
+async def delete_employee(employee_id: int, db: Session = Depends(get_db)):
+    deleted = await run_db(crud.delete_employee, db, employee_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Employee not found")
     return {"message": "Employee deleted successfully"}
@@ -274,10 +1059,18 @@ def delete_employee(employee_id: int, db: Session = Depends(get_db)):
     An array of department objects containing all department details
     """,
     response_description="List of all departments",
+    responses=NOT_MODIFIED_RESPONSE,
     tags=["Departments"]
 )
-def read_departments(db: Session = Depends(get_db)):
-    return crud.get_departments(db)
+async def read_departments(request: Request, response: Response, db: Session = Depends(get_db)):
+    # The snapshot's versions double as the ETag, so no query is needed
+    snapshot = await department_snapshot(db, counts=True)
+    cached = not_modified(request, response, make_etag(snapshot.version, snapshot.counts_version))
+    if cached:
+        return cached
+    if responses.FAST_JSON_RESPONSES:
+        return trusted_response(snapshot.encoded(), response)
+    return snapshot.departments
 
 
 @app.get(
@@ -297,6 +1090,7 @@ def read_departments(db: Session = Depends(get_db)):
     """,
     response_description="Department details",
     responses={
+        **NOT_MODIFIED_RESPONSE,
         404: {
             "description": "Department not found",
             "content": {
@@ -308,8 +1102,21 @@ def read_departments(db: Session = Depends(get_db)):
     },
     tags=["Departments"]
 )
-def read_department(department_id: int, db: Session = Depends(get_db)):
-    department = crud.get_department(db, department_id)
+async def read_department(
+    department_id: int, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    snapshot = await department_snapshot(db, counts=True)
+    department = snapshot.by_id.get(department_id)
+    if department:
+        cached = not_modified(request, response, make_etag(snapshot.version, snapshot.counts_version))
+        if cached:
+            return cached
+        if responses.FAST_JSON_RESPONSES:
+            return trusted_response(dump_models(department), response)
+        return department
+    # Possibly created by another worker since the snapshot was taken;
+    # left untagged since the snapshot version does not cover it
+    department = await run_db(crud.get_department, db, department_id)
     if not department:
         raise HTTPException(status_code=404, detail="Department not found")
     return department
@@ -332,8 +1139,40 @@ def read_department(department_id: int, db: Session = Depends(get_db)):
     response_description="The created department record",
     tags=["Departments"]
 )
-def create_department(department: schemas.DepartmentCreate, db: Session = Depends(get_db)):
-    return crud.create_department(db, department)
+async def create_department(department: schemas.DepartmentCreate, db: Session = Depends(get_db)):
+    return await run_db(crud.create_department, db, department)
+
+
+@app.post(
+    "/departments/import",
+    response_model=schemas.ImportResult,
+    summary="Import departments from CSV",
+    description="""Loads departments from a `text/csv` body with a header row
+    containing `name` and optionally `description`.
+    
+    Invalid and duplicate rows are skipped and reported; departments whose
+    name already exists are left untouched.
+    
+    ### Errors:
+    - 400: Missing required columns
+    """,
+    response_description="Number of imported and rejected rows",
+    openapi_extra=IMPORT_REQUEST_BODY,
+    tags=["Departments"]
+)
+async def import_departments_csv(
+    file=Depends(spool_csv_body),
+    chunk_size: int = Query(DEFAULT_IMPORT_CHUNK_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db),
+):
+    try:
+        if DB_ASYNC:
+            imported, report = await db.run_sync(import_departments, file, chunk_size=chunk_size)
+        else:
+            imported, report = await run_in_threadpool(import_departments, db, file, chunk_size=chunk_size)
+    except (InvalidImportFile, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.ImportResult(imported=imported, rejected=report.rejected, errors=report.errors)
 
 
 @app.put(
@@ -365,12 +1204,12 @@ def create_department(department: schemas.DepartmentCreate, db: Session = Depend
     },
     tags=["Departments"]
 )
-def update_department(
+async def update_department(
     department_id: int,
     department: schemas.DepartmentUpdate,
     db: Session = Depends(get_db),
 ):
-    updated = crud.update_department(db, department_id, department)
+    updated = await run_db(crud.update_department, db, department_id, department)
     if not updated:
         raise HTTPException(status_code=404, detail="Department not found")
     return updated
@@ -411,8 +1250,194 @@ def update_department(
     },
     tags=["Departments"]
 )
-def delete_department(department_id: int, db: Session = Depends(get_db)):
-    deleted = crud.delete_department(db, department_id)
+async def delete_department(department_id: int, db: Session = Depends(get_db)):
+    deleted = await run_db(crud.delete_department, db, department_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Department not found")
     return {"message": "Department deleted successfully"}
+
+
+@app.post(
+    "/departments/{department_id}/reassign",
+    response_model=schemas.BulkMutationResult,
+    summary="Move a department's employees",
+    description="""Moves every employee of a department to another one in one statement.
+    
+    ### Parameters:
+    - **department_id**: The department the employees leave
+    - **target_department_id**: The department they join
+    
+    ### Query Parameters:
+    - **dry_run**: Only count the employees that would move
+    
+    ### Returns:
+    The number of employees moved (or that would be)
+    
+    ### Errors:
+    - 400: Target department not found, or the same as the source
+    - 404: Department not found
+    """,
+    response_description="Affected employee count",
+    tags=["Departments"]
+)
+async def reassign_department(
+    department_id: int,
+    reassignment: schemas.DepartmentReassignment,
+    dry_run: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    target_id = reassignment.target_department_id
+    if not await department_exists(db, department_id):
+        raise HTTPException(status_code=404, detail="Department not found")
+    if target_id == department_id:
+        raise HTTPException(status_code=400, detail="Target department is the same as the source")
+    if not await department_exists(db, target_id):
+        raise HTTPException(status_code=400, detail="Target department not found")
+    affected = await run_db(crud.reassign_department, db, department_id, target_id, dry_run=dry_run)
+    return schemas.BulkMutationResult(affected=affected, dry_run=dry_run)
+
+
+# Analytics endpoints
+ANALYTICS_FRESHNESS = f"""
+    Figures come from a snapshot that is recomputed after writes and at
+    least every {int(ANALYTICS_MAX_AGE)} seconds; `generated_at` and
+    `age_seconds` tell how old it is.
+    """
+
+
+@app.get(
+    "/analytics/summary",
+    response_model=schemas.WorkforceSummary,
+    summary="Workforce summary",
+    description="""Headline figures over all employees.
+    
+    ### Returns:
+    Employee, department and city counts, the number of employees without
+    a department, and the average, youngest and oldest age
+    """ + ANALYTICS_FRESHNESS,
+    response_description="Workforce summary",
+    tags=["Analytics"]
+)
+async def read_workforce_summary(db: Session = Depends(get_db)):
+    return schemas.WorkforceSummary(**await analytics_report(db, analytics.SUMMARY))
+
+
+@app.get(
+    "/analytics/headcount",
+    response_model=schemas.HeadcountReport,
+    summary="Headcount per department",
+    description="""Employees per department, largest first.
+    
+    ### Returns:
+    For every department (including empty ones) and for employees without
+    a department: headcount, average age and share of all employees
+    """ + ANALYTICS_FRESHNESS,
+    response_description="Headcount per department",
+    tags=["Analytics"]
+)
+async def read_headcount(db: Session = Depends(get_db)):
+    return schemas.HeadcountReport(**await analytics_report(db, analytics.HEADCOUNT))
+
+
+@app.get(
+    "/analytics/age-distribution",
+    response_model=schemas.AgeDistributionReport,
+    summary="Age distribution",
+    description="""Employees per age bracket, youngest first.
+    
+    ### Returns:
+    Every bracket, empty ones included, with its bounds, count and share
+    of all employees
+    """ + ANALYTICS_FRESHNESS,
+    response_description="Employees per age bracket",
+    tags=["Analytics"]
+)
+async def read_age_distribution(db: Session = Depends(get_db)):
+    return schemas.AgeDistributionReport(**await analytics_report(db, analytics.AGE_DISTRIBUTION))
+
+
+@app.get(
+    "/analytics/cities",
+    response_model=schemas.CityReport,
+    summary="Employees per city",
+    description="""Employees per city, largest first.
+    
+    ### Returns:
+    Count, average age and share of all employees for every city
+    """ + ANALYTICS_FRESHNESS,
+    response_description="Employees per city",
+    tags=["Analytics"]
+)
+async def read_city_counts(db: Session = Depends(get_db)):
+    return schemas.CityReport(**await analytics_report(db, analytics.CITIES))
+
+
+# Admin endpoints
+@app.get(
+    "/admin/pool",
+    summary="Connection pool statistics",
+    description="""Reports the live state of each database engine's connection pool.
+    
+    ### Returns:
+    Per engine (primary and each read replica): pool size,
+    checked-in/checked-out connections, overflow,
+    checkout/checkin/timeout/invalidation counters, and latency histograms
+    for connection checkout (including time spent waiting on the pool) and
+    for establishing new connections
+    """,
+    response_description="Pool statistics per engine",
+    tags=["Admin"]
+)
+async def read_pool_stats():
+    engines = {"primary": engine}
+    if async_engine is not None:
+        engines["primary_async"] = async_engine.sync_engine
+    for replica in replicas.replicas:
+        engines[replica.name] = replica.engine
+        if replica.async_engine is not None:
+            engines[f"{replica.name}_async"] = replica.async_engine.sync_engine
+    stats = {name: pool_snapshot(current) for name, current in engines.items()}
+    for replica in replicas.replicas:
+        for name in (replica.name, f"{replica.name}_async"):
+            if name in stats:
+                stats[name].update(healthy=replica.healthy, ejections=replica.ejections)
+    return stats
+
+
+@app.get(
+    "/admin/slow-queries",
+    summary="Recent slow SQL statements",
+    description="""Lists the statements that took longer than SLOW_QUERY_SECONDS in this worker.
+    
+    ### Returns:
+    The newest entries first, each with its SQL, parameter types (values
+    are redacted), duration, the route that ran it and a fingerprint of
+    the statement shape. On PostgreSQL, entries also carry the EXPLAIN
+    plan captured the first time their fingerprint was slow
+    """,
+    response_description="Slow statements, newest first",
+    tags=["Admin"]
+)
+async def read_slow_queries():
+    return {"threshold_seconds": SLOW_QUERY_SECONDS, "entries": slow_query_log.snapshot()}
+
+
+@app.get(
+    "/metrics",
+    summary="Prometheus metrics",
+    description="""Metrics in the Prometheus text exposition format.
+    
+    ### Returns:
+    Request counts by route template and status, request latency and
+    response size histograms, in-flight requests, SQL statement latency
+    per engine, connection pool checkout wait and JSON serialisation time.
+    With PROMETHEUS_MULTIPROC_DIR set, the figures of all workers combined
+    """,
+    response_class=Response,
+    responses={200: {"content": {"text/plain": {}}}},
+    tags=["Admin"]
+)
+async def read_metrics():
+    # Multi-process collection reads every worker's files from disk
+    body = await run_in_threadpool(render_metrics)
+    return Response(body, media_type=CONTENT_TYPE_LATEST)
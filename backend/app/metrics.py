@@ -0,0 +1,133 @@
+"""Prometheus metrics, served at /metrics.
+
+Requests are labelled with the route template they matched
+("/employees/{employee_id}"), never the raw path, so label cardinality
+stays bounded; requests matching no route share the "unmatched" label.
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the workers
+when running several processes: each worker then writes its samples to
+memory-mapped files there and /metrics aggregates all of them, whichever
+worker serves it. The directory must be emptied before the server starts,
+and a process manager should call worker_exit() for each worker that exits.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+from .pool_metrics import LATENCY_BUCKETS
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+UNMATCHED_ROUTE = "unmatched"
+# Statement kinds labelled individually; anything else counts as "other"
+STATEMENT_KINDS = ("select", "insert", "update", "delete", "with")
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to serve HTTP requests", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served", ["method"], multiprocess_mode="livesum"
+)
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Size of HTTP response bodies", ["method", "route"], buckets=SIZE_BUCKETS
+)
+SERIALIZE_SECONDS = Histogram(
+    "http_response_serialize_seconds", "Time spent validating and encoding JSON response bodies", buckets=LATENCY_BUCKETS
+)
+STATEMENT_SECONDS = Histogram(
+    "db_statement_duration_seconds", "Time to execute SQL statements", ["engine", "kind"], buckets=LATENCY_BUCKETS
+)
+STARTUP_SECONDS = Gauge(
+    "app_startup_seconds", "Time spent in each startup phase", ["phase"], multiprocess_mode="max"
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to check a connection out of the pool, including waiting for one",
+    ["engine"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def statement_kind(statement: str) -> str:
+    kind = statement.lstrip()[:6].split(None, 1)[0].lower()
+    return kind if kind in STATEMENT_KINDS else "other"
+
+
+def observe_statements(engine, name: str):
+    """Time every statement the (sync) engine executes into STATEMENT_SECONDS."""
+    histograms = {kind: STATEMENT_SECONDS.labels(name, kind) for kind in (*STATEMENT_KINDS, "other")}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def receive_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        histograms[statement_kind(statement)].observe(time.perf_counter() - context._metrics_started)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and response sizes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_counting(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_counting)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            # Set by the router once a route matched
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_SECONDS.labels(method, route).observe(elapsed)
+            RESPONSE_BYTES.labels(method, route).observe(size)
+
+
+def render_metrics() -> bytes:
+    """All metrics in the Prometheus text format, across workers if multi-process."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def worker_exit(pid: int):
+    """Drop the live gauges of a worker that exited."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
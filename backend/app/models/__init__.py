@@ -3,5 +3,7 @@ from .department import Department
 from .developer import Developer
 from .product import Product
 from .category import Category
+from .reference_version import ReferenceVersion
+from .employee_tombstone import EmployeeTombstone
 
-__all__ = ["Employee", "Department", "Developer", "Product", "Category"]
+__all__ = ["Employee", "Department", "Developer", "Product", "Category", "ReferenceVersion", "EmployeeTombstone"]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Index, Integer, String
 from sqlalchemy.orm import relationship
 from ..db import Base
 
@@ -9,4 +9,13 @@ class Department(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
     description = Column(String(255), nullable=True)
+    # Denormalised number of employees, adjusted by every employee write
+    cached_employee_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Revision of the transaction that last wrote the row (see change_feed)
+    revision = Column(Integer, nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
     employees = relationship("Employee", back_populates="department")
+
+    __table_args__ = (
+        Index("ix_departments_revision_id", "revision", "id"),
+    )
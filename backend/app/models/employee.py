@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, DateTime, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from ..db import Base
 
@@ -12,3 +12,23 @@ class Employee(Base):
     city = Column(String(100), nullable=False)
     department_id = Column(Integer, ForeignKey("departments.id"), nullable=True)
     department = relationship("Department", back_populates="employees")
+    # Key and content hash of employees mirrored from the upstream HR
+    # system (see employee_sync); both are null for local employees
+    external_id = Column(String(64), nullable=True)
+    content_hash = Column(String(32), nullable=True)
+    # Revision of the transaction that last wrote the row, and when; null
+    # until that transaction commits (see change_feed)
+    revision = Column(Integer, nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Composite (sort key, id) indexes backing keyset pagination and filters
+    __table_args__ = (
+        Index("ix_employees_name_id", "name", "id"),
+        Index("ix_employees_age_id", "age", "id"),
+        Index("ix_employees_city_id", "city", "id"),
+        Index("ix_employees_department_id_id", "department_id", "id"),
+        # Upsert key of synced employees
+        Index("ix_employees_external_id", "external_id", unique=True),
+        # Change feed order
+        Index("ix_employees_revision_id", "revision", "id"),
+    )
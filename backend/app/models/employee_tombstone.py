@@ -0,0 +1,18 @@
+from sqlalchemy import Column, DateTime, Index, Integer
+from ..db import Base
+
+
+class EmployeeTombstone(Base):
+    """A deleted employee, kept so the change feed can report the deletion."""
+    __tablename__ = "employee_tombstones"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    employee_id = Column(Integer, nullable=False)
+    revision = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_employee_tombstones_revision_id", "revision", "id"),
+        # Pruning by age
+        Index("ix_employee_tombstones_deleted_at", "deleted_at"),
+    )
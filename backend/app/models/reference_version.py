@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DDL, Integer, String, event
+from ..db import Base
+
+
+class ReferenceVersion(Base):
+    __tablename__ = "reference_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+# Same seed rows as the migrations, for databases built with create_all
+event.listen(
+    ReferenceVersion.__table__,
+    "after_create",
+    DDL(
+        "INSERT INTO reference_versions (name, version) "
+        "VALUES ('departments', 0), ('employees', 0), ('employee_tombstones_pruned', 0)"
+    ),
+)
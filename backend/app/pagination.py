@@ -0,0 +1,35 @@
+import base64
+import binascii
+import json
+from typing import Any, Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, last_value: Any, last_id: int) -> str:
+    """Build the opaque token pointing just past the last row of a page."""
+    payload = json.dumps({"s": sort, "v": last_value, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str, value_type: Optional[type] = None) -> Tuple[Any, int]:
+    """Return (last_value, last_id) from a token issued for the same sort.
+
+    With value_type, last_value must be of that type (the sort column's).
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(payload, dict) or not isinstance(payload.get("id"), int) or isinstance(payload["id"], bool):
+        raise InvalidCursor("Invalid cursor")
+    if payload.get("s") != sort:
+        raise InvalidCursor("Cursor does not match the requested sort")
+    value = payload.get("v")
+    # bool is an int to isinstance, but never a sort value
+    if value_type is not None and (not isinstance(value, value_type) or isinstance(value, bool)):
+        raise InvalidCursor("Invalid cursor")
+    return value, payload["id"]
@@ -0,0 +1,135 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Sequence
+
+from sqlalchemy import event, exc
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound}" for bound in self.buckets] + ["le_inf"]
+            return {
+                "count": self.count,
+                "sum_seconds": round(self.total, 6),
+                "max_seconds": round(self.max, 6),
+                "mean_seconds": round(self.total / self.count, 6) if self.count else 0.0,
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class PoolStats:
+    """Counters and latency histograms for one engine's connection pool."""
+
+    def __init__(self, checkout_metric=None):
+        self.checkout = Histogram()
+        # Optional Prometheus histogram child also fed checkout latencies
+        self.checkout_metric = checkout_metric
+        self.connect = Histogram()
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool) -> dict:
+        state = {"pool_class": type(pool).__name__}
+        # Queue-based pools report their live occupancy; others (e.g. the
+        # StaticPool used in tests) only have the counters below
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            method = getattr(pool, name, None)
+            if callable(method):
+                state[name] = method()
+        state.update(
+            checkouts=self.checkouts,
+            checkins=self.checkins,
+            timeouts=self.timeouts,
+            invalidations=self.invalidations,
+            checkout_latency=self.checkout.snapshot(),
+            connect_latency=self.connect.snapshot(),
+        )
+        return state
+
+
+def instrumented_pool_class(base, stats: PoolStats):
+    """Subclass a pool class so every checkout is timed into stats.
+
+    The class carries the stats, so pools recreated by Engine.dispose()
+    keep reporting into the same object.
+    """
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = base.connect(self)
+        except exc.TimeoutError:
+            stats.increment("timeouts")
+            raise
+        elapsed = time.perf_counter() - start
+        stats.checkout.observe(elapsed)
+        if stats.checkout_metric is not None:
+            stats.checkout_metric.observe(elapsed)
+        return connection
+
+    return type(f"Instrumented{base.__name__}", (base,), {"stats": stats, "connect": connect})
+
+
+def instrument_engine(engine, stats: PoolStats):
+    """Attach pool and dialect event listeners that feed stats."""
+
+    @event.listens_for(engine, "do_connect")
+    def receive_do_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def receive_connect(dbapi_connection, connection_record):
+        started = connection_record.info.pop("connect_started", None)
+        if started is not None:
+            stats.connect.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "checkout")
+    def receive_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.increment("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def receive_checkin(dbapi_connection, connection_record):
+        stats.increment("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def receive_invalidate(dbapi_connection, connection_record, exception):
+        stats.increment("invalidations")
+
+
+def pool_snapshot(engine) -> dict:
+    """Live state and statistics of an engine's current pool."""
+    pool = engine.pool
+    stats = getattr(pool, "stats", None)
+    if stats is None:
+        return {"pool_class": type(pool).__name__, "instrumented": False}
+    return stats.snapshot(pool)
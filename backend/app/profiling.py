@@ -0,0 +1,172 @@
+"""Per-request SQL profiling.
+
+With SQL_PROFILE_SAMPLE_RATE above 0, that fraction of requests is
+profiled. For each one the engine hooks count the statements and sum the
+time spent in the database. Serialisation covers FastAPI's response_model
+validation and dump (see profile_response_serialization) and the encoding
+of response bodies in responses.py. The totals are sent in a Server-Timing header and logged
+as one JSON line. The same statement repeated SQL_PROFILE_REPEAT_THRESHOLD
+or more times in one request is logged as a suspected N+1, which is how
+lazy loads of Employee.department or Department.employees show up.
+
+Streaming responses send their headers before the body is produced, so
+their Server-Timing header only covers the work done up to then. The log
+line is written once the body is complete and covers everything.
+"""
+import functools
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import fastapi.routing
+from sqlalchemy import event
+
+from .metrics import SERIALIZE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests profiled: 0 disables profiling, 1 profiles all
+SQL_PROFILE_SAMPLE_RATE = float(os.getenv("SQL_PROFILE_SAMPLE_RATE", "0"))
+# Identical statements per request from which an N+1 is suspected
+SQL_PROFILE_REPEAT_THRESHOLD = int(os.getenv("SQL_PROFILE_REPEAT_THRESHOLD", "3"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.statements += 1
+        self.db_seconds += seconds
+        self.shapes[_WHITESPACE.sub(" ", statement).strip()] += 1
+
+    def repeated(self, threshold: int):
+        """(statement, count) pairs run at least threshold times, most frequent first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} queries", '
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}, "
+            f"total;dur={elapsed * 1000:.2f}"
+        )
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def serializing():
+    """Count the time spent in the block as response serialisation."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SERIALIZE_SECONDS.observe(elapsed)
+        profile = _current.get()
+        if profile is not None:
+            profile.serialize_seconds += elapsed
+
+
+def profile_response_serialization():
+    """Count FastAPI's serialize_response as serialisation too.
+
+    For endpoints returning data rather than a Response, FastAPI validates
+    it against the response_model and dumps it to JSON-compatible values in
+    fastapi.routing.serialize_response. The request handler looks the
+    function up when it runs, so wrapping it once covers every route.
+    """
+    serialize = fastapi.routing.serialize_response
+    if getattr(serialize, "profiled", False):
+        return
+
+    @functools.wraps(serialize)
+    async def timed_serialize_response(*args, **kwargs):
+        with serializing():
+            return await serialize(*args, **kwargs)
+
+    timed_serialize_response.profiled = True
+    fastapi.routing.serialize_response = timed_serialize_response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = getattr(context, "_profile_started", None)
+    if profile is not None and started is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+def profile_engine(engine):
+    """Attach the statement hooks to a (sync) engine."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLProfileMiddleware:
+    """ASGI middleware profiling a sample of HTTP requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or SQL_PROFILE_SAMPLE_RATE <= 0 or random.random() >= SQL_PROFILE_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        status_code = None
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            log_profile(scope, status_code, profile)
+
+
+def log_profile(scope, status_code: Optional[int], profile: RequestProfile):
+    repeated = profile.repeated(SQL_PROFILE_REPEAT_THRESHOLD)
+    line = {
+        "method": scope["method"],
+        "path": scope["path"],
+        "status": status_code,
+        "duration_ms": round((time.perf_counter() - profile.started) * 1000, 2),
+        "queries": profile.statements,
+        "db_ms": round(profile.db_seconds * 1000, 2),
+        "serialize_ms": round(profile.serialize_seconds * 1000, 2),
+    }
+    if repeated:
+        line["suspected_n_plus_one"] = [{"statement": shape, "count": count} for shape, count in repeated]
+        logger.warning("sql profile %s", json.dumps(line))
+    else:
+        logger.info("sql profile %s", json.dumps(line))
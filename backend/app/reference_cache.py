@@ -0,0 +1,128 @@
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import crud, schemas
+from .db import env_flag
+from .responses import dump_models
+from .table_versions import DEPARTMENTS, EMPLOYEES, behind_local_commits, on_commit
+
+# Seconds a worker serves its snapshot before checking the shared version
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "30"))
+# Load the snapshot at application startup
+REFERENCE_CACHE_WARMUP = env_flag("REFERENCE_CACHE_WARMUP", "true")
+
+
+class DepartmentSnapshot:
+    """Immutable view of every department, replaced as a whole on reload.
+
+    version is the departments version the rows belong to, counts_version
+    the employees version their employee_count values belong to.
+    """
+
+    def __init__(self, version: Optional[int], departments: List[schemas.Department], counts_version: Optional[int] = None):
+        self.version = version
+        self.counts_version = counts_version
+        self.loaded_at = time.monotonic()
+        self.departments = departments
+        self.by_id: Dict[int, schemas.Department] = {d.id: d for d in departments}
+        self.names: Dict[int, str] = {d.id: d.name for d in departments}
+        self._encoded: Optional[bytes] = None
+
+    def encoded(self) -> bytes:
+        """The department list as a JSON body, encoded once per snapshot."""
+        if self._encoded is None:
+            self._encoded = dump_models(self.departments)
+        return self._encoded
+
+
+class DepartmentCache:
+    """Per-process department snapshot kept coherent through version rows.
+
+    Every transaction that changes departments bumps the 'departments'
+    table version (see table_versions) and then invalidates this process's
+    snapshot. Employee counts move with every employee write, so they
+    follow the 'employees' version instead: when only that one moved, just
+    the counts are reloaded, and callers that only need names and ids
+    (counts=False) keep the snapshot. Other workers notice new versions at
+    their next TTL check.
+
+    A session whose versions are behind this process's own commits (a
+    lagging replica) gets a snapshot of what it sees, which is not kept:
+    the next reader loads again, and the writer, reading from the primary,
+    gets its write.
+    """
+
+    def __init__(self, ttl: float = REFERENCE_CACHE_TTL):
+        self.ttl = ttl
+        self._snapshot: Optional[DepartmentSnapshot] = None
+        self._generation = 0
+        self._counts_generation = 0
+        self._stale = True
+        self._counts_stale = True
+
+    def peek(self, counts: bool = True) -> Optional[DepartmentSnapshot]:
+        """The snapshot if it can be served without touching the database."""
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or time.monotonic() - snapshot.loaded_at > self.ttl:
+            return None
+        if counts and self._counts_stale:
+            return None
+        return snapshot
+
+    def get(self, db: Session, counts: bool = True) -> DepartmentSnapshot:
+        snapshot = self.peek(counts)
+        if snapshot is not None:
+            return snapshot
+
+        generation, counts_generation = self._generation, self._counts_generation
+        versions = crud.get_table_versions(db, (DEPARTMENTS, EMPLOYEES))
+        version, counts_version = versions.get(DEPARTMENTS), versions.get(EMPLOYEES)
+        if behind_local_commits(versions):
+            return DepartmentSnapshot(version, self._load(db), counts_version)
+        snapshot = self._snapshot
+        if self._stale or snapshot is None or version is None or version != snapshot.version:
+            snapshot = DepartmentSnapshot(version, self._load(db), counts_version)
+        elif counts and (self._counts_stale or counts_version != snapshot.counts_version):
+            # Only employees were written: keep the rows, refresh their counts
+            found = crud.get_department_counts(db)
+            departments = [d.model_copy(update={"employee_count": found.get(d.id, 0)}) for d in snapshot.departments]
+            snapshot = DepartmentSnapshot(version, departments, counts_version)
+        else:
+            # TTL expired but nobody wrote: keep the data, restart the clock
+            snapshot = DepartmentSnapshot(version, snapshot.departments, snapshot.counts_version)
+        self._snapshot = snapshot
+        # A write committed while loading leaves the snapshot stale
+        self._stale = generation != self._generation
+        self._counts_stale = counts_generation != self._counts_generation or counts_version != snapshot.counts_version
+        return snapshot
+
+    @staticmethod
+    def _load(db: Session) -> List[schemas.Department]:
+        return [schemas.Department.model_validate(d, from_attributes=True) for d in crud.get_departments(db)]
+
+    def invalidate(self):
+        self._generation += 1
+        self._stale = True
+        self.invalidate_counts()
+
+    def invalidate_counts(self):
+        self._counts_generation += 1
+        self._counts_stale = True
+
+    def clear(self):
+        self._snapshot = None
+        self.invalidate()
+
+
+department_cache = DepartmentCache()
+
+
+@on_commit
+def _receive_commit(session, versions):
+    if DEPARTMENTS in versions:
+        department_cache.invalidate()
+    elif EMPLOYEES in versions:
+        department_cache.invalidate_counts()
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import event
+
+# Cookie set on writes; while it is fresh the client's reads go to the
+# primary, so a save is never followed by a stale replica read
+STICKY_COOKIE = "db_primary_until"
+
+
+class Replica:
+    def __init__(self, name: str, engine, session_factory, async_engine=None, async_session_factory=None):
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory
+        self.async_engine = async_engine
+        self.async_session_factory = async_session_factory
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+
+class ReplicaSet:
+    """Round-robin over read replicas, skipping replicas that recently failed."""
+
+    def __init__(self, replicas: List[Replica], eject_seconds: float = 30.0):
+        self.replicas = replicas
+        self.eject_seconds = eject_seconds
+        self._next = 0
+        self._lock = threading.Lock()
+        for replica in replicas:
+            self._watch(replica)
+
+    def choose(self) -> Optional[Replica]:
+        """Next healthy replica, or None when the primary should serve reads."""
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next]
+                self._next = (self._next + 1) % len(self.replicas)
+                if replica.healthy:
+                    return replica
+        return None
+
+    def eject(self, replica: Replica):
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+        replica.ejections += 1
+
+    def _watch(self, replica: Replica):
+        def receive_handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self.eject(replica)
+
+        event.listen(replica.engine, "handle_error", receive_handle_error)
+        if replica.async_engine is not None:
+            event.listen(replica.async_engine.sync_engine, "handle_error", receive_handle_error)
+
+
+def sticky_to_primary(cookies) -> bool:
+    try:
+        return float(cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
@@ -0,0 +1,92 @@
+"""JSON response encoding.
+
+With FAST_JSON_RESPONSES=true, bodies are encoded by orjson (when it is
+installed) and routes serving data that is already in response shape -
+plain joined rows or validated schema objects from the reference cache -
+return encoded bytes directly instead of having FastAPI validate and
+jsonable_encoder every row again. The declared response_model, and so the
+OpenAPI schema, is the same either way.
+
+Text bodies (JSON, NDJSON, CSV) of at least RESPONSE_COMPRESSION_MIN_SIZE
+bytes are gzip-compressed for clients that accept it; 0 turns compression
+off. MessagePack bodies are left alone.
+"""
+import json
+import os
+from typing import Any
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+
+from .db import env_flag
+from .profiling import serializing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON_RESPONSES = env_flag("FAST_JSON_RESPONSES")
+
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+RESPONSE_COMPRESSION_LEVEL = int(os.getenv("RESPONSE_COMPRESSION_LEVEL", "6"))
+COMPRESSED_MEDIA_TYPES = ("application/json", "application/x-ndjson", "text/csv")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode JSON-compatible content exactly as JSONResponse would."""
+    if FAST_JSON_RESPONSES and orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def dump_models(value: Any) -> bytes:
+    """Encode validated pydantic models (or lists of them) without revalidating."""
+    with serializing():
+        return to_json(value)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with serializing():
+            return dumps(content)
+
+
+def trusted_response(body: bytes, response: Response, media_type: str = "application/json") -> Response:
+    """Send an already-encoded body, JSON unless told otherwise, keeping headers set on response."""
+    trusted = Response(body, media_type=media_type)
+    # Returned responses do not pick up headers set on the injected one
+    trusted.headers.raw.extend(response.headers.raw)
+    return trusted
+
+
+class _TextGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message):
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            media_type = Headers(raw=message["headers"]).get("content-type", "").split(";")[0].strip()
+            if media_type not in COMPRESSED_MEDIA_TYPES:
+                # Passed through untouched, as for an already-encoded body
+                self.content_encoding_set = True
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware restricted to text media types."""
+
+    def __init__(self, app):
+        super().__init__(app, minimum_size=RESPONSE_COMPRESSION_MIN_SIZE, compresslevel=RESPONSE_COMPRESSION_LEVEL)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] == "http"
+            and RESPONSE_COMPRESSION_MIN_SIZE > 0
+            and "gzip" in Headers(scope=scope).get("Accept-Encoding", "")
+        ):
+            await _TextGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -1,26 +1,20 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional
-from fastapi import HTTPException
-import re
-
-# Common validation functions
-def validate_name(name: str) -> str:
-    if len(name) < 2:
-        raise HTTPException(status_code=422, detail="Name must be at least 2 characters long")
-    if len(name) > 100:
-        raise HTTPException(status_code=422, detail="Name cannot exceed 100 characters")
-    if not re.match(r'^[a-zA-Z\s\'-]+$', name):
-        raise HTTPException(status_code=422, detail="Name can only contain letters, spaces, hyphens, and apostrophes")
-    return name.strip()
-
-def validate_city_name(city: str) -> str:
-    if len(city) < 2:
-        raise HTTPException(status_code=422, detail="City must be at least 2 characters long")
-    if len(city) > 100:
-        raise HTTPException(status_code=422, detail="City cannot exceed 100 characters")
-    if not re.match(r'^[a-zA-Z\s-]+$', city):
-        raise HTTPException(status_code=422, detail='City name can only contain letters, spaces, and hyphens')
-    return city.strip()
+from datetime import datetime
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic_core import PydanticCustomError
+from typing import Any, List, Optional, Tuple
+
+from .validation import (
+    CONSTRAINT_ERROR,
+    Age,
+    CityName,
+    DepartmentName,
+    ExternalId,
+    PersonName,
+    PositiveId,
+    describe,
+    validate_batch,
+)
 
 class EmployeeBase(BaseModel):
     name: str = Field(..., description="Name (2-100 chars, letters only)")
@@ -30,50 +24,157 @@ class EmployeeBase(BaseModel):
 
 
 class EmployeeCreate(EmployeeBase):
-    
-    @validator('name')
-    def validate_name_field(cls, v):
-        return validate_name(v)
+    name: PersonName = Field(..., description="Name (2-100 chars, letters only)")
+    age: Age = Field(..., description="Age must be between 18 and 100")
+    city: CityName = Field(..., description="City (2-100 chars, letters only)")
 
-    @validator('age')
-    def validate_age_field(cls, v):
-        if not 18 <= v <= 100:
-            raise HTTPException(status_code=422, detail="Age must be between 18 and 100")
-        return v
 
-    @validator('city')
-    def validate_city_field(cls, v):
-        return validate_city_name(v)
+class EmployeeSync(EmployeeCreate):
+    external_id: ExternalId = Field(..., description="The employee's id in the upstream system")
 
 
 class EmployeeUpdate(BaseModel):
-    name: Optional[str] = Field(None)
-    age: Optional[int] = Field(None)
-    city: Optional[str] = Field(None)
-    department_id: Optional[int] = Field(None, ge=1)
+    name: Optional[PersonName] = Field(None)
+    age: Optional[Age] = Field(None)
+    city: Optional[CityName] = Field(None)
+    department_id: Optional[PositiveId] = Field(None)
 
-    @validator('name')
-    def validate_name_field(cls, v):
-        if v is not None:
-            return validate_name(v)
-        return v
+    class Config:
+        extra = 'forbid'  # Prevent extra fields
 
-    @validator('age')
-    def validate_age_field(cls, v):
-        if v is not None:
-            if not 18 <= v <= 100:
-                raise HTTPException(status_code=422, detail='Age must be between 18 and 100')
-            return v
-        return v
+class EmployeeFilter(BaseModel):
+    department_id: Optional[int] = Field(None, ge=1, description="Only employees of this department")
+    city: Optional[str] = Field(None, description="Exact city match")
+    min_age: Optional[int] = Field(None, ge=0, description="Minimum age (inclusive)")
+    max_age: Optional[int] = Field(None, ge=0, description="Maximum age (inclusive)")
 
-    @validator('city')
-    def validate_city_field(cls, v):
-        if v is not None:
-            return validate_city_name(v)
-        return v
+# Employees a bulk mutation may name by id
+MAX_SELECTION_IDS = 10000
+
+class EmployeeSelection(EmployeeFilter):
+    """Employees matched by ids and/or the list filters (all must hold)."""
+    ids: Optional[List[PositiveId]] = Field(None, max_length=MAX_SELECTION_IDS, description="Only these employees")
+
+    @model_validator(mode="after")
+    def require_criteria(self):
+        # An empty selection would match every employee
+        if all(value is None for value in self.model_dump().values()):
+            raise PydanticCustomError(CONSTRAINT_ERROR, "Select employees by ids or at least one filter")
+        return self
 
     class Config:
-        extra = 'forbid'  # Prevent extra fields
+        extra = 'forbid'
+
+class EmployeeBulkChanges(BaseModel):
+    age: Optional[Age] = Field(None)
+    city: Optional[CityName] = Field(None)
+    department_id: Optional[PositiveId] = Field(None)
+
+    @model_validator(mode="after")
+    def require_changes(self):
+        if all(value is None for value in self.model_dump().values()):
+            raise PydanticCustomError(CONSTRAINT_ERROR, "Give at least one of age, city or department_id to change")
+        return self
+
+    class Config:
+        extra = 'forbid'
+
+class EmployeeBulkUpdate(BaseModel):
+    where: EmployeeSelection
+    set: EmployeeBulkChanges
+
+class DepartmentReassignment(BaseModel):
+    target_department_id: PositiveId = Field(..., description="Department receiving the employees")
+
+class BulkMutationResult(BaseModel):
+    affected: int = Field(..., description="Employees changed, or that would be changed in a dry run")
+    dry_run: bool
+
+class BulkRowError(BaseModel):
+    index: int = Field(..., description="Zero-based position of the row in the request")
+    detail: str
+
+class BulkEmployeeResult(BaseModel):
+    ids: List[Optional[int]] = Field(..., description="Created ids, aligned with the request rows (null if not created)")
+    created: int
+    errors: List[BulkRowError] = []
+
+class ImportResult(BaseModel):
+    imported: int
+    rejected: int
+    errors: List[BulkRowError] = Field([], description="Rejected rows (zero-based data row index), capped at 1000")
+
+class SyncResult(BaseModel):
+    inserted: int
+    updated: int
+    unchanged: int = Field(..., description="Rows whose content matched the stored hash, left unwritten")
+    rejected: int
+    errors: List[BulkRowError] = Field([], description="Rejected rows (zero-based index), capped at 1000")
+
+class EmployeeSearchHit(BaseModel):
+    id: int
+    name: str
+    city: str
+    department_id: Optional[int] = None
+    department_name: Optional[str] = None
+    score: float = Field(..., description="Relevance; higher is better")
+
+class DepartmentFacet(BaseModel):
+    department_id: Optional[int] = None
+    department_name: Optional[str] = None
+    count: int
+
+class CityFacet(BaseModel):
+    city: str
+    count: int
+
+class EmployeeSearchResult(BaseModel):
+    total: int = Field(..., description="Matching employees after the department/city filters")
+    results: List[EmployeeSearchHit]
+    departments: List[DepartmentFacet] = Field(..., description="Matches per department, before filtering")
+    cities: List[CityFacet] = Field(..., description="Matches per city, before filtering")
+
+class AnalyticsReport(BaseModel):
+    generated_at: datetime = Field(..., description="When the figures were computed (UTC)")
+    age_seconds: float = Field(..., description="Seconds since the figures were computed")
+
+class WorkforceSummary(AnalyticsReport):
+    employees: int
+    average_age: Optional[float] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    departments: int
+    cities: int
+    unassigned: int = Field(..., description="Employees without a department")
+
+class DepartmentHeadcount(BaseModel):
+    department_id: Optional[int] = Field(None, description="Null for employees without a department")
+    department_name: Optional[str] = None
+    headcount: int
+    average_age: Optional[float] = None
+    share: float = Field(..., description="Fraction of all employees")
+
+class HeadcountReport(AnalyticsReport):
+    departments: List[DepartmentHeadcount]
+
+class AgeBucket(BaseModel):
+    label: str
+    min_age: int
+    max_age: Optional[int] = Field(None, description="Inclusive; null for the open-ended last bucket")
+    count: int
+    share: float = Field(..., description="Fraction of all employees")
+
+class AgeDistributionReport(AnalyticsReport):
+    buckets: List[AgeBucket]
+
+class CityCount(BaseModel):
+    city: str
+    count: int
+    average_age: Optional[float] = None
+    share: float = Field(..., description="Fraction of all employees")
+
+class CityReport(AnalyticsReport):
+    cities: List[CityCount]
 
 class DepartmentAssignment(BaseModel):
     department_id: int = Field(..., ge=1, description="Must be a valid department ID")
@@ -90,6 +191,18 @@ class Employee(EmployeeBase):
     class Config:
         orm_mode = True
 
+class EmployeeChange(BaseModel):
+    id: int = Field(..., description="Employee ID")
+    revision: int = Field(..., description="Revision of the write; increases with every committed write")
+    deleted: bool
+    changed_at: Optional[datetime] = None
+    employee: Optional[Employee] = Field(None, description="The employee as it is now; null when deleted")
+
+class EmployeeChanges(BaseModel):
+    changes: List[EmployeeChange]
+    next_cursor: str = Field(..., description="Pass as since to read the changes after this page")
+    has_more: bool = Field(..., description="Whether more changes are available right away")
+
 class DepartmentBase(BaseModel):
     name: str = Field(..., description="Department name (2-50 chars)")
     description: Optional[str] = Field(None, description="Optional description (max 500 chars)")
@@ -97,42 +210,18 @@ class DepartmentBase(BaseModel):
     
 
 class DepartmentCreate(DepartmentBase):
-    @validator('name')
-    def validate_department_name(cls, v):
-        if v is None:
-            raise HTTPException(status_code=422, detail="Department name is required")
-
-        if v is not None:
-            if len(v) == 0:
-                raise HTTPException(status_code=422, detail="Department name cannot be empty")
-            if len(v) < 2:
-                raise HTTPException(status_code=422, detail="Department name must be at least 2 characters long")
-            if len(v) > 50:
-                raise HTTPException(status_code=422, detail="Department name cannot exceed 50 characters")
-            if not re.match(r'^[a-zA-Z\s\'-]+$', v):
-                raise HTTPException(status_code=422, detail='Department name can only contain letters, spaces, hyphens, and apostrophes')
-        return v.strip()
+    name: DepartmentName = Field(..., description="Department name (2-50 chars)")
 
 class DepartmentUpdate(BaseModel):
-    name: Optional[str] = Field(None)
+    name: Optional[DepartmentName] = Field(None)
     description: Optional[str] = Field(None)
 
-    @validator('name')
-    def validate_department_name(cls, v):
+    @field_validator('name')
+    @classmethod
+    def validate_name_field(cls, v):
+        # The name may be left out, but not cleared
         if v is None:
-            raise HTTPException(status_code=422, detail="Department name is required")
-        #return v
-
-        if v is not None:
-            if len(v) == 0:
-                raise HTTPException(status_code=422, detail="Department name cannot be empty")
-            if len(v) < 2:
-                raise HTTPException(status_code=422, detail="Department name must be at least 2 characters long")
-            if len(v) > 50:
-                raise HTTPException(status_code=422, detail="Department name cannot exceed 50 characters")
-            if not re.match(r'^[a-zA-Z\s\'-]+$', v):
-                raise HTTPException(status_code=422, detail='Department name can only contain letters, spaces, hyphens, and apostrophes')
-            return v.strip()
+            raise PydanticCustomError(CONSTRAINT_ERROR, "Department name is required")
         return v
 
     class Config:
@@ -144,3 +233,12 @@ class Department(DepartmentBase):
     
     class Config:
         orm_mode = True
+
+
+def validate_employee_rows(rows: List[Any]) -> Tuple[List[Tuple[int, EmployeeCreate]], List[BulkRowError]]:
+    """Validate raw rows with the EmployeeCreate rules, collecting per-row errors."""
+    valid, errors = validate_batch(EmployeeCreate, rows)
+    return valid, [
+        BulkRowError(index=index, detail=describe(row_errors))
+        for index, row_errors in sorted(errors.items())
+    ]
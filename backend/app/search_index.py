@@ -0,0 +1,460 @@
+"""In-process search index over employee names and cities.
+
+Names and cities are split into lower-case words. Each field keeps its
+vocabulary three ways: word -> employee ids (exact matches), a sorted word
+list (prefix matches, found with bisect) and trigram -> words (fuzzy
+matches). Lookups work on the vocabulary, which is far smaller than the
+number of employees, and only touch the postings of matching words.
+
+The index is loaded at startup and then follows this process's writes as
+they commit: ORM changes are picked up at flush, statement writes
+(multi-row INSERTs, UPDATE/DELETE ... RETURNING) are announced by
+crud.note_employee_writes. The 'employees' table version
+tells whether anything else happened in between (another worker, a CSV
+import); if so the index catches up from the change feed's revisions:
+the employees written and the tombstones recorded since its version. It
+is only loaded again when that history is gone (pruned tombstones) or the
+index is invalidated; a session reporting an older version than the
+index's, as a lagging replica does, leaves it as it is. Searches keep
+using the index as it is while one request brings it up to date.
+"""
+import heapq
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, defaultdict
+from itertools import chain
+from operator import attrgetter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .change_feed import TOMBSTONES_PRUNED
+from .db import env_flag
+from .table_versions import EMPLOYEES, on_bump, on_commit
+
+# Seconds between checks of the shared version for other workers' writes
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "5"))
+# Build the index at application startup
+SEARCH_INDEX_WARMUP = env_flag("SEARCH_INDEX_WARMUP", "true")
+
+# Score of a query word against an indexed word, before field weights
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.6
+# Trigram similarity (Jaccard) below which a word is not a fuzzy match
+MIN_SIMILARITY = 0.4
+# Words a single prefix may expand to
+MAX_PREFIX_EXPANSION = 1000
+# Search results kept until the index next changes
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "256"))
+
+NAME_WEIGHT = 1.0
+CITY_WEIGHT = 0.5
+
+# Session.info key collecting this transaction's changes
+_PENDING = "search_index_pending"
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def words(text: Optional[str]) -> List[str]:
+    return _WORD.findall(text.lower()) if text else []
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Document(NamedTuple):
+    name: str
+    city: str
+    department_id: Optional[int]
+
+
+class _FieldIndex:
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = {}
+        self.vocabulary: List[str] = []
+        self.grams: Dict[str, Set[str]] = defaultdict(set)
+        self.gram_counts: Dict[str, int] = {}
+
+    def add(self, doc_id: int, text: str, loading: bool = False):
+        for word in words(text):
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                # While loading the vocabulary is sorted once at the end
+                if not loading:
+                    insort(self.vocabulary, word)
+                grams = trigrams(word)
+                self.gram_counts[word] = len(grams)
+                for gram in grams:
+                    self.grams[gram].add(word)
+            ids.add(doc_id)
+
+    def finish_loading(self):
+        self.vocabulary = sorted(self.postings)
+
+    def remove(self, doc_id: int, text: str):
+        for word in words(text):
+            ids = self.postings.get(word)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[word]
+                del self.vocabulary[bisect_left(self.vocabulary, word)]
+                del self.gram_counts[word]
+                for gram in trigrams(word):
+                    self.grams[gram].discard(word)
+
+    def match(self, query_word: str) -> Dict[str, float]:
+        """Indexed words matching query_word, with their scores."""
+        scores: Dict[str, float] = {}
+        start = bisect_left(self.vocabulary, query_word)
+        for word in self.vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not word.startswith(query_word):
+                break
+            scores[word] = EXACT_SCORE if word == query_word else PREFIX_SCORE
+
+        if len(query_word) >= 3:
+            query_grams = trigrams(query_word)
+            shared: Counter = Counter()
+            for gram in query_grams:
+                shared.update(self.grams.get(gram, ()))
+            gram_counts = self.gram_counts
+            for word, count in shared.items():
+                if word in scores:
+                    continue
+                similarity = count / (len(query_grams) + gram_counts[word] - count)
+                if similarity >= MIN_SIMILARITY:
+                    scores[word] = FUZZY_SCORE * similarity
+        return scores
+
+
+class SearchResult(NamedTuple):
+    total: int
+    hits: List[Tuple[int, Document, float]]
+    departments: List[Tuple[Optional[int], int]]
+    cities: List[Tuple[str, int]]
+
+
+class EmployeeSearchIndex:
+    def __init__(self, ttl: float = SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self.version: Optional[int] = None
+        self.checked_at = 0.0
+        self.stale = True
+        self._documents: Dict[int, Document] = {}
+        self._fields = {"name": _FieldIndex(), "city": _FieldIndex()}
+        # Employee ids per department and per city, for the search filters
+        self._by_department: Dict[Optional[int], Set[int]] = {}
+        self._by_city: Dict[str, Set[int]] = {}
+        self._results: "OrderedDict[tuple, SearchResult]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def fresh(self) -> bool:
+        """Whether searches can be served without checking the database."""
+        return not self.stale and time.monotonic() - self.checked_at <= self.ttl
+
+    def refresh(self, db: Session):
+        """Bring the index up to date if the employees table moved past it."""
+        if self.fresh():
+            return
+        # Only a missing or invalidated index makes searches wait; otherwise
+        # they use it as it is while another request catches up
+        if not self._load_lock.acquire(blocking=self.stale or self.version is None):
+            return
+        try:
+            if self.fresh():
+                return
+            version = crud.get_table_versions(db, (EMPLOYEES,)).get(EMPLOYEES)
+            if self.stale or self.version is None or version is None:
+                self._reload(db, version)
+            elif version < self.version:
+                # A lagging replica: the index already holds more than it
+                # could give, so keep it as it is
+                pass
+            elif version != self.version and not self._catch_up(db, version):
+                self._reload(db, version)
+            self.checked_at = time.monotonic()
+        finally:
+            self._load_lock.release()
+
+    def _reload(self, db: Session, version: Optional[int]):
+        rows = db.execute(
+            select(models.Employee.id, models.Employee.name, models.Employee.city, models.Employee.department_id),
+            execution_options={"yield_per": 10000},
+        )
+        self.load(rows, version)
+
+    def _catch_up(self, db: Session, version: int) -> bool:
+        """Apply the employees written and deleted since the index version.
+
+        Rows committed after version was read may be applied too; the next
+        catch-up applies them again. False when the tombstones needed were
+        pruned and the index must be loaded again.
+        """
+        since = self.version
+        employee = models.Employee
+        tombstone = models.EmployeeTombstone
+        written = db.execute(
+            select(employee.revision, employee.id, employee.name, employee.city, employee.department_id).where(
+                employee.revision > since
+            )
+        ).all()
+        # After the employees, so a deletion committing in between is not
+        # undone by the row read before it
+        deleted = db.execute(
+            select(tombstone.revision, tombstone.employee_id).where(tombstone.revision > since)
+        ).all()
+        # In the change feed's order, as ids may be reused after a deletion
+        changes = sorted(
+            [(revision, False, doc_id, Document(name, city, department_id))
+             for revision, doc_id, name, city, department_id in written]
+            + [(revision, True, doc_id, None) for revision, doc_id in deleted],
+            key=lambda change: change[:3],
+        )
+        pruned = crud.get_table_versions(db, (TOMBSTONES_PRUNED,)).get(TOMBSTONES_PRUNED)
+        if pruned and since < pruned:
+            return False
+        with self._lock:
+            # A commit applied meanwhile may be newer than the rows read
+            if self.version != since:
+                self.expire()
+                return True
+            self._apply_changes([(doc_id, document) for _, _, doc_id, document in changes])
+            self.version = version
+        return True
+
+    def load(self, rows: Iterable[tuple], version: Optional[int]):
+        documents: Dict[int, Document] = {}
+        fields = {"name": _FieldIndex(), "city": _FieldIndex()}
+        by_department: Dict[Optional[int], Set[int]] = defaultdict(set)
+        by_city: Dict[str, Set[int]] = defaultdict(set)
+        for doc_id, name, city, department_id in rows:
+            documents[doc_id] = Document(name, city, department_id)
+            fields["name"].add(doc_id, name, loading=True)
+            fields["city"].add(doc_id, city, loading=True)
+            by_department[department_id].add(doc_id)
+            by_city[city].add(doc_id)
+        for field in fields.values():
+            field.finish_loading()
+        with self._lock:
+            self._documents = documents
+            self._fields = fields
+            self._by_department = dict(by_department)
+            self._by_city = dict(by_city)
+            self.version = version
+            self._results.clear()
+            self.stale = False
+
+    def apply(self, changes: List[Tuple[int, Optional[Document]]], version: int):
+        """Apply one committed transaction's changes (None removes)."""
+        with self._lock:
+            # Anything but the next version means writes this index never saw
+            if self.stale or self.version is None or version != self.version + 1:
+                self.expire()
+                return
+            self._apply_changes(changes)
+            self.version = version
+
+    def _apply_changes(self, changes: List[Tuple[int, Optional[Document]]]):
+        for doc_id, document in changes:
+            self._remove(doc_id)
+            if document is not None:
+                self._documents[doc_id] = document
+                self._fields["name"].add(doc_id, document.name)
+                self._fields["city"].add(doc_id, document.city)
+                self._by_department.setdefault(document.department_id, set()).add(doc_id)
+                self._by_city.setdefault(document.city, set()).add(doc_id)
+        self._results.clear()
+
+    def _remove(self, doc_id: int):
+        document = self._documents.pop(doc_id, None)
+        if document is not None:
+            self._fields["name"].remove(doc_id, document.name)
+            self._fields["city"].remove(doc_id, document.city)
+            self._by_department[document.department_id].discard(doc_id)
+            self._by_city[document.city].discard(doc_id)
+
+    def invalidate(self):
+        """Load the index again before the next search."""
+        self.stale = True
+
+    def expire(self):
+        """Check the employees version before the next search."""
+        self.checked_at = float("-inf")
+
+    def _matching_postings(self, query_word: str) -> Dict[float, List[Set[int]]]:
+        """Postings of the words matching query_word, keyed by weighted score."""
+        postings: Dict[float, List[Set[int]]] = defaultdict(list)
+        for field, weight in (("name", NAME_WEIGHT), ("city", CITY_WEIGHT)):
+            index = self._fields[field]
+            for word, score in index.match(query_word).items():
+                postings[round(score * weight, 2)].append(index.postings[word])
+        return postings
+
+    @staticmethod
+    def _tiers(
+        postings: Dict[float, List[Set[int]]], within: Optional[Set[int]] = None
+    ) -> Tuple[List[Tuple[float, Set[int]]], Set[int]]:
+        """Employees in postings (and within, if given) grouped by score, best first.
+
+        Each employee appears once, at its best score over both fields. The
+        groups are built with set operations; restricting to `within` first
+        keeps a broad word cheap once another word has narrowed the matches.
+        """
+        tiers = []
+        matched: Set[int] = set()
+        for score in sorted(postings, reverse=True):
+            sets = postings[score] if within is None else [within.intersection(ids) for ids in postings[score]]
+            ids = set().union(*sets)
+            ids -= matched
+            if ids:
+                tiers.append((score, ids))
+                matched |= ids
+        return tiers, matched
+
+    @staticmethod
+    def _ranked(
+        word_tiers: List[List[Tuple[float, Set[int]]]], candidates: Optional[Set[int]], limit: int
+    ) -> List[Tuple[int, float]]:
+        """The best `limit` matches by total score, ties by id.
+
+        An employee's total is the sum of one tier per query word, so the
+        combinations of tiers are visited best total first and the search
+        stops as soon as `limit` hits are found. candidates, when given,
+        restricts the hits to a filtered subset of the matches.
+        """
+        hits: List[Tuple[int, float]] = []
+        first = (0,) * len(word_tiers)
+        heap = [(-sum(tiers[0][0] for tiers in word_tiers), first)]
+        seen = {first}
+        while heap and len(hits) < limit:
+            negative_total, combination = heapq.heappop(heap)
+            sets = sorted((tiers[i][1] for tiers, i in zip(word_tiers, combination)), key=len)
+            if candidates is not None:
+                sets.insert(0, candidates)
+            ids = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+            for doc_id in sorted(heapq.nsmallest(limit - len(hits), ids)):
+                hits.append((doc_id, round(-negative_total, 2)))
+            for position, tiers in enumerate(word_tiers):
+                if combination[position] + 1 < len(tiers):
+                    following = combination[:position] + (combination[position] + 1,) + combination[position + 1:]
+                    if following not in seen:
+                        seen.add(following)
+                        total = sum(tiers[i][0] for tiers, i in zip(word_tiers, following))
+                        heapq.heappush(heap, (-total, following))
+        return hits
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        department_id: Optional[int] = None,
+        city: Optional[str] = None,
+    ) -> SearchResult:
+        """Employees matching every query word, best first.
+
+        Facets count all matches; the department_id and city filters only
+        narrow the returned hits, so the facets still show the alternatives.
+        """
+        query_words = words(query)
+        key = (tuple(query_words), limit, department_id, city)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return result
+
+            # The most selective word first; the others only look within its matches
+            postings = sorted(
+                (self._matching_postings(query_word) for query_word in query_words),
+                key=lambda scored: sum(len(ids) for sets in scored.values() for ids in sets),
+            )
+            word_tiers = []
+            matches: Optional[Set[int]] = None
+            for scored in postings:
+                tiers, matches = self._tiers(scored, matches)
+                if not matches:
+                    break
+                word_tiers.append(tiers)
+            matches = matches or set()
+
+            documents = list(map(self._documents.__getitem__, matches))
+            departments = Counter(map(attrgetter("department_id"), documents))
+            cities = Counter(map(attrgetter("city"), documents))
+
+            candidates = None
+            if department_id is not None:
+                candidates = matches & self._by_department.get(department_id, set())
+            if city is not None:
+                candidates = (matches if candidates is None else candidates) & self._by_city.get(city, set())
+            hits = candidates if candidates is not None else matches
+            best = self._ranked(word_tiers, candidates, limit) if hits else []
+            result = SearchResult(
+                total=len(hits),
+                hits=[(doc_id, self._documents[doc_id], score) for doc_id, score in best],
+                departments=departments.most_common(),
+                cities=cities.most_common(),
+            )
+            self._results[key] = result
+            if len(self._results) > SEARCH_RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return result
+
+
+search_index = EmployeeSearchIndex()
+
+
+def _pending(session: Session) -> Dict[int, Optional[Document]]:
+    return session.info.setdefault(_PENDING, {})
+
+
+@event.listens_for(Session, "after_flush")
+def _receive_after_flush(session, flush_context):
+    for instance in chain(session.new, session.dirty):
+        if isinstance(instance, models.Employee):
+            _pending(session)[instance.id] = Document(instance.name, instance.city, instance.department_id)
+    for instance in session.deleted:
+        if isinstance(instance, models.Employee):
+            _pending(session)[instance.id] = None
+
+
+@on_bump
+def _receive_bump(session, versions):
+    # The change feed clears the statement writes once they are stamped;
+    # keep a copy for the commit
+    for doc_id, employee in session.info.get(crud.WRITTEN_EMPLOYEES, []):
+        _pending(session)[doc_id] = (
+            None if employee is None else Document(employee.name, employee.city, employee.department_id)
+        )
+
+
+@on_commit
+def _receive_commit(session, versions):
+    pending = session.info.pop(_PENDING, {})
+    untracked = session.info.pop(crud.UNTRACKED_EMPLOYEE_WRITES, False)
+    if EMPLOYEES not in versions:
+        return
+    if untracked:
+        search_index.expire()
+        return
+    search_index.apply(list(pending.items()), versions[EMPLOYEES])
+
+
+@event.listens_for(Session, "after_rollback")
+def _receive_after_rollback(session):
+    session.info.pop(_PENDING, None)
+    session.info.pop(crud.UNTRACKED_EMPLOYEE_WRITES, None)
@@ -0,0 +1,159 @@
+"""Production server: a gunicorn master managing uvicorn workers.
+
+    python -m app.serve
+
+The master imports the app once and checks the database before forking,
+so workers start from its memory copy-on-write instead of each importing
+everything again. Workers are recycled after a number of requests, drain
+in-flight requests on SIGTERM, and open their pool connections (see
+DB_POOL_WARMUP) before serving.
+
+Settings, from the environment:
+
+    BIND                 address to listen on (0.0.0.0:8000)
+    WEB_CONCURRENCY      worker processes (one per available CPU)
+    MAX_REQUESTS         requests before a worker is replaced (10000, 0 never)
+    MAX_REQUESTS_JITTER  random extra requests, so workers do not restart together (1000)
+    GRACEFUL_TIMEOUT     seconds workers get to finish requests on shutdown (30)
+    WORKER_TIMEOUT       seconds of silence before a worker is killed (60)
+    KEEPALIVE            seconds to hold idle keep-alive connections (5)
+
+The master logs how long startup took: importing the dependencies,
+importing (constructing) the app, and the first database connection. The
+same phases are exported as the app_startup_seconds metric, with each
+worker's pool warm-up.
+"""
+import time
+
+_started = time.perf_counter()
+
+import gc
+import logging
+import os
+import tempfile
+from typing import Any, Dict
+
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger("app.serve")
+
+
+def available_cpus() -> int:
+    try:
+        # The CPUs this process may run on, which respects container pinning
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def prepare_environment(workers: int):
+    """Settings that must be in place before the app is imported."""
+    os.environ.setdefault("DB_POOL_WARMUP", os.getenv("DB_POOL_SIZE", "5"))
+    if workers < 2:
+        return
+    # Workers share metrics through files; stale ones from a previous run would be counted
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="prometheus-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+
+
+def load_app():
+    """Import the app, timing each phase, and check the database is reachable."""
+    phases = {"python": time.perf_counter() - _started}
+
+    start = time.perf_counter()
+    import fastapi  # noqa: F401
+    import pydantic  # noqa: F401
+    import sqlalchemy  # noqa: F401
+    import uvicorn.workers  # noqa: F401
+    phases["imports"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from app import db
+    from app.main import app
+    phases["app"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+        phases["db_connect"] = time.perf_counter() - start
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        # Workers retry on their own; the master only reports it
+        logger.warning("Database not reachable at startup: %s", e)
+    # Connections must not be shared with the forked workers
+    db.engine.dispose()
+
+    from app.metrics import STARTUP_SECONDS
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.labels(phase).set(seconds)
+    logger.info(
+        "Startup took %.3fs: %s",
+        time.perf_counter() - _started,
+        ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in phases.items()),
+    )
+    return app
+
+
+def post_fork(server, worker):
+    from app import db
+
+    # Forget any pooled connection inherited from the master without closing it
+    db.engine.dispose(close=False)
+    for replica in db.replicas.replicas:
+        replica.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from app.metrics import worker_exit
+
+    worker_exit(worker.pid)
+
+
+class Server(BaseApplication):
+    def __init__(self, app, options: Dict[str, Any]):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def server_options(workers: int) -> Dict[str, Any]:
+    return {
+        "bind": os.getenv("BIND", "0.0.0.0:8000"),
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "max_requests": int(os.getenv("MAX_REQUESTS", "10000")),
+        "max_requests_jitter": int(os.getenv("MAX_REQUESTS_JITTER", "1000")),
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "60")),
+        "keepalive": int(os.getenv("KEEPALIVE", "5")),
+        "post_fork": post_fork,
+        "child_exit": child_exit,
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # The instrumented pool classes would otherwise log every dispose at INFO
+    logging.getLogger("app.pool_metrics").setLevel(logging.WARNING)
+    workers = int(os.getenv("WEB_CONCURRENCY") or available_cpus())
+    prepare_environment(workers)
+    app = load_app()
+    # Objects alive now are never collected; keeping the collector off them
+    # keeps the pages shared with the workers from being copied
+    gc.freeze()
+    Server(app, server_options(workers)).run()
+
+
+if __name__ == "__main__":
+    main()
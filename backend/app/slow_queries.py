@@ -0,0 +1,191 @@
+"""Slow-query log.
+
+Statements taking longer than SLOW_QUERY_SECONDS are recorded with their
+SQL, redacted parameters, duration and the route that ran them. The
+newest SLOW_QUERY_LOG_SIZE entries are kept in memory, per worker, and
+served by /admin/slow-queries; each one is also logged as a JSON line.
+
+On PostgreSQL the plan of a slow statement is captured once per statement
+fingerprint (the SQL with literals and IN lists folded) by running
+EXPLAIN (ANALYZE off) on the same connection. That only plans the
+statement, so writes are not repeated.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.5"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+
+# Statements EXPLAIN accepts
+EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+
+_WHITESPACE = re.compile(r"\s+")
+# asyncpg's $1, $2 ...: numbered by position, so an IN list renumbers the
+# placeholders after it
+_NUMBERED_PLACEHOLDERS = re.compile(r"\$\d+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*(\?|%\(\w+\)s|%s|:\w+)(\s*,\s*(\?|%\(\w+\)s|%s|:\w+))*\s*\)")
+
+# ASGI scope of the request being served; the router adds the matched route to it
+_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_scope", default=None)
+
+
+def fingerprint(statement: str) -> str:
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _LITERALS.sub("?", _NUMBERED_PLACEHOLDERS.sub("?", shape))
+    shape = _PLACEHOLDER_LISTS.sub("(?)", shape)
+    return hashlib.blake2b(shape.encode(), digest_size=8).hexdigest()
+
+
+def current_route() -> Optional[str]:
+    """"GET /employees/{employee_id}" for the running request, if any."""
+    scope = _scope.get()
+    if scope is None:
+        return None
+    return f"{scope['method']} {getattr(scope.get('route'), 'path', scope['path'])}"
+
+
+def _redact(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> Any:
+    """Parameter types and lengths, never their values."""
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "first": redact_parameters(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: _redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_redact(value) for value in parameters]
+    return _redact(parameters)
+
+
+class SlowQueryLog:
+    """Bounded ring buffer of slow statements, and their plans by fingerprint."""
+
+    def __init__(self, size: int = SLOW_QUERY_LOG_SIZE):
+        self.entries: deque = deque(maxlen=size)
+        self.plans: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self.size = size
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.entries.append(entry)
+
+    def needs_plan(self, key: str) -> bool:
+        with self._lock:
+            return key not in self.plans
+
+    def add_plan(self, key: str, plan: Optional[str]):
+        with self._lock:
+            self.plans[key] = plan
+            while len(self.plans) > self.size:
+                self.plans.popitem(last=False)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Entries newest first, each with its fingerprint's plan if captured."""
+        with self._lock:
+            return [{**entry, "plan": self.plans.get(entry["fingerprint"])} for entry in reversed(self.entries)]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.plans.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _explain(conn, statement: str, parameters: Any) -> Optional[str]:
+    # Inside a savepoint, so a failing EXPLAIN cannot abort the request's transaction
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE off) {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            logger.debug("EXPLAIN failed: %s", e)
+            plan = None
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    except Exception as e:
+        logger.debug("EXPLAIN failed: %s", e)
+        return None
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._slow_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._slow_query_started
+    if elapsed < SLOW_QUERY_SECONDS:
+        return
+    key = fingerprint(statement)
+    entry = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(elapsed * 1000, 2),
+        "route": current_route(),
+        "fingerprint": key,
+        "statement": statement,
+        "parameters": redact_parameters(parameters, executemany),
+    }
+    slow_query_log.record(entry)
+    logger.warning("slow query %s", json.dumps(entry))
+
+    if (
+        SLOW_QUERY_EXPLAIN
+        and conn.dialect.name == "postgresql"
+        and not executemany
+        and statement.lstrip()[:6].split(None, 1)[0].lower() in EXPLAINABLE
+        and slow_query_log.needs_plan(key)
+    ):
+        slow_query_log.add_plan(key, _explain(conn, statement, parameters))
+
+
+def record_slow_queries(engine):
+    """Attach the slow-query hooks to a (sync) engine."""
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SlowQueryMiddleware:
+    """ASGI middleware remembering which route is running the statements."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _scope.reset(token)
@@ -0,0 +1,143 @@
+"""Per-table change counters kept in the reference_versions table.
+
+Every transaction that writes a tracked table bumps that table's row in
+the same transaction, so the counters are shared by all workers and never
+run ahead of (or behind) the data they describe. Listeners registered with
+on_commit learn which tables a committed transaction changed, and the
+version each of them now has; those registered with on_bump learn the same
+inside the transaction, just before it commits.
+
+The highest version of each table this process has committed is kept too.
+Versions read below it come from a replica that has not replayed that
+commit yet (see replicas.py); per-process caches must not keep what they
+load from such a session, or they would hand the writer its own stale
+read.
+"""
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+DEPARTMENTS = "departments"
+EMPLOYEES = "employees"
+
+# Mapped classes whose writes advance a version, keyed to the version name
+TRACKED_MODELS = {
+    models.Department: DEPARTMENTS,
+    models.Employee: EMPLOYEES,
+}
+
+# Execution option of statements that only maintain the departments' employee
+# counters: those counts move with every employee write, so they are covered
+# by the employees version and must not bump (and lock) the departments one
+EMPLOYEE_COUNTS_ONLY = "employee_counts_only"
+
+# Session.info keys holding the names changed within a transaction
+_CHANGED = "changed_tables"
+_COMMITTING = "committing_tables"
+
+# Highest version of each name committed by this process
+_committed: Dict[str, int] = {}
+
+_commit_listeners: List[Callable[[Session, Dict[str, int]], None]] = []
+_bump_listeners: List[Callable[[Session, Dict[str, int]], None]] = []
+
+
+def on_commit(listener: Callable[[Session, Dict[str, int]], None]):
+    """Call listener(session, {name: new version}) after each commit that
+    bumped versions."""
+    _commit_listeners.append(listener)
+    return listener
+
+
+def on_bump(listener: Callable[[Session, Dict[str, int]], None]):
+    """Call listener(session, {name: new version}) in each transaction that
+    bumped versions, before it commits.
+
+    The bumped rows stay locked until the commit, so transactions bumping
+    the same name run their listeners one at a time, in version order.
+    """
+    _bump_listeners.append(listener)
+    return listener
+
+
+def behind_local_commits(versions: Dict[str, Optional[int]]) -> bool:
+    """Whether versions read from a session predate a commit of this process."""
+    return any(
+        version is not None and version < _committed.get(name, version)
+        for name, version in versions.items()
+    )
+
+
+def forget_local_commits():
+    """Drop the committed versions, for a database recreated from scratch."""
+    _committed.clear()
+
+
+def _changed(session: Session) -> Set[str]:
+    return session.info.setdefault(_CHANGED, set())
+
+
+def _pending_names(session: Session) -> Set[str]:
+    return {
+        TRACKED_MODELS[type(instance)]
+        for instance in chain(session.new, session.dirty, session.deleted)
+        if type(instance) in TRACKED_MODELS
+    }
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _receive_do_orm_execute(orm_execute_state):
+    # Statement-level writes, such as bulk inserts and CSV merges; the
+    # employee counter adjustments (crud.department_count_updates) are skipped
+    if not (orm_execute_state.is_update or orm_execute_state.is_insert or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.execution_options.get(EMPLOYEE_COUNTS_ONLY):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in TRACKED_MODELS:
+        _changed(orm_execute_state.session).add(TRACKED_MODELS[mapper.class_])
+
+
+@event.listens_for(Session, "after_flush")
+def _receive_after_flush(session, flush_context):
+    names = _pending_names(session)
+    if names:
+        _changed(session).update(names)
+
+
+@event.listens_for(Session, "before_commit")
+def _receive_before_commit(session):
+    # Pending objects are only flushed after this hook; flush them now so
+    # the bump listeners see every row the transaction writes
+    session.flush()
+    names = session.info.pop(_CHANGED, set())
+    if names:
+        versions = session.execute(
+            update(models.ReferenceVersion)
+            .where(models.ReferenceVersion.name.in_(sorted(names)))
+            .values(version=models.ReferenceVersion.version + 1)
+            .returning(models.ReferenceVersion.name, models.ReferenceVersion.version)
+        ).all()
+        session.info[_COMMITTING] = dict(versions)
+        for listener in _bump_listeners:
+            listener(session, session.info[_COMMITTING])
+
+
+@event.listens_for(Session, "after_commit")
+def _receive_after_commit(session):
+    versions = session.info.pop(_COMMITTING, None)
+    if versions:
+        for name, version in versions.items():
+            _committed[name] = max(version, _committed.get(name, version))
+        for listener in _commit_listeners:
+            listener(session, versions)
+
+
+@event.listens_for(Session, "after_rollback")
+def _receive_after_rollback(session):
+    session.info.pop(_CHANGED, None)
+    session.info.pop(_COMMITTING, None)
@@ -0,0 +1,156 @@
+"""Field types and batch validation shared by the employee and department schemas.
+
+The constraints are native pydantic-core schemas (patterns compiled once
+per model). Failures keep the messages the API has always returned: they
+are raised as CONSTRAINT_ERROR errors whose msg is the message, and
+main.py turns the first of them into {"detail": msg}.
+"""
+from collections import defaultdict
+from functools import lru_cache
+from typing import Annotated, Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel, Field, GetCoreSchemaHandler, GetJsonSchemaHandler, TypeAdapter, ValidationError
+from pydantic.json_schema import JsonSchemaValue
+from pydantic_core import CoreSchema, ErrorDetails, core_schema
+
+NAME_PATTERN = r"^[a-zA-Z\s'-]+$"
+CITY_PATTERN = r"^[a-zA-Z\s-]+$"
+
+CONSTRAINT_ERROR = "constraint"
+
+# Shown for a bulk/import row that is not an object at all
+NOT_AN_OBJECT = "Row must be a JSON object"
+
+
+class Checks:
+    """Annotated marker running constraint checks in order, each with its own message.
+
+    Every check is a pydantic-core schema chained after the field's type
+    validation and wrapped in a custom error, so no Python code runs per
+    value. The constraints are also published in the JSON schema.
+    """
+
+    def __init__(self, *checks: Tuple[CoreSchema, str], after: Optional[CoreSchema] = None, **json_schema: Any):
+        self.checks = checks
+        self.after = after
+        self.json_schema = json_schema
+
+    def __get_pydantic_core_schema__(self, source: Any, handler: GetCoreSchemaHandler) -> CoreSchema:
+        steps = [handler(source)]
+        steps += [core_schema.custom_error_schema(check, CONSTRAINT_ERROR, custom_error_message=message) for check, message in self.checks]
+        if self.after is not None:
+            steps.append(self.after)
+        return core_schema.chain_schema(steps)
+
+    def __get_pydantic_json_schema__(self, schema: CoreSchema, handler: GetJsonSchemaHandler) -> JsonSchemaValue:
+        json_schema = handler(schema)
+        json_schema.update(self.json_schema)
+        return json_schema
+
+
+def _text(label: str, max_length: int, pattern: str, allowed: str, empty: Optional[str] = None) -> Checks:
+    checks = [(core_schema.str_schema(min_length=1), empty)] if empty else []
+    checks += [
+        (core_schema.str_schema(min_length=2), f"{label} must be at least 2 characters long"),
+        (core_schema.str_schema(max_length=max_length), f"{label} cannot exceed {max_length} characters"),
+        (core_schema.str_schema(pattern=pattern), allowed),
+    ]
+    return Checks(
+        *checks,
+        # Surrounding whitespace is stripped only after the checks pass
+        after=core_schema.str_schema(strip_whitespace=True),
+        minLength=2,
+        maxLength=max_length,
+        pattern=pattern,
+    )
+
+
+PersonName = Annotated[
+    str,
+    _text("Name", 100, NAME_PATTERN, "Name can only contain letters, spaces, hyphens, and apostrophes"),
+]
+
+CityName = Annotated[
+    str,
+    _text("City", 100, CITY_PATTERN, "City name can only contain letters, spaces, and hyphens"),
+]
+
+DepartmentName = Annotated[
+    str,
+    _text(
+        "Department name", 50, NAME_PATTERN,
+        "Department name can only contain letters, spaces, hyphens, and apostrophes",
+        empty="Department name cannot be empty",
+    ),
+]
+
+Age = Annotated[
+    int,
+    Checks((core_schema.int_schema(ge=18, le=100), "Age must be between 18 and 100"), minimum=18, maximum=100),
+]
+
+PositiveId = Annotated[int, Field(ge=1)]
+
+ExternalId = Annotated[
+    str,
+    Checks(
+        (core_schema.str_schema(strip_whitespace=True, min_length=1), "External id cannot be empty"),
+        (core_schema.str_schema(max_length=64), "External id cannot exceed 64 characters"),
+        minLength=1,
+        maxLength=64,
+    ),
+]
+
+
+def constraint_message(errors: Sequence[ErrorDetails]) -> Optional[str]:
+    """The first fixed-message failure among errors, if any."""
+    for error in errors:
+        if error["type"] == CONSTRAINT_ERROR:
+            return error["msg"]
+    return None
+
+
+def describe(errors: Sequence[ErrorDetails], overrides: Optional[Dict[Tuple[str, str], str]] = None) -> str:
+    """One line for a row's errors; overrides maps (field, error type) to a message."""
+    message = constraint_message(errors)
+    if message is not None:
+        return message
+    overrides = overrides or {}
+    parts = []
+    for error in errors:
+        loc = ".".join(str(part) for part in error["loc"])
+        if not loc and error["type"] == "model_type":
+            return NOT_AN_OBJECT
+        override = overrides.get((loc, error["type"]))
+        if override is not None:
+            return override
+        parts.append(f"{loc}: {error['msg']}")
+    return "; ".join(parts)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def validate_batch(
+    model: Type[BaseModel], rows: Sequence[Any]
+) -> Tuple[List[Tuple[int, BaseModel]], Dict[int, List[ErrorDetails]]]:
+    """Validate many rows in one pydantic-core call.
+
+    Returns the (index, instance) pairs of the valid rows and, for every
+    invalid row, its errors with locations relative to the row. Rows are
+    only validated a second time when some of them failed.
+    """
+    adapter = _list_adapter(model)
+    try:
+        return list(enumerate(adapter.validate_python(rows))), {}
+    except ValidationError as e:
+        errors: Dict[int, List[ErrorDetails]] = defaultdict(list)
+        for error in e.errors(include_url=False, include_input=False):
+            index, *loc = error["loc"]
+            errors[index].append({**error, "loc": tuple(loc)})
+
+    indexes = [index for index in range(len(rows)) if index not in errors]
+    valid = adapter.validate_python([rows[index] for index in indexes]) if indexes else []
+    return list(zip(indexes, valid)), dict(errors)
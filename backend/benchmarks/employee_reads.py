@@ -0,0 +1,95 @@
+"""Compare the ORM and the lean (plain row) employee list read paths.
+
+Each path reads the whole employees table and produces the JSON body
+GET /employees would send:
+
+    python -m benchmarks.employee_reads --rows 10000 100000 1000000
+
+The default database is a throwaway SQLite file; pass --database-url to
+run against Postgres (the employees and departments tables are emptied).
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.db import Base
+from app.export import render_json_array
+
+DEPARTMENTS = 50
+
+employee_list = TypeAdapter(List[schemas.Employee])
+
+
+def seed(engine, rows: int):
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(delete(models.Employee))
+        connection.execute(delete(models.Department))
+        connection.execute(
+            insert(models.Department),
+            [{"id": i + 1, "name": f"Department {i + 1}"} for i in range(DEPARTMENTS)],
+        )
+        batch = []
+        for i in range(rows):
+            # Every tenth employee has no department
+            department_id = None if i % 10 == 0 else i % DEPARTMENTS + 1
+            batch.append({"name": f"Employee {i}", "age": 20 + i % 45, "city": "Boston", "department_id": department_id})
+            if len(batch) == 10000:
+                connection.execute(insert(models.Employee), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(models.Employee), batch)
+
+
+def orm_path(db: Session) -> bytes:
+    # What response_model=List[schemas.Employee] does to ORM objects
+    employees = crud.get_employees(db)
+    content = employee_list.dump_python(employee_list.validate_python(employees, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def lean_path(db: Session) -> bytes:
+    return render_json_array(crud.EMPLOYEE_ROW_COLUMNS, crud.get_employee_rows(db))
+
+
+def measure(engine, path, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        with Session(engine) as db:
+            start = time.perf_counter()
+            path(db)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per path; the fastest is reported")
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.database_url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(url)
+        print(f"{'rows':>9} {'orm s':>9} {'lean s':>9} {'speedup':>8}")
+        for rows in args.rows:
+            seed(engine, rows)
+            with Session(engine) as db:
+                assert orm_path(db) == lean_path(db)
+            orm = measure(engine, orm_path, args.repeat)
+            lean = measure(engine, lean_path, args.repeat)
+            print(f"{rows:>9} {orm:>9.3f} {lean:>9.3f} {orm / lean:>7.1f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Per-row cost of encoding list responses, with and without FAST_JSON_RESPONSES.
+
+    python -m benchmarks.json_encoding --rows 10000
+
+The standard path is what FastAPI does for response_model=List[...]:
+validate every object, convert it with a JSON-mode dump, then json.dumps
+the result. The fast paths encode data already in response shape.
+"""
+import argparse
+import json
+import time
+from types import SimpleNamespace
+from typing import Callable, List
+
+from pydantic import TypeAdapter
+
+from app import responses, schemas
+from app.crud import EMPLOYEE_ROW_COLUMNS
+from app.export import render_json_array
+from app.responses import dump_models
+
+
+def response_model_path(model) -> Callable[[list], bytes]:
+    adapter = TypeAdapter(List[model])
+
+    def encode(objects: list) -> bytes:
+        content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    return encode
+
+
+def per_row_microseconds(encode: Callable[[list], bytes], objects: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(objects)
+        best = min(best, time.perf_counter() - start)
+    return best / len(objects) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per encoder; the fastest is reported")
+    args = parser.parse_args()
+
+    rows = [
+        (f"Employee {i}", 20 + i % 45, "Boston", i % 50 + 1, i + 1, f"Department {i % 50 + 1}")
+        for i in range(args.rows)
+    ]
+    # ORM stand-ins carrying the same attributes as models.Employee
+    employees = [SimpleNamespace(**dict(zip(EMPLOYEE_ROW_COLUMNS, row))) for row in rows]
+    departments = [
+        schemas.Department(id=i + 1, name=f"Department {i + 1}", description="Does things", employee_count=i)
+        for i in range(args.rows)
+    ]
+
+    def lean_rows(fast: bool):
+        def encode(objects):
+            responses.FAST_JSON_RESPONSES = fast
+            return render_json_array(EMPLOYEE_ROW_COLUMNS, objects)
+        return encode
+
+    cases = [
+        ("employees: response_model", response_model_path(schemas.Employee), employees),
+        ("employees: rows, json", lean_rows(False), rows),
+        ("employees: rows, orjson", lean_rows(True), rows),
+        ("departments: response_model", response_model_path(schemas.Department), departments),
+        ("departments: validated models", dump_models, departments),
+    ]
+    print(f"{'encoder':<32} {'us/row':>8}")
+    for name, encode, objects in cases:
+        print(f"{name:<32} {per_row_microseconds(encode, objects, args.repeat):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
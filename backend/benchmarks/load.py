@@ -0,0 +1,390 @@
+"""Drive every API endpoint concurrently and report throughput and latency.
+
+    python -m benchmarks.datagen --database-url sqlite:///bench.db --employees 100000
+    python -m benchmarks.load --database-url sqlite:///bench.db --output results.json
+    python -m benchmarks.load --database-url sqlite:///bench.db --baseline results.json
+
+By default the application runs in this process behind httpx's ASGI
+transport, which also lets the runner count SQL statements per request.
+--base-url drives a running server over HTTP instead; query counts are
+then not available. Set DB_ASYNC and the other app settings in the
+environment as for the server.
+
+Each scenario sends --requests requests from --concurrency workers, one
+scenario after the other. Write scenarios only touch employees and
+departments the run creates itself, and those are deleted at the end.
+
+Results are written as JSON. Against a --baseline, a scenario regresses
+when its p95 latency or queries per request grow, or its throughput
+drops, by more than --tolerance; the exit status is then 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+# SQL statements run on behalf of the current request, when counting
+_queries: ContextVar[Optional[List[int]]] = ContextVar("benchmark_queries", default=None)
+
+SEARCH_QUERIES = ["jo", "joan", "calel", "dorfin boston", "morelos wes", "ann"]
+
+
+class Context:
+    """Ids the scenarios work on: sampled at start-up or created by the run."""
+
+    def __init__(self, run: str):
+        self.run = run
+        # Letters only, so it passes the city and name validation
+        self.city = f"Bench {run}"
+        self.department_ids: List[int] = []
+        self.employee_ids: List[int] = []
+        self.cursor: Optional[str] = None
+        self.created_employees: List[int] = []
+        self.created_departments: List[int] = []
+
+    def pick(self, ids: List[int], i: int) -> int:
+        return ids[i % len(ids)] if ids else 1
+
+    def employee(self, i: int, **overrides) -> dict:
+        return {"name": f"Bench {_letters(i)}", "age": 20 + i % 50, "city": self.city, **overrides}
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    # Path template as declared in app.main, for the coverage check
+    route: str
+    request: Callable[[Context, int], Tuple[str, Dict[str, Any]]]
+    collect: Optional[Callable[[Context, httpx.Response], None]] = None
+
+
+def _letters(i: int) -> str:
+    # Base-26 in letters: 0 -> "a", 27 -> "bb"
+    letters = ""
+    while True:
+        i, remainder = divmod(i, 26)
+        letters = string.ascii_lowercase[remainder] + letters
+        if not i:
+            return letters.capitalize()
+        i -= 1
+
+
+def _csv(lines: List[str]) -> Dict[str, Any]:
+    return {"content": "\n".join(lines) + "\n", "headers": {"Content-Type": "text/csv"}}
+
+
+def _collect_employee(context: Context, response: httpx.Response):
+    if response.status_code == 201:
+        context.created_employees.append(response.json()["id"])
+
+
+def _collect_employees(context: Context, response: httpx.Response):
+    if response.status_code == 201:
+        context.created_employees.extend(i for i in response.json()["ids"] if i is not None)
+
+
+def _collect_department(context: Context, response: httpx.Response):
+    if response.status_code == 201:
+        context.created_departments.append(response.json()["id"])
+
+
+def _sync_rows(c: Context, i: int) -> List[dict]:
+    # Odd requests resend the previous batch, which the sync skips as unchanged
+    batch = i - i % 2
+    return [{**c.employee(k), "external_id": f"bench-{c.run}-{batch}-{k}"} for k in range(100)]
+
+
+SCENARIOS = [
+    # Reads over the seeded data
+    Scenario("list_employees", "GET", "/employees", lambda c, i: ("/employees", {"params": {"limit": 100}})),
+    Scenario("list_employees_next_page", "GET", "/employees", lambda c, i: (
+        "/employees", {"params": {"limit": 100, "cursor": c.cursor, "include_total": "false"} if c.cursor else {"limit": 100}},
+    )),
+    Scenario("list_employees_sorted", "GET", "/employees", lambda c, i: (
+        "/employees", {"params": {"limit": 100, "sort": "-age", "include_total": "false"}},
+    )),
+    Scenario("list_employees_filtered", "GET", "/employees", lambda c, i: (
+        "/employees", {"params": {"limit": 100, "department_id": c.pick(c.department_ids, i), "city": "Boston"}},
+    )),
+    Scenario("export_employees", "GET", "/employees/export", lambda c, i: (
+        "/employees/export", {"params": {"department_id": c.pick(c.department_ids, i), "max_age": 25}},
+    )),
+    Scenario("search_employees", "GET", "/employees/search", lambda c, i: (
+        "/employees/search", {"params": {"q": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}},
+    )),
+    Scenario("employee_changes", "GET", "/employees/changes", lambda c, i: ("/employees/changes", {"params": {"limit": 100}})),
+    Scenario("read_employee", "GET", "/employees/{employee_id}", lambda c, i: (
+        f"/employees/{c.pick(c.employee_ids, i)}", {},
+    )),
+    Scenario("list_departments", "GET", "/departments", lambda c, i: ("/departments", {})),
+    Scenario("read_department", "GET", "/departments/{department_id}", lambda c, i: (
+        f"/departments/{c.pick(c.department_ids, i)}", {},
+    )),
+    Scenario("analytics_summary", "GET", "/analytics/summary", lambda c, i: ("/analytics/summary", {})),
+    Scenario("analytics_headcount", "GET", "/analytics/headcount", lambda c, i: ("/analytics/headcount", {})),
+    Scenario("analytics_age_distribution", "GET", "/analytics/age-distribution", lambda c, i: ("/analytics/age-distribution", {})),
+    Scenario("analytics_cities", "GET", "/analytics/cities", lambda c, i: ("/analytics/cities", {})),
+    Scenario("admin_pool", "GET", "/admin/pool", lambda c, i: ("/admin/pool", {})),
+    # Writes, on rows created by this run
+    Scenario("create_employee", "POST", "/employees", lambda c, i: ("/employees", {"json": c.employee(i)}), _collect_employee),
+    Scenario("create_employees_bulk", "POST", "/employees/bulk", lambda c, i: (
+        "/employees/bulk", {"json": [c.employee(i * 100 + k) for k in range(100)]},
+    ), _collect_employees),
+    Scenario("import_employees_csv", "POST", "/employees/import", lambda c, i: (
+        "/employees/import", _csv(["name,age,city"] + [f"Bench {_letters(k)},{20 + k % 50},{c.city}" for k in range(100)]),
+    )),
+    Scenario("sync_employees", "PUT", "/employees/sync", lambda c, i: ("/employees/sync", {"json": _sync_rows(c, i)})),
+    Scenario("update_employee", "PUT", "/employees/{employee_id}", lambda c, i: (
+        f"/employees/{c.pick(c.created_employees, i)}", {"json": {"age": 20 + i % 50}},
+    )),
+    Scenario("assign_department", "PATCH", "/employees/{employee_id}", lambda c, i: (
+        f"/employees/{c.pick(c.created_employees, i)}", {"json": {"department_id": c.pick(c.department_ids, i)}},
+    )),
+    Scenario("bulk_update_employees", "POST", "/employees/bulk-update", lambda c, i: (
+        "/employees/bulk-update", {"json": {"where": {"city": c.city, "min_age": 60}, "set": {"age": 61}}},
+    )),
+    Scenario("bulk_delete_employees_dry_run", "POST", "/employees/bulk-delete", lambda c, i: (
+        "/employees/bulk-delete", {"json": {"city": c.city}, "params": {"dry_run": "true"}},
+    )),
+    Scenario("create_department", "POST", "/departments", lambda c, i: (
+        "/departments", {"json": {"name": f"Bench {c.run} {_letters(i)}"}},
+    ), _collect_department),
+    Scenario("import_departments_csv", "POST", "/departments/import", lambda c, i: (
+        "/departments/import", _csv(["name"] + [f"Bench {c.run} Import {_letters(i * 10 + k)}" for k in range(10)]),
+    )),
+    Scenario("update_department", "PUT", "/departments/{department_id}", lambda c, i: (
+        f"/departments/{c.pick(c.created_departments, i)}", {"json": {"name": f"Bench {c.run} {_letters(i)}", "description": "Renamed"}},
+    )),
+    Scenario("reassign_department", "POST", "/departments/{department_id}/reassign", lambda c, i: (
+        f"/departments/{c.pick(c.created_departments, i)}/reassign",
+        {"json": {"target_department_id": c.pick(c.created_departments, i + 1)}},
+    )),
+    Scenario("delete_employee", "DELETE", "/employees/{employee_id}", lambda c, i: (
+        f"/employees/{c.pick(c.created_employees, i)}", {},
+    )),
+    Scenario("delete_department", "DELETE", "/departments/{department_id}", lambda c, i: (
+        f"/departments/{c.pick(c.created_departments, i)}", {},
+    )),
+]
+
+
+async def prepare(client: httpx.AsyncClient, context: Context):
+    context.department_ids = [d["id"] for d in (await client.get("/departments")).json()]
+    response = await client.get("/employees", params={"limit": 1000, "include_total": "false"})
+    context.employee_ids = [e["id"] for e in response.json()]
+    context.cursor = response.headers.get("X-Next-Cursor")
+    random.Random(1).shuffle(context.employee_ids)
+
+
+async def clean_up(client: httpx.AsyncClient, context: Context):
+    await client.post("/employees/bulk-delete", json={"city": context.city})
+    prefix = f"Bench {context.run} "
+    for department in (await client.get("/departments")).json():
+        if department["name"].startswith(prefix):
+            await client.delete(f"/departments/{department['id']}")
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(fraction * len(ordered) + 0.999999) - 1))]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, context: Context, requests: int, concurrency: int, count_queries: bool
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    queries: List[int] = []
+    statuses: Counter = Counter()
+    indexes = iter(range(requests))
+
+    async def worker():
+        for i in indexes:
+            url, kwargs = scenario.request(context, i)
+            counter = [0]
+            token = _queries.set(counter if count_queries else None)
+            start = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, url, **kwargs)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            finally:
+                _queries.reset(token)
+            latencies.append(time.perf_counter() - start)
+            queries.append(counter[0])
+            statuses[str(response.status_code)] += 1
+            if scenario.collect:
+                scenario.collect(context, response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    return {
+        "requests": requests,
+        "errors": errors,
+        "statuses": dict(statuses),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if count_queries and queries else None,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """One line per regression of results against baseline."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if base["throughput"] and current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+        base_queries, current_queries = base.get("queries_per_request"), current.get("queries_per_request")
+        # Counts barely vary between runs, so small increases count too
+        if base_queries is not None and current_queries is not None and current_queries > base_queries * (1 + tolerance) + 0.1:
+            regressions.append(f"{name}: queries/request {base_queries} -> {current_queries}")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {current['errors']}")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _count_statements(engines):
+    from sqlalchemy import event
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter = _queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+
+
+async def run(args) -> Dict[str, Any]:
+    scenarios = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    context = Context("".join(random.choice(string.ascii_lowercase) for _ in range(6)).capitalize())
+    meta = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "db_async": os.getenv("DB_ASYNC", "false"),
+    }
+
+    if args.base_url:
+        meta.update(mode="http", target=args.base_url)
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+            results = await _run_all(client, scenarios, context, args, count_queries=False)
+        return {"meta": meta, "scenarios": results}
+
+    # The app reads its database settings at import time
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from fastapi.routing import APIRoute
+    from sqlalchemy.engine import make_url
+
+    from app import db
+    from app.main import app
+
+    meta.update(mode="asgi", target=make_url(db.DATABASE_URL).render_as_string(hide_password=True))
+    engines = [db.engine, *(replica.engine for replica in db.replicas.replicas)]
+    if db.async_engine is not None:
+        engines += [db.async_engine.sync_engine, *(replica.async_engine.sync_engine for replica in db.replicas.replicas)]
+    _count_statements(engines)
+
+    covered = {(s.method, s.route) for s in SCENARIOS}
+    missing = sorted(
+        f"{method} {route.path}"
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods if (method, route.path) not in covered
+    )
+    if missing:
+        print(f"not exercised: {', '.join(missing)}", file=sys.stderr)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=args.timeout) as client:
+            results = await _run_all(client, scenarios, context, args, count_queries=True)
+    return {"meta": meta, "scenarios": results}
+
+
+async def _run_all(client, scenarios: List[Scenario], context: Context, args, count_queries: bool) -> Dict[str, Any]:
+    await prepare(client, context)
+    results = {}
+    print(f"{'scenario':<30} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    try:
+        for scenario in scenarios:
+            result = await run_scenario(client, scenario, context, args.requests, args.concurrency, count_queries)
+            results[scenario.name] = result
+            queries = result["queries_per_request"]
+            print(
+                f"{scenario.name:<30} {result['throughput']:>8.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}"
+                f" {result['p99_ms']:>8.2f} {'-' if queries is None else queries:>8} {result['errors']:>7}"
+            )
+    finally:
+        await clean_up(client, context)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="database of the in-process app (default: the app's own settings)")
+    parser.add_argument("--base-url", help="drive a running server over HTTP instead")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--scenario", action="append", help="run only this scenario (repeatable)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
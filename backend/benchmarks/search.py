@@ -0,0 +1,52 @@
+"""Build and lookup times of the employee search index.
+
+    python -m benchmarks.search --employees 1000000
+
+Names are drawn from generated first and last names, so the vocabulary
+grows with the data as it would with real names.
+"""
+import argparse
+import statistics
+import time
+
+from app.search_index import EmployeeSearchIndex
+from benchmarks.datagen import employee_rows
+
+QUERIES = ["jo", "joan", "ber sa", "calel", "dorfin boston", "x", "morelos wes", "an"]
+
+
+def generate(count: int, seed: int = 1):
+    rows = employee_rows(count, list(range(1, 51)), seed)
+    for employee_id, (name, _, city, department_id) in enumerate(rows, 1):
+        yield employee_id, name, city, department_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    index = EmployeeSearchIndex()
+    start = time.perf_counter()
+    index.load(generate(args.employees), version=0)
+    print(f"built {len(index)} employees in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'query':<16} {'matches':>8} {'uncached ms':>12} {'cached ms':>10}")
+    for query in QUERIES:
+        uncached, cached = [], []
+        for _ in range(args.repeat):
+            # Results are cached until the index changes; time both cases
+            index._results.clear()
+            for timings in (uncached, cached):
+                start = time.perf_counter()
+                result = index.search(query)
+                timings.append(time.perf_counter() - start)
+        print(
+            f"{query!r:<16} {result.total:>8} {statistics.median(uncached) * 1000:>12.3f}"
+            f" {statistics.median(cached) * 1000:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
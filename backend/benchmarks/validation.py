@@ -0,0 +1,45 @@
+"""Cost of validating employee payloads, one at a time and in batches.
+
+    python -m benchmarks.validation --rows 10000
+"""
+import argparse
+import time
+from typing import Callable
+
+from app import schemas
+
+
+def per_row_microseconds(run: Callable[[], object], rows: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best / rows * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case; the fastest is reported")
+    args = parser.parse_args()
+
+    valid = [
+        {"name": f"Employee {chr(65 + i % 26)}", "age": 20 + i % 45, "city": "Boston", "department_id": i % 50 + 1}
+        for i in range(args.rows)
+    ]
+    # Every tenth row fails a constraint
+    mixed = [dict(row, age=12) if i % 10 == 0 else row for i, row in enumerate(valid)]
+
+    cases = [
+        ("single row, EmployeeCreate(**row)", lambda: [schemas.EmployeeCreate(**row) for row in valid]),
+        ("batch, all valid", lambda: schemas.validate_employee_rows(valid)),
+        ("batch, 10% invalid", lambda: schemas.validate_employee_rows(mixed)),
+    ]
+    print(f"{'case':<36} {'us/row':>8}")
+    for name, run in cases:
+        print(f"{name:<36} {per_row_microseconds(run, args.rows, args.repeat):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,27 @@
+import asyncio
 import pytest
 import os
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+# The app's own database is not reachable from the tests
+os.environ.setdefault("REFERENCE_CACHE_WARMUP", "false")
+os.environ.setdefault("SEARCH_INDEX_WARMUP", "false")
+
 from app.main import app
-from app.db import Base, SessionLocal
+from app.db import DB_ASYNC, Base, SessionLocal
 from app.models import *
+from app.analytics import analytics_cache
+from app.reference_cache import department_cache
+from app.search_index import search_index
+from app.table_versions import forget_local_commits
 
 # Use in-memory SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Used instead when the suite runs with DB_ASYNC=true
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -19,9 +30,41 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=StaticPool)
+    TestingAsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+    def run_on_async_engine(fn):
+        async def run():
+            async with async_engine.begin() as conn:
+                await conn.run_sync(fn)
+        asyncio.run(run())
+
+
+@pytest.fixture(scope="session", autouse=True)
+def dispose_async_engine():
+    yield
+    # aiosqlite keeps a non-daemon worker thread per connection
+    if DB_ASYNC:
+        asyncio.run(async_engine.dispose())
+
 
 @pytest.fixture(scope="function")
 def db_session():
+    if DB_ASYNC:
+        run_on_async_engine(Base.metadata.create_all)
+        session = TestingAsyncSessionLocal()
+        try:
+            yield session
+        finally:
+            asyncio.run(session.close())
+            run_on_async_engine(Base.metadata.drop_all)
+        return
+
     Base.metadata.create_all(bind=engine)
     session = TestingSessionLocal()
     try:
@@ -38,10 +81,22 @@ def client(db_session):
             yield db_session
         finally:
             db_session.close()
+
+    async def override_get_async_db():
+        try:
+            yield db_session
+        finally:
+            await db_session.close()
     
+    # Every test starts from an empty database, so nothing cached survives
+    department_cache.clear()
+    analytics_cache.clear()
+    search_index.invalidate()
+    forget_local_commits()
+
     # Import get_db from main where it's defined
     from app.main import get_db
-    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_db] = override_get_async_db if DB_ASYNC else override_get_db
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -54,3 +109,15 @@ def sample_employee():
         "age": 30,
         "city": "New York"
     }
+
+
+@pytest.fixture
+def sql_statements(db_session):
+    """Records the SQL statements the test database executes, in order."""
+    bind = db_session.bind
+    target = getattr(bind, "sync_engine", bind)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(target, "before_cursor_execute", listener)
+    yield statements
+    event.remove(target, "before_cursor_execute", listener)
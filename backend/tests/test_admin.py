@@ -0,0 +1,11 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+def test_pool_stats(client: TestClient):
+    response = client.get("/admin/pool")
+    assert response.status_code == 200
+    primary = response.json()["primary"]
+    assert primary["pool_class"] == "InstrumentedQueuePool"
+    assert primary["checkedout"] == 0
+    assert set(primary["checkout_latency"]) >= {"count", "sum_seconds", "buckets"}
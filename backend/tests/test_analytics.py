@@ -0,0 +1,70 @@
+from fastapi.testclient import TestClient
+
+from app.analytics import HEADCOUNT, AnalyticsCache
+from tests.test_department import run_sync
+
+
+def seed(client: TestClient):
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    support = client.post("/departments", json={"name": "Support"}).json()["id"]
+    client.post("/departments", json={"name": "Legal"})
+    for name, age, city, department_id in [
+        ("Ann", 24, "Boston", sales),
+        ("Bob", 30, "Boston", sales),
+        ("Cid", 41, "Denver", support),
+        ("Dee", 67, "Austin", None),
+    ]:
+        client.post("/employees", json={"name": name, "age": age, "city": city, "department_id": department_id})
+    return sales, support
+
+
+def test_analytics_reports(client: TestClient):
+    sales, support = seed(client)
+
+    summary = client.get("/analytics/summary").json()
+    assert {k: summary[k] for k in ("employees", "average_age", "min_age", "max_age", "departments", "cities", "unassigned")} == {
+        "employees": 4, "average_age": 40.5, "min_age": 24, "max_age": 67, "departments": 3, "cities": 3, "unassigned": 1,
+    }
+    assert summary["age_seconds"] >= 0 and summary["generated_at"]
+
+    headcount = client.get("/analytics/headcount").json()["departments"]
+    assert [(d["department_id"], d["department_name"], d["headcount"], d["share"]) for d in headcount] == [
+        (sales, "Sales", 2, 0.5),
+        (support, "Support", 1, 0.25),
+        (None, None, 1, 0.25),
+        (headcount[3]["department_id"], "Legal", 0, 0.0),
+    ]
+    assert headcount[0]["average_age"] == 27.0
+
+    buckets = client.get("/analytics/age-distribution").json()["buckets"]
+    assert [(b["label"], b["count"]) for b in buckets] == [
+        ("18-24", 1), ("25-34", 1), ("35-44", 1), ("45-54", 0), ("55-64", 0), ("65+", 1),
+    ]
+    assert buckets[-1]["max_age"] is None
+
+    cities = client.get("/analytics/cities").json()["cities"]
+    assert [(c["city"], c["count"], c["share"]) for c in cities] == [
+        ("Boston", 2, 0.5), ("Austin", 1, 0.25), ("Denver", 1, 0.25),
+    ]
+
+
+def test_analytics_snapshot_follows_writes(client: TestClient, db_session, sample_employee):
+    seed(client)
+    first = client.get("/analytics/summary").json()
+    # Served from the snapshot while nothing is written
+    assert client.get("/analytics/summary").json()["generated_at"] == first["generated_at"]
+
+    client.post("/employees", json=sample_employee)
+    assert client.get("/analytics/summary").json()["employees"] == 5
+
+    # Another worker's snapshot: kept while the versions match, recomputed after
+    cache = AnalyticsCache(ttl=0)
+    snapshot = run_sync(db_session, lambda db: cache.get(db, HEADCOUNT))
+    assert run_sync(db_session, lambda db: cache.get(db, HEADCOUNT)).data is snapshot.data
+    client.post("/employees", json=sample_employee)
+    assert run_sync(db_session, lambda db: cache.get(db, HEADCOUNT)).data is not snapshot.data
+
+    # Snapshots past their maximum age are recomputed even without writes
+    stale = AnalyticsCache(ttl=0, max_age=0)
+    snapshot = run_sync(db_session, lambda db: stale.get(db, HEADCOUNT))
+    assert run_sync(db_session, lambda db: stale.get(db, HEADCOUNT)).data is not snapshot.data
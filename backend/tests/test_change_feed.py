@@ -0,0 +1,151 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import change_feed, crud, models, schemas, search_index, table_versions
+from tests.test_department import run_sync
+
+
+def read_all(client: TestClient, since=None, limit=100):
+    """Every change after since, following the cursor; returns (changes, cursor)."""
+    changes = []
+    while True:
+        page = client.get("/employees/changes", params={"since": since, "limit": limit}).json()
+        changes.extend(page["changes"])
+        since = page["next_cursor"]
+        if not page["has_more"]:
+            return changes, since
+
+
+def summary(changes):
+    return [(change["id"], change["deleted"], change["employee"] and change["employee"]["name"]) for change in changes]
+
+
+def test_changes_follow_commit_order(client: TestClient):
+    _, start = read_all(client)
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    ann, bob, cid = (
+        client.post("/employees", json={"name": name, "age": 30, "city": "Boston", "department_id": sales}).json()["id"]
+        for name in ("Ann Lee", "Bob Ray", "Cid Moe")
+    )
+    client.put(f"/employees/{ann}", json={"city": "Denver"})
+    client.delete(f"/employees/{bob}")
+
+    changes, cursor = read_all(client, since=start)
+    # One entry per employee, at its latest write; the deletion last
+    assert summary(changes) == [(cid, False, "Cid Moe"), (ann, False, "Ann Lee"), (bob, True, None)]
+    revisions = [change["revision"] for change in changes]
+    assert revisions == sorted(set(revisions))
+    assert changes[1]["employee"] == {
+        "id": ann, "name": "Ann Lee", "age": 30, "city": "Denver", "department_id": sales, "department_name": "Sales",
+    }
+    assert changes[2]["employee"] is None and changes[2]["changed_at"]
+
+    # Page by page gives the same changes
+    assert read_all(client, since=start, limit=1) == (changes, cursor)
+    # A new client gets the live employees, without earlier deletions
+    assert summary(read_all(client)[0]) == summary(changes[:2])
+
+    # A caught-up cursor only sees later writes, and is kept while nothing happens
+    assert client.get("/employees/changes", params={"since": cursor}).json() == {
+        "changes": [], "next_cursor": cursor, "has_more": False,
+    }
+    dee = client.post("/employees", json={"name": "Dee Orr", "age": 41, "city": "Austin"}).json()["id"]
+    client.put(f"/employees/{cid}", json={"age": 31})
+    later, _ = read_all(client, since=cursor)
+    assert summary(later) == [(dee, False, "Dee Orr"), (cid, False, "Cid Moe")]
+    assert later[0]["revision"] > revisions[-1]
+
+
+def test_one_transaction_is_one_revision(client: TestClient):
+    _, start = read_all(client)
+    rows = [{"name": f"Emp {letter}", "age": 30, "city": "Boston"} for letter in "ABCDE"]
+    ids = client.post("/employees/bulk", json=rows).json()["ids"]
+    client.post("/employees/bulk-delete", json={"ids": ids[:2]})
+
+    changes, cursor = read_all(client, since=start, limit=2)
+    assert summary(changes) == [(i, False, f"Emp {letter}") for i, letter in zip(ids[2:], "CDE")] + [
+        (ids[0], True, None), (ids[1], True, None),
+    ]
+    # The surviving rows were written together, the tombstones together
+    assert len({change["revision"] for change in changes[:3]}) == 1
+    assert len({change["revision"] for change in changes[3:]}) == 1
+    assert read_all(client, since=cursor) == ([], cursor)
+
+
+def test_department_rename_changes_its_employees(client: TestClient):
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    ann = client.post("/employees", json={"name": "Ann Lee", "age": 30, "city": "Boston", "department_id": sales}).json()["id"]
+    client.post("/employees", json={"name": "Bob Ray", "age": 40, "city": "Denver"})
+    _, cursor = read_all(client)
+
+    # Same name: nothing changed for the feed
+    client.put(f"/departments/{sales}", json={"name": "Sales", "description": "Sells things"})
+    assert read_all(client, since=cursor)[0] == []
+
+    client.put(f"/departments/{sales}", json={"name": "Field Sales"})
+    changes, _ = read_all(client, since=cursor)
+    assert [(change["id"], change["employee"]["department_name"]) for change in changes] == [(ann, "Field Sales")]
+
+
+def test_synced_employees_appear_in_changes(client: TestClient):
+    upstream = [{"external_id": "hr-1", "name": "Ann Lee", "age": 30, "city": "Boston"}]
+    client.put("/employees/sync", json=upstream)
+    changes, cursor = read_all(client)
+    assert summary(changes) == [(changes[0]["id"], False, "Ann Lee")]
+
+    client.put("/employees/sync", json=upstream)
+    assert read_all(client, since=cursor)[0] == []
+    client.put("/employees/sync", json=[{**upstream[0], "city": "Salem"}])
+    changes, _ = read_all(client, since=cursor)
+    assert [change["employee"]["city"] for change in changes] == ["Salem"]
+
+
+def test_invalid_change_cursor(client: TestClient):
+    assert client.get("/employees/changes", params={"since": "not-a-cursor"}).status_code == 400
+    client.post("/employees/bulk", json=[{"name": f"Emp {letter}", "age": 30, "city": "Boston"} for letter in "AB"])
+    list_cursor = client.get("/employees", params={"limit": 1}).headers["X-Next-Cursor"]
+    assert client.get("/employees/changes", params={"since": list_cursor}).status_code == 400
+
+
+def test_counter_updates_do_not_change_departments(client: TestClient, db_session, sample_employee):
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    revision = department_revision(db_session, sales)
+    client.post("/employees", json={**sample_employee, "department_id": sales})
+    assert department_revision(db_session, sales) == revision
+
+
+def department_revision(db_session, department_id):
+    return run_sync(db_session, lambda db: db.execute(
+        select(models.Department.revision).where(models.Department.id == department_id)
+    ).scalar())
+
+
+def test_old_tombstones_are_pruned(client: TestClient, monkeypatch):
+    monkeypatch.setattr(change_feed, "CHANGE_FEED_RETENTION_SECONDS", 0)
+    monkeypatch.setattr(change_feed, "CHANGE_FEED_PRUNE_INTERVAL", 0)
+    _, start = read_all(client)
+    ids = client.post("/employees/bulk", json=[{"name": f"Emp {letter}", "age": 30, "city": "Boston"} for letter in "ABC"]).json()["ids"]
+    _, cursor = read_all(client, since=start)
+
+    client.delete(f"/employees/{ids[0]}")
+    # The next deletion prunes the first tombstone
+    client.delete(f"/employees/{ids[1]}")
+    assert client.get("/employees/changes", params={"since": start}).status_code == 410
+    response = client.get("/employees/changes", params={"since": cursor})
+    assert response.status_code == 410
+    assert summary(read_all(client)[0]) == [(ids[2], False, "Emp C")]
+
+
+def test_tombstones_are_written_once(client: TestClient, db_session, sample_employee, monkeypatch):
+    # Without the search index's hooks, only the change feed clears the writes
+    for name in ("_bump_listeners", "_commit_listeners"):
+        listeners = getattr(table_versions, name)
+        monkeypatch.setattr(table_versions, name, [l for l in listeners if l.__module__ != search_index.__name__])
+    ids = client.post("/employees/bulk", json=[sample_employee, {**sample_employee, "name": "Jane Roe"}]).json()["ids"]
+
+    def write(db):
+        crud.delete_employee(db, ids[0])
+        crud.create_employee(db, schemas.EmployeeCreate(**sample_employee))
+        return db.execute(select(models.EmployeeTombstone.employee_id)).scalars().all()
+
+    assert run_sync(db_session, write) == [ids[0]]
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.db import DB_ASYNC
+from app.reference_cache import DepartmentCache
+
+
+def test_import_departments_csv(client: TestClient):
+    client.post("/departments", json={"name": "Sales"})
+    body = (
+        "name,description\n"
+        "Sales,Already there\n"
+        "Engineering,Builds things\n"
+        "X,Too short\n"
+        "Engineering,Duplicate\n"
+        "Finance,\n"
+    )
+    response = client.post("/departments/import", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 2
+    assert [e["index"] for e in data["errors"]] == [2, 3]
+
+    departments = client.get("/departments").json()
+    assert [(d["name"], d["description"]) for d in departments] == [
+        ("Sales", None),
+        ("Engineering", "Builds things"),
+        ("Finance", None),
+    ]
+
+
+def test_delete_department_unassigns_employees(client: TestClient):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    employee = client.post(
+        "/employees", json={"name": "John Doe", "age": 30, "city": "Boston", "department_id": department_id}
+    ).json()
+
+    response = client.delete(f"/departments/{department_id}")
+    assert response.status_code == 200
+    assert client.get(f"/departments/{department_id}").status_code == 404
+    assert client.get(f"/employees/{employee['id']}").json()["department_id"] is None
+
+
+@pytest.mark.parametrize("use_counter", [False, True])
+def test_department_employee_count(client: TestClient, monkeypatch, use_counter):
+    from app import crud
+    monkeypatch.setattr(crud, "USE_DEPARTMENT_COUNTER", use_counter)
+
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    support = client.post("/departments", json={"name": "Support"}).json()["id"]
+    ids = [
+        client.post("/employees", json={"name": name, "age": 30, "city": "Boston", "department_id": sales}).json()["id"]
+        for name in ("Abe Lee", "Bea Ray", "Cal Fox")
+    ]
+    client.post(
+        "/employees/bulk",
+        json=[{"name": "Dee Poe", "age": 30, "city": "Boston", "department_id": support}],
+    )
+    client.post(
+        "/employees/import",
+        content=f"name,age,city,department_id\nEve Ash,30,Boston,{support}\n",
+        headers={"Content-Type": "text/csv"},
+    )
+    client.patch(f"/employees/{ids[0]}", json={"department_id": support})
+    client.delete(f"/employees/{ids[1]}")
+
+    counts = {d["id"]: d["employee_count"] for d in client.get("/departments").json()}
+    assert counts == {sales: 1, support: 3}
+    assert client.get(f"/departments/{support}").json()["employee_count"] == 3
+    assert client.get(f"/employees/{ids[0]}").json()["department_name"] == "Support"
+
+
+def run_sync(db_session, fn):
+    """Call fn with a sync Session, whichever mode the suite runs in."""
+    if DB_ASYNC:
+        return asyncio.run(db_session.run_sync(fn))
+    return fn(db_session)
+
+
+def test_department_reads_served_from_cache(client: TestClient, db_session):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    assert [d["name"] for d in client.get("/departments").json()] == ["Sales"]
+
+    bind = db_session.bind
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(getattr(bind, "sync_engine", bind), "before_cursor_execute", listener)
+    try:
+        assert [d["name"] for d in client.get("/departments").json()] == ["Sales"]
+        assert client.get(f"/departments/{department_id}").json()["name"] == "Sales"
+    finally:
+        event.remove(getattr(bind, "sync_engine", bind), "before_cursor_execute", listener)
+    assert statements == []
+
+    # A write invalidates the snapshot immediately in this process
+    client.put(f"/departments/{department_id}", json={"name": "Field Sales"})
+    assert [d["name"] for d in client.get("/departments").json()] == ["Field Sales"]
+
+
+def test_department_cache_follows_version(client: TestClient, db_session):
+    # Stands in for another worker's cache, refreshed on every read
+    cache = DepartmentCache(ttl=0)
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    first = run_sync(db_session, cache.get)
+
+    # Unchanged version: the departments are reused without reloading
+    assert run_sync(db_session, cache.get).departments is first.departments
+
+    client.put(f"/departments/{department_id}", json={"name": "Field Sales"})
+    second = run_sync(db_session, cache.get)
+    assert second.version == first.version + 1
+    assert second.names == {department_id: "Field Sales"}
+
+
+def test_employee_writes_only_refresh_counts(client: TestClient, db_session, sample_employee):
+    cache = DepartmentCache(ttl=0)
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    first = run_sync(db_session, cache.get)
+
+    # Counter adjustments are covered by the employees version
+    client.post("/employees", json={**sample_employee, "department_id": department_id})
+    second = run_sync(db_session, cache.get)
+    assert second.version == first.version
+    assert second.counts_version == first.counts_version + 1
+    assert second.by_id[department_id].employee_count == 1
+
+    # Readers of names only keep the snapshot through employee writes
+    client.post("/employees", json={**sample_employee, "department_id": department_id})
+    assert run_sync(db_session, lambda db: cache.get(db, counts=False)).departments is second.departments
+    assert run_sync(db_session, cache.get).by_id[department_id].employee_count == 2
+
+
+def test_departments_etag(client: TestClient, sample_employee):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    etag = client.get("/departments").headers["ETag"]
+    assert client.get("/departments", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/departments/{department_id}", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    # Assigning an employee changes the department's employee_count
+    client.post("/employees", json={**sample_employee, "department_id": department_id})
+    response = client.get("/departments", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["employee_count"] == 1
+
+
+def test_department_writes_are_single_statements(client: TestClient, sample_employee, sql_statements):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    client.post("/employees", json={**sample_employee, "department_id": department_id})
+
+    sql_statements.clear()
+    response = client.put(f"/departments/{department_id}", json={"name": "Field Sales", "description": "Out there"})
+    assert response.json() == {"id": department_id, "name": "Field Sales", "description": "Out there", "employee_count": 1}
+    # The renamed department's employees are marked for the change feed,
+    # then one UPDATE ... RETURNING; the commit bumps both versions and
+    # stamps the written rows
+    assert [statement.split()[:2] for statement in sql_statements[:2]] == [["UPDATE", "employees"], ["UPDATE", "departments"]]
+    assert len(sql_statements) == 5
+
+    sql_statements.clear()
+    assert client.put("/departments/999", json={"name": "Nobody"}).status_code == 404
+    assert len(sql_statements) == 2
+
+    # Deleting detaches the employees, then removes the department
+    sql_statements.clear()
+    assert client.delete(f"/departments/{department_id}").status_code == 200
+    assert [statement.split()[:2] for statement in sql_statements[:2]] == [["UPDATE", "employees"], ["DELETE", "FROM"]]
+    assert len(sql_statements) == 5
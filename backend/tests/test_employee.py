@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -135,6 +137,232 @@ def test_update_employee_invalid_data(client: TestClient, sample_employee):
     assert response.json()["detail"][0]["msg"] == "String should have at least 1 character"
 
 
+def test_get_employees_keyset_pagination(client: TestClient):
+    for name, age in [("Cara", 40), ("Abe", 30), ("Bea", 30), ("Dan", 25), ("Eve", 50)]:
+        assert client.post("/employees", json={"name": name, "age": age, "city": "Boston"}).status_code == 201
+
+    response = client.get("/employees", params={"limit": 2, "sort": "age"})
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "5"
+    seen = [e["name"] for e in response.json()]
+    while "X-Next-Cursor" in response.headers:
+        response = client.get(
+            "/employees",
+            params={"limit": 2, "sort": "age", "cursor": response.headers["X-Next-Cursor"]},
+        )
+        assert response.status_code == 200
+        seen += [e["name"] for e in response.json()]
+    assert seen == ["Dan", "Abe", "Bea", "Cara", "Eve"]
+
+
+def test_get_employees_sort_desc_and_filters(client: TestClient):
+    for name, age, city in [("Abe", 30, "Boston"), ("Bea", 45, "Boston"), ("Cal", 50, "Denver")]:
+        client.post("/employees", json={"name": name, "age": age, "city": city})
+
+    response = client.get("/employees", params={"sort": "-name", "include_total": "false"})
+    assert [e["name"] for e in response.json()] == ["Cal", "Bea", "Abe"]
+    assert "X-Total-Count" not in response.headers
+
+    response = client.get("/employees", params={"city": "Boston", "min_age": 40})
+    assert [e["name"] for e in response.json()] == ["Bea"]
+    assert response.headers["X-Total-Count"] == "1"
+
+
+def test_get_employees_lean_matches_orm(client: TestClient, monkeypatch):
+    from app import main
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    client.post("/employees", json={"name": "Zoe Avila", "age": 30, "city": "Boston", "department_id": department_id})
+    client.post("/employees", json={"name": "Abe Lee", "age": 31, "city": "Denver"})
+    params = {"limit": 1, "sort": "-name"}
+
+    responses = {}
+    for lean in (False, True):
+        monkeypatch.setattr(main, "LEAN_EMPLOYEE_READS", lean)
+        response = client.get("/employees", params=params)
+        assert response.status_code == 200
+        responses[lean] = response
+    assert responses[True].content == responses[False].content
+    assert responses[True].headers["X-Next-Cursor"] == responses[False].headers["X-Next-Cursor"]
+    assert responses[True].headers["X-Total-Count"] == "2"
+    assert responses[True].json()[0]["department_name"] == "Sales"
+
+
+def test_get_employees_invalid_cursor(client: TestClient):
+    response = client.get("/employees", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+    client.post("/employees", json={"name": "Abe", "age": 30, "city": "Boston"})
+    client.post("/employees", json={"name": "Bea", "age": 31, "city": "Boston"})
+    cursor = client.get("/employees", params={"limit": 1}).headers["X-Next-Cursor"]
+    response = client.get("/employees", params={"cursor": cursor, "sort": "name"})
+    assert response.status_code == 400
+
+    # A cursor whose value does not have the sort column's type
+    from app.pagination import encode_cursor
+    for sort, value in (("age", "thirty"), ("name", 5), ("-city", None), ("id", True)):
+        response = client.get("/employees", params={"cursor": encode_cursor(sort, value, 1), "sort": sort})
+        assert response.status_code == 400
+
+
+def test_get_employees_limit_bounds(client: TestClient):
+    assert client.get("/employees", params={"limit": 0}).status_code == 422
+    assert client.get("/employees", params={"limit": 1001}).status_code == 422
+
+
+def test_export_employees_ndjson(client: TestClient, sample_employee):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    client.post("/employees", json={**sample_employee, "department_id": department_id})
+    client.post("/employees", json={"name": "Jane Roe", "age": 41, "city": "Austin"})
+
+    response = client.get("/employees/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["name"] for r in rows] == ["John Doe", "Jane Roe"]
+    assert rows[0]["department_name"] == "Sales"
+    assert rows[1]["department_name"] is None
+
+
+def test_export_employees_csv_with_filter(client: TestClient, sample_employee):
+    client.post("/employees", json=sample_employee)
+    client.post("/employees", json={"name": "Jane Roe", "age": 41, "city": "Austin"})
+
+    response = client.get("/employees/export", params={"city": "Austin"}, headers={"Accept": "text/csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0] == "id,name,age,city,department_id,department_name"
+    assert len(lines) == 2
+    assert lines[1].endswith(",Jane Roe,41,Austin,,")
+
+
+def test_bulk_create_employees(client: TestClient):
+    rows = [{"name": f"Emp {chr(65 + i)}", "age": 20 + i, "city": "Denver"} for i in range(5)]
+    response = client.post("/employees/bulk", params={"batch_size": 2}, json=rows)
+    assert response.status_code == 201
+    data = response.json()
+    assert data["created"] == 5
+    assert data["errors"] == []
+    assert len(set(data["ids"])) == 5
+
+    created = {e["id"]: e["name"] for e in client.get("/employees").json()}
+    assert [created[i] for i in data["ids"]] == [row["name"] for row in rows]
+
+
+def test_bulk_create_employees_one_insert_per_batch(client: TestClient, sql_statements):
+    rows = [{"name": f"Emp {chr(65 + i)}", "age": 20 + i, "city": "Denver"} for i in range(5)]
+    sql_statements.clear()
+    response = client.post("/employees/bulk", params={"batch_size": 2}, json=rows)
+    assert response.status_code == 201
+    inserts = [statement for statement in sql_statements if statement.startswith("INSERT INTO employees")]
+    assert len(inserts) == 3
+
+
+def test_bulk_create_employees_atomic_rejects_all(client: TestClient, sample_employee):
+    rows = [sample_employee, {"name": "X", "age": 30, "city": "Denver"}, {"age": 30}]
+    response = client.post("/employees/bulk", json=rows)
+    assert response.status_code == 422
+    data = response.json()
+    assert data["created"] == 0
+    assert [e["index"] for e in data["errors"]] == [1, 2]
+    assert client.get("/employees").json() == []
+
+
+def test_bulk_create_employees_best_effort_ndjson(client: TestClient, sample_employee):
+    body = "\n".join([
+        json.dumps(sample_employee),
+        json.dumps({"name": "Jane Roe", "age": 12, "city": "Austin"}),
+        json.dumps({"name": "Max Poe", "age": 33, "city": "Austin"}),
+    ])
+    response = client.post(
+        "/employees/bulk",
+        params={"atomic": "false"},
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["created"] == 2
+    assert data["ids"][1] is None
+    assert data["errors"] == [{"index": 1, "detail": "Age must be between 18 and 100"}]
+
+
+def test_bulk_create_employees_reports_failing_rows(client: TestClient, db_session):
+    import asyncio
+    from app import async_crud, crud, schemas
+    from app.db import DB_ASYNC
+    rows = [schemas.EmployeeCreate(name=f"Emp {letter}", age=30, city="Boston") for letter in "ABCDE"]
+    # Bypasses validation, so only the database rejects the row
+    rows[3] = schemas.EmployeeCreate.model_construct(name=None, age=30, city="Boston", department_id=None)
+    if DB_ASYNC:
+        ids, failed = asyncio.run(async_crud.bulk_create_employees(db_session, rows, batch_size=5, atomic=False))
+    else:
+        ids, failed = crud.bulk_create_employees(db_session, rows, batch_size=5, atomic=False)
+    assert [employee_id is not None for employee_id in ids] == [True, True, True, False, True]
+    assert [index for index, _ in failed] == [3]
+    assert "NOT NULL" in failed[0][1]
+    assert sorted(e["name"] for e in client.get("/employees").json()) == ["Emp A", "Emp B", "Emp C", "Emp E"]
+
+
+def test_bulk_create_employees_bad_body(client: TestClient):
+    response = client.post("/employees/bulk", json={"name": "John Doe"})
+    assert response.status_code == 400
+
+
+def test_import_employees_csv(client: TestClient):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    body = (
+        "name,age,city,department_id\n"
+        f"John Doe,30,New York,{department_id}\n"
+        "J,30,New York,\n"
+        "Jane Roe,41,Austin,\n"
+        "Max Poe,33,Austin,999\n"
+        "Ann Lee,old,Austin,\n"
+    )
+    response = client.post(
+        "/employees/import",
+        params={"chunk_size": 2},
+        content=body,
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 2
+    assert data["rejected"] == 3
+    assert [e["index"] for e in data["errors"]] == [1, 3, 4]
+
+    employees = client.get("/employees").json()
+    assert [(e["name"], e["department_name"]) for e in employees] == [
+        ("John Doe", "Sales"),
+        ("Jane Roe", None),
+    ]
+
+
+def test_import_employees_csv_missing_columns(client: TestClient):
+    response = client.post(
+        "/employees/import", content="name,city\nJohn Doe,Boston\n", headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 400
+
+
+def test_employees_etag(client: TestClient, sample_employee):
+    employee_id = client.post("/employees", json=sample_employee).json()["id"]
+    for url in ("/employees", f"/employees/{employee_id}"):
+        response = client.get(url)
+        etag = response.headers["ETag"]
+        cached = client.get(url, headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+
+    # Any employee write changes the tag
+    client.put(f"/employees/{employee_id}", json={**sample_employee, "city": "Boston"})
+    response = client.get("/employees", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["city"] == "Boston"
+
+
 
 
 
@@ -168,4 +396,238 @@ def test_update_employee_invalid_data(client: TestClient, sample_employee):
     response = client.put(f"/employees/{employee_id}", json=update_data)
     assert response.status_code == 422
     assert response.json()["detail"][0]["msg"] == "field required"
-'''
\ No newline at end of file
+'''
+
+def test_search_employees(client: TestClient):
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    for name, city, department_id in [
+        ("John Smith", "Boston", sales),
+        ("Johnny Walker", "Denver", None),
+        ("Mary Johnson", "Boston", sales),
+    ]:
+        client.post("/employees", json={"name": name, "age": 30, "city": city, "department_id": department_id})
+
+    data = client.get("/employees/search", params={"q": "john"}).json()
+    # Exact word first, then prefixes; Johnson is a prefix match too
+    assert [hit["name"] for hit in data["results"]] == ["John Smith", "Johnny Walker", "Mary Johnson"]
+    assert data["results"][0]["department_name"] == "Sales"
+    assert {(f["department_name"], f["count"]) for f in data["departments"]} == {("Sales", 2), (None, 1)}
+    assert {(f["city"], f["count"]) for f in data["cities"]} == {("Boston", 2), ("Denver", 1)}
+
+    # Every word must match; misspellings match approximately
+    assert [hit["name"] for hit in client.get("/employees/search", params={"q": "jo bost"}).json()["results"]] == [
+        "John Smith", "Mary Johnson"
+    ]
+    assert client.get("/employees/search", params={"q": "smiht walkr"}).json()["total"] == 0
+    assert [hit["name"] for hit in client.get("/employees/search", params={"q": "walkerr"}).json()["results"]] == [
+        "Johnny Walker"
+    ]
+
+    # Filters narrow the results but not the facets
+    data = client.get("/employees/search", params={"q": "john", "city": "Denver"}).json()
+    assert data["total"] == 1
+    assert len(data["cities"]) == 2
+
+
+def test_search_index_follows_writes(client: TestClient, monkeypatch):
+    from app.search_index import search_index
+    employee = client.post("/employees", json={"name": "John Smith", "age": 30, "city": "Boston"}).json()
+    assert client.get("/employees/search", params={"q": "john"}).json()["total"] == 1
+
+    loads = []
+    load = search_index.load
+    monkeypatch.setattr(search_index, "load", lambda *args: loads.append(args) or load(*args))
+    monkeypatch.setattr(search_index, "ttl", 0)
+
+    def names(q):
+        return [hit["name"] for hit in client.get("/employees/search", params={"q": q}).json()["results"]]
+
+    client.put(f"/employees/{employee['id']}", json={"name": "Jon Smith", "age": 30, "city": "Boston"})
+    assert names("john") == []
+    assert names("jon") == ["Jon Smith"]
+    client.post("/employees/bulk", json=[{"name": "Jonas Berg", "age": 40, "city": "Oslo"}])
+    assert names("jon") == ["Jon Smith", "Jonas Berg"]
+    client.delete(f"/employees/{employee['id']}")
+    assert names("jon") == ["Jonas Berg"]
+    # Applied incrementally, without reloading the index
+    assert loads == []
+
+    # CSV imports are not tracked row by row: the index catches up from the
+    # rows written since its version, still without reloading
+    client.post("/employees/import", content="name,age,city\nJonah Hill,30,Boston\n", headers={"Content-Type": "text/csv"})
+    assert names("jon") == ["Jonas Berg", "Jonah Hill"]
+    assert loads == []
+
+
+def test_search_index_catches_up_with_other_workers(client: TestClient, db_session, monkeypatch):
+    from app.search_index import search_index
+    ids = client.post("/employees/bulk", json=[
+        {"name": "Jon Smith", "age": 30, "city": "Boston"},
+        {"name": "Jonas Berg", "age": 40, "city": "Oslo"},
+    ]).json()["ids"]
+    assert client.get("/employees/search", params={"q": "jon"}).json()["total"] == 2
+
+    loads = []
+    load = search_index.load
+    monkeypatch.setattr(search_index, "load", lambda *args: loads.append(args) or load(*args))
+    monkeypatch.setattr(search_index, "ttl", 0)
+    # Another worker's writes: this process never sees them commit
+    monkeypatch.setattr(search_index, "apply", lambda changes, version: None)
+    client.put(f"/employees/{ids[0]}", json={"name": "Jonathan Smith"})
+    client.delete(f"/employees/{ids[1]}")
+    client.post("/employees", json={"name": "Jon Moe", "age": 50, "city": "Austin"})
+
+    names = [hit["name"] for hit in client.get("/employees/search", params={"q": "jon"}).json()["results"]]
+    assert names == ["Jon Moe", "Jonathan Smith"]
+    assert loads == []
+
+
+# Statements every writing commit adds: the version bump and the change feed stamps
+COMMIT_STATEMENT_MARKERS = ("reference_versions", "revision IS NULL", "employee_tombstones")
+
+
+def written_tables(statements):
+    """(verb, table) per statement, ignoring the commit-time statements."""
+    return [
+        tuple(statement.replace("FROM ", "").split()[:2])
+        for statement in statements
+        if not any(marker in statement for marker in COMMIT_STATEMENT_MARKERS)
+    ]
+
+
+def test_employee_writes_are_single_statements(client: TestClient, sample_employee, sql_statements):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    employee_id = client.post("/employees", json=sample_employee).json()["id"]
+
+    sql_statements.clear()
+    response = client.put(f"/employees/{employee_id}", json={"name": "Jane Doe", "city": "Boston"})
+    assert response.json() == {**sample_employee, "name": "Jane Doe", "city": "Boston", "id": employee_id, "department_name": None, "department_id": None}
+    assert written_tables(sql_statements) == [("UPDATE", "employees")]
+    # The commit bumps the employees version and stamps the row in two more statements
+    assert len(sql_statements) == 3
+
+    # A department change also moves the employee between the counters
+    sql_statements.clear()
+    response = client.patch(f"/employees/{employee_id}", json={"department_id": department_id})
+    assert response.json()["department_name"] == "Sales"
+    assert written_tables(sql_statements) == [("UPDATE", "departments"), ("UPDATE", "employees")]
+    assert client.get(f"/departments/{department_id}").json()["employee_count"] == 1
+
+    sql_statements.clear()
+    assert client.put("/employees/999", json={"name": "Nobody"}).status_code == 404
+    assert client.delete("/employees/999").status_code == 404
+    assert written_tables(sql_statements) == [("UPDATE", "employees"), ("DELETE", "employees")]
+
+    sql_statements.clear()
+    assert client.delete(f"/employees/{employee_id}").status_code == 200
+    assert written_tables(sql_statements) == [("DELETE", "employees"), ("UPDATE", "departments")]
+    assert client.get(f"/departments/{department_id}").json()["employee_count"] == 0
+
+
+def test_bulk_mutations(client: TestClient, sql_statements):
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    support = client.post("/departments", json={"name": "Support"}).json()["id"]
+    ids = client.post("/employees/bulk", json=[
+        {"name": "Ann", "age": 25, "city": "Boston", "department_id": sales},
+        {"name": "Bob", "age": 35, "city": "Boston", "department_id": sales},
+        {"name": "Cid", "age": 45, "city": "Denver", "department_id": sales},
+        {"name": "Dee", "age": 55, "city": "Denver"},
+    ]).json()["ids"]
+
+    def counts():
+        return {d["id"]: d["employee_count"] for d in client.get("/departments").json()}
+
+    # A dry run counts without writing
+    response = client.post("/employees/bulk-update?dry_run=true", json={"where": {"city": "Boston"}, "set": {"city": "Austin"}})
+    assert response.json() == {"affected": 2, "dry_run": True}
+    assert client.get("/employees", params={"city": "Austin"}).json() == []
+
+    sql_statements.clear()
+    response = client.post("/employees/bulk-update", json={"where": {"city": "Boston", "min_age": 30}, "set": {"age": 36, "department_id": support}})
+    assert response.json() == {"affected": 1, "dry_run": False}
+    # One set-based UPDATE, then the counters of the departments left and joined
+    assert [table for table in written_tables(sql_statements) if table[0] == "UPDATE"] == [
+        ("UPDATE", "employees"), ("UPDATE", "departments"), ("UPDATE", "departments"),
+    ]
+    assert client.get(f"/employees/{ids[1]}").json()["age"] == 36
+    assert counts() == {sales: 2, support: 1}
+
+    response = client.post(f"/departments/{sales}/reassign", json={"target_department_id": support})
+    assert response.json() == {"affected": 2, "dry_run": False}
+    assert counts() == {sales: 0, support: 3}
+
+    # Employees coming from different departments, or none
+    response = client.post("/employees/bulk-update", json={"where": {"city": "Denver"}, "set": {"department_id": sales}})
+    assert response.json() == {"affected": 2, "dry_run": False}
+    assert counts() == {sales: 2, support: 2}
+
+    response = client.post("/employees/bulk-delete", json={"ids": ids[:2], "department_id": support})
+    assert response.json() == {"affected": 2, "dry_run": False}
+    assert counts() == {sales: 2, support: 0}
+    assert [e["name"] for e in client.get("/employees").json()] == ["Cid", "Dee"]
+
+    # Selections must name something; referenced departments must exist
+    assert client.post("/employees/bulk-delete", json={}).json() == {"detail": "Select employees by ids or at least one filter"}
+    assert client.post("/employees/bulk-update", json={"where": {"ids": [ids[3]]}, "set": {"department_id": 999}}).status_code == 400
+    assert client.post(f"/departments/{sales}/reassign", json={"target_department_id": sales}).status_code == 400
+    assert client.post("/departments/999/reassign", json={"target_department_id": sales}).status_code == 404
+
+
+def test_sync_employees(client: TestClient, sql_statements):
+    sales = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    upstream = [
+        {"external_id": "hr-1", "name": "Ann Lee", "age": 30, "city": "Boston", "department_id": sales},
+        {"external_id": "hr-2", "name": "Bob Ray", "age": 40, "city": "Denver"},
+    ]
+    assert client.put("/employees/sync", json=upstream).json() == {
+        "inserted": 2, "updated": 0, "unchanged": 0, "rejected": 0, "errors": [],
+    }
+    assert client.get(f"/departments/{sales}").json()["employee_count"] == 1
+
+    # Re-sending the same snapshot writes nothing
+    sql_statements.clear()
+    assert client.put("/employees/sync", json=upstream).json()["unchanged"] == 2
+    assert not [s for s in sql_statements if not s.startswith("SELECT")]
+
+    upstream[1] = {**upstream[1], "city": "Austin", "department_id": sales}
+    upstream.append({"external_id": "hr-3", "name": "Cid Orr", "age": 50, "city": "Miami", "department_id": 999})
+    upstream.append({"external_id": "hr-1", "name": "Ann Lee", "age": 31, "city": "Boston"})
+    result = client.put("/employees/sync?batch_size=2", json=upstream).json()
+    assert (result["inserted"], result["updated"], result["unchanged"], result["rejected"]) == (0, 1, 1, 2)
+    assert [e["detail"] for e in result["errors"]] == ["Department with id 999 does not exist", "Duplicate external_id 'hr-1'"]
+    employees = client.get("/employees").json()
+    assert [(e["name"], e["city"]) for e in employees] == [("Ann Lee", "Boston"), ("Bob Ray", "Austin")]
+    assert client.get(f"/departments/{sales}").json()["employee_count"] == 2
+
+    # A local edit is overwritten by the next sync
+    client.put(f"/employees/{employees[0]['id']}", json={"city": "Salem"})
+    assert client.put("/employees/sync", json=upstream[:2]).json()["updated"] == 1
+    assert client.get(f"/employees/{employees[0]['id']}").json()["city"] == "Boston"
+
+
+def test_sync_counts_what_the_upsert_wrote(client: TestClient, monkeypatch):
+    from sqlalchemy import false
+    from sqlalchemy.dialects import postgresql
+    from app import employee_sync
+    upstream = [
+        {"external_id": "hr-1", "name": "Ann Lee", "age": 30, "city": "Boston"},
+        {"external_id": "hr-2", "name": "Bob Ray", "age": 40, "city": "Denver"},
+    ]
+    client.put("/employees/sync", json=upstream)
+    # As if another sync wrote the rows after the stored hashes were read
+    stored_hashes_stmt = employee_sync.stored_hashes_stmt
+    monkeypatch.setattr(employee_sync, "stored_hashes_stmt", lambda ids: stored_hashes_stmt(ids).where(false()))
+    upstream[1] = {**upstream[1], "city": "Austin"}
+    result = client.put("/employees/sync", json=upstream).json()
+    # hr-1 was not written again; only PostgreSQL tells that hr-2 was updated
+    assert result["unchanged"] == 1 and result["inserted"] + result["updated"] == 1
+    upsert = employee_sync.upsert_employees_stmt("postgresql").compile(dialect=postgresql.dialect())
+    assert str(upsert).endswith("xmax = 0 AS inserted")
+
+
+def test_run_db_functions_have_async_counterparts():
+    import inspect
+    import re
+    from app import async_crud, crud, main
+    called = set(re.findall(r"run_db\(\s*crud\.(\w+)", inspect.getsource(main)))
+    assert called and {getattr(crud, name) for name in called} <= set(async_crud.ASYNC_COUNTERPARTS)
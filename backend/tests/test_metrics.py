@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_labelled_by_route_template(client: TestClient, sample_employee):
+    route = "/employees/{employee_id}"
+    before = sample("http_requests_total", method="GET", route=route, status="200")
+    missing_before = sample("http_requests_total", method="GET", route=route, status="404")
+    observed_before = sample("http_request_duration_seconds_count", method="GET", route=route)
+
+    employee_id = client.post("/employees", json=sample_employee).json()["id"]
+    body = client.get(f"/employees/{employee_id}").content
+    client.get("/employees/999999")
+    client.get("/no/such/path")
+
+    assert sample("http_requests_total", method="GET", route=route, status="200") == before + 1
+    assert sample("http_requests_total", method="GET", route=route, status="404") == missing_before + 1
+    assert sample("http_request_duration_seconds_count", method="GET", route=route) == observed_before + 2
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert sample("http_response_size_bytes_sum", method="GET", route=route) >= len(body)
+    assert sample("http_requests_in_progress", method="GET") == 0
+
+
+def test_metrics_endpoint(client: TestClient):
+    client.get("/departments")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in (
+        "http_requests_total",
+        "http_request_duration_seconds_bucket",
+        "http_response_size_bytes_bucket",
+        "http_response_serialize_seconds_count",
+        "db_statement_duration_seconds",
+        "db_pool_checkout_seconds",
+    ):
+        assert name in response.text
+    assert 'route="/departments"' in response.text
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+
+    def run(code):
+        return subprocess.run(
+            [sys.executable, "-c", code], cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+        ).stdout
+
+    for _ in range(2):
+        run('from app.metrics import REQUESTS; REQUESTS.labels("GET", "/departments", "200").inc()')
+    text = run("import sys; from app.metrics import render_metrics; sys.stdout.write(render_metrics().decode())")
+    assert 'http_requests_total{method="GET",route="/departments",status="200"} 2.0' in text
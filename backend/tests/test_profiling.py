@@ -0,0 +1,73 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import Histogram
+from sqlalchemy import event
+
+from app import profiling, responses
+from app.profiling import RequestProfile
+
+
+@pytest.fixture
+def profiled(db_session, monkeypatch):
+    """Profile every request against the test database."""
+    bind = db_session.bind
+    target = getattr(bind, "sync_engine", bind)
+    profiling.profile_engine(target)
+    monkeypatch.setattr(profiling, "SQL_PROFILE_SAMPLE_RATE", 1.0)
+    yield
+    event.remove(target, "before_cursor_execute", profiling._before_cursor_execute)
+    event.remove(target, "after_cursor_execute", profiling._after_cursor_execute)
+
+
+def server_timing(response) -> dict:
+    metrics = {}
+    for metric in response.headers["Server-Timing"].split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+def test_server_timing_and_log_line(client: TestClient, profiled, sample_employee, caplog):
+    employee_id = client.post("/employees", json=sample_employee).json()["id"]
+    with caplog.at_level(logging.INFO, logger="app.profiling"):
+        response = client.get(f"/employees/{employee_id}")
+
+    metrics = server_timing(response)
+    assert set(metrics) == {"db", "serialize", "total"}
+    queries = int(metrics["db"]["desc"].strip('"').split()[0])
+    assert queries >= 1
+    assert float(metrics["db"]["dur"]) <= float(metrics["total"]["dur"])
+
+    [record] = [r for r in caplog.records if r.name == "app.profiling"]
+    assert record.levelno == logging.INFO
+    assert f'"path": "/employees/{employee_id}"' in record.getMessage()
+    assert f'"queries": {queries}' in record.getMessage()
+
+
+def test_response_model_serialization_is_timed(client: TestClient, profiled, sample_employee, monkeypatch):
+    employee_id = client.post("/employees", json=sample_employee).json()["id"]
+    monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", False)
+    monkeypatch.setattr(profiling, "SERIALIZE_SECONDS", Histogram("test_serialize_seconds", "", registry=None))
+    # A response_model route whose endpoint returns an ORM row, not bytes
+    response = client.get(f"/employees/{employee_id}")
+    assert response.status_code == 200
+    # Validated and dumped by FastAPI, then encoded by the response class
+    assert profiling.SERIALIZE_SECONDS._sum.get() > 0
+    assert float(server_timing(response)["serialize"]["dur"]) > 0
+    assert sum(bucket.get() for bucket in profiling.SERIALIZE_SECONDS._buckets) == 2
+
+
+def test_unsampled_requests_are_not_profiled(client: TestClient, profiled, monkeypatch):
+    monkeypatch.setattr(profiling, "SQL_PROFILE_SAMPLE_RATE", 0.0)
+    assert "Server-Timing" not in client.get("/departments").headers
+
+
+def test_repeated_statements_are_flagged():
+    profile = RequestProfile()
+    for _ in range(3):
+        profile.record("SELECT departments.name\nFROM departments WHERE departments.id = ?", 0.001)
+    profile.record("SELECT employees.id FROM employees", 0.001)
+    assert profile.repeated(threshold=3) == [("SELECT departments.name FROM departments WHERE departments.id = ?", 3)]
+    assert profile.statements == 4
@@ -0,0 +1,118 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.db import Base
+from app.analytics import analytics_cache
+from app.reference_cache import department_cache
+from app.replicas import Replica, ReplicaSet
+from app.search_index import search_index
+from app.table_versions import forget_local_commits
+
+
+def make_replica(name, url):
+    engine = create_engine(url)
+    return Replica(name, engine, sessionmaker(autocommit=False, autoflush=False, bind=engine))
+
+
+def test_replica_round_robin_and_ejection(tmp_path):
+    first = make_replica("replica_0", f"sqlite:///{tmp_path / 'first.db'}")
+    broken = make_replica("replica_1", f"sqlite:///{tmp_path / 'missing' / 'broken.db'}")
+    replica_set = ReplicaSet([first, broken], eject_seconds=60)
+
+    assert [replica_set.choose().name for _ in range(4)] == ["replica_0", "replica_1"] * 2
+
+    with pytest.raises(Exception):
+        with broken.engine.connect() as connection:
+            connection.execute(text("select 1"))
+    assert not broken.healthy
+    assert [replica_set.choose().name for _ in range(3)] == ["replica_0"] * 3
+
+    replica_set.eject(first)
+    assert replica_set.choose() is None
+
+
+def test_reads_use_replica_until_client_writes(tmp_path, monkeypatch):
+    primary_engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}", connect_args={"check_same_thread": False})
+    replica = make_replica("replica_0", f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(bind=primary_engine)
+    Base.metadata.create_all(bind=replica.engine)
+
+    monkeypatch.setattr(main, "DB_ASYNC", False)
+    monkeypatch.setattr(main, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=primary_engine))
+    monkeypatch.setattr(main, "replicas", ReplicaSet([replica]))
+
+    department_cache.clear()
+
+    with TestClient(main.app) as client:
+        response = client.post("/employees", json={"name": "John Doe", "age": 30, "city": "Boston"})
+        assert response.status_code == 201
+        assert "db_primary_until" in response.cookies
+        # The writer reads its own write from the primary
+        assert [e["name"] for e in client.get("/employees").json()] == ["John Doe"]
+
+    with TestClient(main.app) as other_client:
+        # Another client is served by the (not yet replicated) replica
+        assert other_client.get("/employees").json() == []
+
+
+@pytest.fixture
+def lagging_replica(tmp_path, monkeypatch):
+    """A primary and a replica that never replays its writes."""
+    primary_engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}", connect_args={"check_same_thread": False})
+    replica = make_replica("replica_0", f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(bind=primary_engine)
+    Base.metadata.create_all(bind=replica.engine)
+
+    monkeypatch.setattr(main, "DB_ASYNC", False)
+    monkeypatch.setattr(main, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=primary_engine))
+    monkeypatch.setattr(main, "replicas", ReplicaSet([replica]))
+    department_cache.clear()
+    analytics_cache.clear()
+    search_index.invalidate()
+    forget_local_commits()
+    yield
+    department_cache.clear()
+    analytics_cache.clear()
+    search_index.invalidate()
+    forget_local_commits()
+
+
+def test_replica_reads_do_not_hide_writes_from_the_writer(lagging_replica):
+    with TestClient(main.app) as writer:
+        other = TestClient(main.app)
+        response = writer.post("/departments", json={"name": "Sales"})
+        assert response.status_code == 201
+        assert "db_primary_until" in response.cookies
+
+        # The other client's replica read comes first and sees nothing
+        assert other.get("/departments").json() == []
+        # It is not cached for the writer, who reads from the primary
+        assert [d["name"] for d in writer.get("/departments").json()] == ["Sales"]
+
+
+def test_replica_analytics_are_not_served_to_the_writer(lagging_replica):
+    with TestClient(main.app) as writer:
+        other = TestClient(main.app)
+        assert writer.post("/employees", json={"name": "John Doe", "age": 30, "city": "Boston"}).status_code == 201
+
+        assert other.get("/analytics/summary").json()["employees"] == 0
+        assert writer.get("/analytics/summary").json()["employees"] == 1
+
+
+def test_lagging_replica_does_not_reload_search_index(lagging_replica, monkeypatch):
+    with TestClient(main.app) as writer:
+        other = TestClient(main.app)
+        writer.get("/employees/search", params={"q": "john"})
+        loads = []
+        load = search_index.load
+        monkeypatch.setattr(search_index, "load", lambda *args: loads.append(args) or load(*args))
+        monkeypatch.setattr(search_index, "ttl", 0)
+
+        writer.post("/employees", json={"name": "John Doe", "age": 30, "city": "Boston"})
+        # The index is ahead of the replica, so it is kept as it is
+        for client in (other, writer, other):
+            assert client.get("/employees/search", params={"q": "john"}).json()["total"] == 1
+        assert loads == []
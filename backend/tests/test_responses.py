@@ -0,0 +1,138 @@
+import io
+import json
+
+import msgpack
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from app import responses
+from app.analytics import AnalyticsSnapshot
+from app.main import app
+
+
+def test_fast_json_responses_match(client: TestClient, monkeypatch):
+    department_id = client.post("/departments", json={"name": "Sales", "description": "Sells things"}).json()["id"]
+    employee_id = client.post(
+        "/employees", json={"name": "John Doe", "age": 30, "city": "Boston", "department_id": department_id}
+    ).json()["id"]
+    urls = ["/employees", f"/employees/{employee_id}", "/departments", f"/departments/{department_id}"]
+
+    bodies = {}
+    for fast in (False, True):
+        monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", fast)
+        bodies[fast] = [client.get(url) for url in urls]
+    for slow, fast in zip(bodies[False], bodies[True]):
+        assert fast.status_code == slow.status_code == 200
+        assert fast.content == slow.content
+        assert fast.headers["ETag"] == slow.headers["ETag"]
+    assert client.get("/employees/999").status_code == 404
+
+
+# Routes whose bodies change between two identical requests
+VOLATILE_ROUTES = {"/admin/pool", "/admin/slow-queries", "/metrics"}
+
+
+def test_fast_json_responses_match_on_every_endpoint(client: TestClient, monkeypatch):
+    department_id = client.post("/departments", json={"name": "Sales", "description": "Försäljning – \"Nord\""}).json()["id"]
+    employee_ids = client.post("/employees/bulk", json=[
+        {"name": "Zoe O'Neil", "age": 30, "city": "Sao Paulo", "department_id": department_id},
+        {"name": "Bob Ray", "age": 41, "city": "Denver"},
+        {"name": "Cid Moe", "age": 45, "city": "Sao Paulo", "department_id": department_id},
+    ]).json()["ids"]
+    urls = {
+        "/employees": ["/employees", "/employees?sort=-age&limit=2", "/employees?city=Sao%20Paulo"],
+        "/employees/export": ["/employees/export"],
+        "/employees/search": ["/employees/search?q=zoe", "/employees/search?q=sao&department_id=%d" % department_id],
+        "/employees/changes": ["/employees/changes", "/employees/changes?limit=1"],
+        "/employees/{employee_id}": [f"/employees/{employee_ids[0]}", "/employees/999"],
+        "/departments": ["/departments"],
+        "/departments/{department_id}": [f"/departments/{department_id}", "/departments/999"],
+        "/analytics/summary": ["/analytics/summary"],
+        "/analytics/headcount": ["/analytics/headcount"],
+        "/analytics/age-distribution": ["/analytics/age-distribution"],
+        "/analytics/cities": ["/analytics/cities"],
+    }
+    # Every read endpoint is covered, so a new one fails here until it is added
+    routes = {route.path for route in app.routes if isinstance(route, APIRoute) and "GET" in route.methods}
+    assert set(urls) == routes - VOLATILE_ROUTES
+
+    # Analytics report how long ago they were computed
+    monkeypatch.setattr(AnalyticsSnapshot, "age", lambda snapshot: 1.5)
+    bodies = {}
+    for fast in (False, True):
+        monkeypatch.setattr(responses, "FAST_JSON_RESPONSES", fast)
+        bodies[fast] = {url: client.get(url) for paths in urls.values() for url in paths}
+    for url, slow in bodies[False].items():
+        fast = bodies[True][url]
+        assert (url, fast.status_code, fast.content) == (url, slow.status_code, slow.content)
+
+
+def seed_employees(client: TestClient):
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    for name, age, city, department in [
+        ("Ann Lee", 24, "Boston", department_id),
+        ("Bob Ray", 30, "Denver", None),
+        ("Cid Moe", 41, "Boston", department_id),
+    ]:
+        client.post("/employees", json={"name": name, "age": age, "city": city, "department_id": department})
+    return department_id
+
+
+def test_employee_list_msgpack_formats(client: TestClient):
+    seed_employees(client)
+    expected = client.get("/employees").json()
+
+    response = client.get("/employees", headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert response.headers["Vary"] == "Accept"
+    body = msgpack.unpackb(response.content)
+    assert [dict(zip(body["columns"], row)) for row in body["rows"]] == expected
+
+    response = client.get("/employees", headers={"Accept": "application/vnd.employees.columnar+msgpack"})
+    batch = msgpack.unpackb(response.content)
+    assert batch["length"] == 3
+    columns = batch["columns"]
+    assert columns["age"] == [24, 30, 41]
+    assert columns["city"] == {"dictionary": ["Boston", "Denver"], "indices": [0, 1, 0]}
+    assert columns["department_name"] == {"dictionary": ["Sales"], "indices": [0, None, 0]}
+
+    # Representations are cached separately
+    json_etag = client.get("/employees").headers["ETag"]
+    assert response.headers["ETag"] != json_etag
+    assert client.get("/employees", headers={"Accept": "application/msgpack", "If-None-Match": json_etag}).status_code == 200
+
+
+def test_export_msgpack_formats(client: TestClient):
+    seed_employees(client)
+    expected = [json.loads(line) for line in client.get("/employees/export").text.splitlines()]
+
+    response = client.get("/employees/export", headers={"Accept": "application/x-msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    columns, *rows = msgpack.Unpacker(io.BytesIO(response.content))
+    assert [dict(zip(columns, row)) for row in rows] == expected
+
+    response = client.get("/employees/export", headers={"Accept": "application/vnd.employees.columnar+msgpack"})
+    batches = list(msgpack.Unpacker(io.BytesIO(response.content)))
+    assert sum(batch["length"] for batch in batches) == 3
+    assert [i for batch in batches for i in batch["columns"]["id"]] == [row["id"] for row in expected]
+
+
+def test_large_text_responses_are_compressed(client: TestClient):
+    seed_employees(client)
+    gzip = {"Accept-Encoding": "gzip"}
+    small = client.get("/employees", headers=gzip)
+    assert len(small.content) < responses.RESPONSE_COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in small.headers
+
+    rows = [{"name": f"Emp {chr(65 + i % 26)}{chr(65 + i // 26)}", "age": 30, "city": "Boston"} for i in range(40)]
+    client.post("/employees/bulk", json=rows)
+    page = client.get("/employees", headers=gzip)
+    assert page.headers["content-encoding"] == "gzip"
+    assert len(page.json()) == 43
+    # Streamed exports are compressed whatever their size
+    assert client.get("/employees/export", headers=gzip).headers["content-encoding"] == "gzip"
+
+    binary = client.get("/employees", headers={**gzip, "Accept": "application/msgpack"})
+    assert "content-encoding" not in binary.headers
+    assert len(msgpack.unpackb(binary.content)["rows"]) == 43
@@ -0,0 +1,26 @@
+from app import serve
+
+
+def test_prepare_environment_clears_stale_metrics(tmp_path, monkeypatch):
+    stale = tmp_path / "counter_123.db"
+    stale.write_bytes(b"old")
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    monkeypatch.delenv("DB_POOL_WARMUP", raising=False)
+
+    serve.prepare_environment(workers=4)
+
+    assert not stale.exists()
+    assert serve.os.environ["DB_POOL_WARMUP"] == "7"
+
+
+def test_server_options(monkeypatch):
+    monkeypatch.setenv("MAX_REQUESTS", "500")
+    monkeypatch.setenv("BIND", "127.0.0.1:9000")
+    options = serve.server_options(workers=3)
+    assert options["workers"] == 3
+    assert options["preload_app"] is True
+    assert options["max_requests"] == 500
+    assert options["bind"] == "127.0.0.1:9000"
+    assert options["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert serve.available_cpus() >= 1
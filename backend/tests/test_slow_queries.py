@@ -0,0 +1,67 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import slow_queries
+from app.slow_queries import SlowQueryLog, fingerprint, redact_parameters, slow_query_log
+
+
+@pytest.fixture
+def every_query_slow(db_session, monkeypatch):
+    bind = db_session.bind
+    target = getattr(bind, "sync_engine", bind)
+    slow_queries.record_slow_queries(target)
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_SECONDS", 0.0)
+    slow_query_log.clear()
+    yield
+    event.remove(target, "before_cursor_execute", slow_queries._before_cursor_execute)
+    event.remove(target, "after_cursor_execute", slow_queries._after_cursor_execute)
+    slow_query_log.clear()
+
+
+def test_slow_queries_are_recorded_with_route(client: TestClient, every_query_slow):
+    employee_id = client.post("/employees", json={"name": "Secret Person", "age": 41, "city": "Hidden Town"}).json()["id"]
+    client.get(f"/employees/{employee_id}")
+
+    entries = client.get("/admin/slow-queries").json()["entries"]
+    routes = {entry["route"] for entry in entries}
+    assert "POST /employees" in routes
+    assert "GET /employees/{employee_id}" in routes
+    insert = next(entry for entry in entries if entry["statement"].startswith("INSERT INTO employees"))
+    assert insert["duration_ms"] >= 0
+    # SQLite gets no plan
+    assert insert["plan"] is None
+
+    # Parameter values never leave the process
+    body = json.dumps(entries)
+    assert "Secret Person" not in body and "Hidden Town" not in body
+    assert "<str:13>" in body
+
+
+def test_fingerprint_folds_literals_and_in_lists():
+    assert fingerprint("SELECT * FROM employees WHERE id IN (?, ?, ?)") == fingerprint(
+        "SELECT *\n  FROM employees WHERE id IN (?)"
+    )
+    assert fingerprint("SELECT * FROM employees WHERE age > 30") == fingerprint("SELECT * FROM employees WHERE age > 45")
+    # asyncpg numbers its placeholders
+    assert fingerprint("SELECT * FROM employees WHERE id IN ($1, $2, $3) AND age > $4") == fingerprint(
+        "SELECT * FROM employees WHERE id IN ($1) AND age > $2"
+    )
+    assert fingerprint("SELECT * FROM employees WHERE id IN (1, 2)") == fingerprint("SELECT * FROM employees WHERE id IN (7)")
+    assert fingerprint("SELECT * FROM employees") != fingerprint("SELECT * FROM departments")
+
+
+def test_redaction_and_ring_buffer():
+    assert redact_parameters({"name": "Ann", "age": 30, "city": None}) == {"name": "<str:3>", "age": "<int>", "city": "null"}
+    assert redact_parameters([("Ann", 30), ("Bob", 41)], executemany=True) == {"rows": 2, "first": ["<str:3>", "<int>"]}
+
+    log = SlowQueryLog(size=2)
+    for i in range(3):
+        log.record({"fingerprint": "f", "statement": f"SELECT {i}"})
+    log.add_plan("f", "Seq Scan on employees")
+    assert [(entry["statement"], entry["plan"]) for entry in log.snapshot()] == [
+        ("SELECT 2", "Seq Scan on employees"),
+        ("SELECT 1", "Seq Scan on employees"),
+    ]
@@ -0,0 +1,48 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import schemas
+from app.validation import CONSTRAINT_ERROR, describe, validate_batch
+
+
+def test_validate_batch_collects_errors_per_row():
+    rows = [
+        {"name": " Abe Lee ", "age": "30", "city": "Boston"},
+        {"name": "A", "age": 30, "city": "Boston"},
+        {"name": "Bea Ray", "age": 12, "city": "B0ston"},
+        "not a row",
+        {"name": "Cal Fox", "age": 40, "city": "Denver", "department_id": 2},
+    ]
+    valid, errors = validate_batch(schemas.EmployeeCreate, rows)
+
+    assert [(index, employee.name, employee.age) for index, employee in valid] == [(0, "Abe Lee", 30), (4, "Cal Fox", 40)]
+    assert sorted(errors) == [1, 2, 3]
+    assert [(e["loc"], e["type"]) for e in errors[2]] == [(("age",), CONSTRAINT_ERROR), (("city",), CONSTRAINT_ERROR)]
+    assert describe(errors[2]) == "Age must be between 18 and 100"
+    assert describe(errors[3]) == "Row must be a JSON object"
+
+
+@pytest.mark.parametrize("payload, detail", [
+    ({"name": "Sales", "description": None}, None),
+    ({"name": ""}, "Department name cannot be empty"),
+    ({"name": "S"}, "Department name must be at least 2 characters long"),
+    ({"name": "S" * 51}, "Department name cannot exceed 50 characters"),
+    ({"name": "Sales 2"}, "Department name can only contain letters, spaces, hyphens, and apostrophes"),
+])
+def test_department_name_messages(client: TestClient, payload, detail):
+    response = client.post("/departments", json=payload)
+    if detail is None:
+        assert response.status_code == 201
+    else:
+        assert response.status_code == 422
+        assert response.json() == {"detail": detail}
+
+
+def test_type_errors_keep_default_format(client: TestClient):
+    response = client.post("/employees", json={"name": "John Doe", "age": "old", "city": "Boston"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "age"]
+
+    department_id = client.post("/departments", json={"name": "Sales"}).json()["id"]
+    response = client.put(f"/departments/{department_id}", json={"name": None})
+    assert response.json() == {"detail": "Department name is required"}
@@ -6,13 +6,16 @@ const api = axios.create({
     import.meta.env.VITE_API_BASE_URL ??
     (window.location.hostname === "localhost"
       ? "http://localhost:8000"
-      : "http://backend:8000")
+      : "http://backend:8000"),
+  // Sends the read-your-writes cookie so reads after a save hit the primary
+  withCredentials: true,
 });
 
 export interface Department {
   id: number;
   name: string;
   description: string | null;
+  employee_count?: number;
 }
 
 export interface DepartmentInput {
@@ -5,7 +5,9 @@ const api = axios.create({
     import.meta.env.VITE_API_BASE_URL ??
     (window.location.hostname === "localhost"
       ? "http://localhost:8000"
-      : "http://backend:8000")
+      : "http://backend:8000"),
+  // Sends the read-your-writes cookie so reads after a save hit the primary
+  withCredentials: true,
 });
 
 export interface Employee {
@@ -24,9 +26,79 @@ export interface EmployeeInput {
   department_id?: number;
 }
 
+// The list endpoint is paginated; follow X-Next-Cursor until exhausted
+const PAGE_SIZE = 1000;
+
 export const fetchEmployees = async (): Promise<Employee[]> => {
-  const res = await api.get<Employee[]>("/employees");
-  return res.data;
+  const employees: Employee[] = [];
+  let cursor: string | undefined;
+  do {
+    const res = await api.get<Employee[]>("/employees", {
+      params: { limit: PAGE_SIZE, cursor, include_total: false },
+    });
+    employees.push(...res.data);
+    cursor = res.headers["x-next-cursor"];
+  } while (cursor);
+  return employees;
+};
+
+export interface EmployeeChange {
+  id: number;
+  revision: number;
+  deleted: boolean;
+  changed_at?: string;
+  // Current state; null for a deleted employee
+  employee: Employee | null;
+}
+
+interface EmployeeChangePage {
+  changes: EmployeeChange[];
+  next_cursor: string;
+  has_more: boolean;
+}
+
+// Changes since a cursor returned by an earlier call, or every employee
+// without one; follows the pages until caught up. A cursor older than the
+// server keeps deletions for is answered with 410: start over, and report
+// the result as a full list (reset) rather than changes to apply.
+export const fetchEmployeeChanges = async (
+  since?: string
+): Promise<{ changes: EmployeeChange[]; cursor: string; reset: boolean }> => {
+  const changes: EmployeeChange[] = [];
+  let cursor = since;
+  let hasMore: boolean;
+  do {
+    try {
+      const res = await api.get<EmployeeChangePage>("/employees/changes", {
+        params: { since: cursor, limit: PAGE_SIZE },
+      });
+      changes.push(...res.data.changes);
+      cursor = res.data.next_cursor;
+      hasMore = res.data.has_more;
+    } catch (e) {
+      if (since !== undefined && axios.isAxiosError(e) && e.response?.status === 410) {
+        return { ...(await fetchEmployeeChanges()), reset: true };
+      }
+      throw e;
+    }
+  } while (hasMore);
+  return { changes, cursor: cursor as string, reset: since === undefined };
+};
+
+// Applies changes to a list of employees, keeping it in id order
+export const applyEmployeeChanges = (
+  employees: Employee[],
+  changes: EmployeeChange[]
+): Employee[] => {
+  const byId = new Map(employees.map((employee) => [employee.id, employee]));
+  for (const change of changes) {
+    if (change.employee) {
+      byId.set(change.id, change.employee);
+    } else {
+      byId.delete(change.id);
+    }
+  }
+  return [...byId.values()].sort((a, b) => a.id - b.id);
 };
 
 export const createEmployee = async (
@@ -1,8 +1,9 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import {
   type Employee,
   type EmployeeInput,
-  fetchEmployees,
+  applyEmployeeChanges,
+  fetchEmployeeChanges,
   createEmployee,
   updateEmployee,
   deleteEmployee
@@ -29,12 +30,16 @@ const Employee: React.FC = () => {
     setToast(null);
   };
 
+  // Position in the change feed the list is current up to
+  const cursor = useRef<string | undefined>(undefined);
+
   const load = async () => {
     try {
       setLoading(true);
       setError(null);
-      const data = await fetchEmployees();
-      setEmployees(data);
+      const { changes, cursor: next } = await fetchEmployeeChanges();
+      cursor.current = next;
+      setEmployees(applyEmployeeChanges([], changes));
     } catch (e) {
       setError("Failed to load employees");
     } finally {
@@ -42,6 +47,13 @@ const Employee: React.FC = () => {
     }
   };
 
+  // After a write, fetch only what changed instead of the whole list
+  const refresh = async () => {
+    const { changes, cursor: next, reset } = await fetchEmployeeChanges(cursor.current);
+    cursor.current = next;
+    setEmployees((current) => applyEmployeeChanges(reset ? [] : current, changes));
+  };
+
   useEffect(() => {
     void load();
   }, []);
@@ -56,7 +68,7 @@ const Employee: React.FC = () => {
         await createEmployee(data);
       }
       setEditingEmployee(null);
-      await load();
+      await refresh();
     } catch (e) {
       setError("Failed to save employee");
       showToast("Failed to save employee", "error");
@@ -67,7 +79,7 @@ const Employee: React.FC = () => {
     try {
       setError(null);
       await deleteEmployee(id);
-      await load();
+      await refresh();
     } catch (e) {
       setError("Failed to delete employee");
     }
@@ -77,7 +89,7 @@ const Employee: React.FC = () => {
     try {
       setError(null);
       await assignDepartment(employeeId, departmentId);
-      await load();
+      await refresh();
     } catch (e) {
       setError("Failed to assign department");
     }